@@ -1,8 +1,9 @@
 from ebook_converter.css_selectors.parser import parse
 from ebook_converter.css_selectors.select import Select, INAPPROPRIATE_PSEUDO_CLASSES
+from ebook_converter.css_selectors.index import SelectorIndex
 from ebook_converter.css_selectors.errors import SelectorError, SelectorSyntaxError, ExpressionError
 
 
 __license__ = 'GPL v3'
 __copyright__ = '2015, Kovid Goyal <kovid at kovidgoyal.net>'
-__all__ = ['parse', 'Select', 'INAPPROPRIATE_PSEUDO_CLASSES', 'SelectorError', 'SelectorSyntaxError', 'ExpressionError']
+__all__ = ['parse', 'Select', 'SelectorIndex', 'INAPPROPRIATE_PSEUDO_CLASSES', 'SelectorError', 'SelectorSyntaxError', 'ExpressionError']
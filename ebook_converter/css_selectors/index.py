@@ -0,0 +1,336 @@
+from collections import defaultdict
+
+from ebook_converter.css_selectors.errors import ExpressionError, SelectorError
+from ebook_converter.css_selectors.parser import (
+    Attrib, Class, CombinedSelector, Element, Function, FunctionalPseudoElement,
+    Hash, Negation, Pseudo, ascii_lower)
+from ebook_converter.css_selectors.select import (
+    Select, get_func_for_pseudo, get_parsed_selector, is_non_whitespace,
+    normalize_language_tag, select_root)
+
+
+class SelectorIndex(object):
+
+    '''
+
+    Match a large number of selectors against a tree in a single pass.
+
+    Selectors are parsed once, and indexed by the rightmost compound selector
+    (by id, class, tag name or as universal selector). Calling the index
+    with a tree walks it once, and for every element tests only the
+    selectors which could possibly match it. The returned object can be used
+    in place of :class:`Select` for the indexed selectors:
+
+    >>> index = SelectorIndex(['p.myclass', 'div > p'])
+    >>> select = index(root)
+    >>> print(tuple(select('p.myclass')))
+
+    Tags are returned in document order, and the matching rules are the same
+    as for :class:`Select`. Selectors which are invalid or use unsupported
+    features raise :class:`SelectorError` when selected.
+
+    The indexed matches are computed at the time the index is called with
+    the tree, so changes made to the tree afterwards are not reflected.
+
+    '''
+
+    def __init__(self, selectors, default_lang=None,
+                 ignore_inappropriate_pseudo_classes=False):
+        self.default_lang = default_lang
+        self.ignore_inappropriate_pseudo_classes = \
+            ignore_inappropriate_pseudo_classes
+        self.selectors = {}
+        self.errors = {}
+        self.by_id = defaultdict(list)
+        self.by_class = defaultdict(list)
+        self.by_tag = defaultdict(list)
+        self.universal = []
+        # Select object used only for validating pseudo classes and
+        # functions
+        checker = Select(_dummy_root, ignore_inappropriate_pseudo_classes=(
+            ignore_inappropriate_pseudo_classes))
+        for text in selectors:
+            if text in self.selectors or text in self.errors:
+                continue
+            try:
+                parsed = tuple(get_parsed_selector(text))
+                for selector in parsed:
+                    _validate(checker, selector.parsed_tree)
+                    if isinstance(selector.pseudo_element,
+                                  FunctionalPseudoElement):
+                        raise ExpressionError(
+                            'The pseudo-element ::%s is not supported' %
+                            selector.pseudo_element.name)
+                    if selector.pseudo_element is not None:
+                        get_func_for_pseudo(checker, selector.pseudo_element)
+            except SelectorError as err:
+                self.errors[text] = err
+                continue
+            self.selectors[text] = parsed
+            for selector in parsed:
+                kind, key = _index_key(selector.parsed_tree)
+                if kind == 'id':
+                    self.by_id[key].append(text)
+                elif kind == 'class':
+                    self.by_class[key].append(text)
+                elif kind == 'tag':
+                    self.by_tag[key].append(text)
+                else:
+                    self.universal.append(text)
+
+    def __call__(self, root):
+        return IndexedSelect(self, root)
+
+
+class IndexedSelect(Select):
+
+    '''
+    Result of matching :class:`SelectorIndex` against a tree.
+    '''
+
+    def __init__(self, index, root):
+        Select.__init__(self, root, default_lang=index.default_lang,
+                        ignore_inappropriate_pseudo_classes=(
+                            index.ignore_inappropriate_pseudo_classes))
+        self.index = index
+        self.map_attrib_name = ascii_lower
+        if '{' in self.root.tag:
+            def map_attrib_name(x):
+                return ascii_lower(x.rpartition('}')[2])
+            self.map_attrib_name = map_attrib_name
+        self._classes = {}
+        self._attribs = {}
+        self._langs = None
+        self._pseudo_funcs = {}
+        self.matches = defaultdict(list)
+
+        by_id, by_class, by_tag = index.by_id, index.by_class, index.by_tag
+        universal = index.universal
+        for elem in self.itertag():
+            candidates = set(universal)
+            candidates.update(by_tag.get(self.map_tag_name(elem.tag), ()))
+            eid = elem.get('id')
+            if eid is not None:
+                candidates.update(by_id.get(ascii_lower(eid), ()))
+            for cls in self.classes(elem):
+                candidates.update(by_class.get(cls, ()))
+            for text in candidates:
+                for selector in index.selectors[text]:
+                    if self.match_selector(selector, elem):
+                        self.matches[text].append(elem)
+                        break
+
+    def __call__(self, selector, root=None):
+        ''' Return an iterator over all tags matching the indexed selector,
+        in document order. For selectors which are not indexed, or if root
+        is given, :class:`Select` is used. '''
+        if selector in self.index.errors:
+            raise self.index.errors[selector]
+        if root is not None or selector not in self.index.selectors:
+            return Select.__call__(self, selector, root=root)
+        return iter(self.matches.get(selector, ()))
+
+    # Element properties {{{
+    def classes(self, elem):
+        try:
+            return self._classes[elem]
+        except KeyError:
+            cls = elem.get('class')
+            ans = self._classes[elem] = frozenset(
+                ascii_lower(x) for x in cls.split()) if cls else frozenset()
+            return ans
+
+    def attribs(self, elem):
+        try:
+            return self._attribs[elem]
+        except KeyError:
+            ans = self._attribs[elem] = defaultdict(list)
+            for attr, val in elem.attrib.items():
+                ans[self.map_attrib_name(attr)].append(val)
+            return ans
+
+    def langs(self, elem):
+        if self._langs is None:
+            self._langs = {}
+            dl = normalize_language_tag(self.default_lang) \
+                if self.default_lang else None
+            stack = [(self.root, dl)]
+            while stack:
+                tag, lang = stack.pop()
+                tlang = tag.get('lang')
+                if tlang:
+                    lang = normalize_language_tag(tlang)
+                if lang:
+                    self._langs[tag] = lang
+                stack.extend((child, lang) for child in
+                             self.iterchildren(tag))
+        return self._langs.get(elem)
+    # }}}
+
+    # Matching {{{
+    def match_selector(self, selector, elem):
+        if not self.match(selector.parsed_tree, elem):
+            return False
+        if selector.pseudo_element is None:
+            return True
+        return get_func_for_pseudo(self, selector.pseudo_element)(self, elem)
+
+    def match(self, parsed, elem):
+        if isinstance(parsed, Element):
+            name = parsed.element
+            return (not name or name == '*' or
+                    self.map_tag_name(elem.tag) == ascii_lower(name))
+        if isinstance(parsed, Class):
+            return (ascii_lower(parsed.class_name) in self.classes(elem) and
+                    self.match(parsed.selector, elem))
+        if isinstance(parsed, Hash):
+            eid = elem.get('id')
+            return (eid is not None and
+                    ascii_lower(eid) == ascii_lower(parsed.id) and
+                    self.match(parsed.selector, elem))
+        if isinstance(parsed, Attrib):
+            return (self.match_attrib(parsed, elem) and
+                    self.match(parsed.selector, elem))
+        if isinstance(parsed, Pseudo):
+            try:
+                func = self._pseudo_funcs[parsed.ident]
+            except KeyError:
+                func = self._pseudo_funcs[parsed.ident] = \
+                    get_func_for_pseudo(self, parsed.ident)
+            if func is select_root:
+                # Select returns root for :root, whatever it is combined with
+                return elem is self.root
+            return self.match(parsed.selector, elem) and func(self, elem)
+        if isinstance(parsed, Function):
+            return (self.match(parsed.selector, elem) and
+                    self.match_function(parsed, elem))
+        if isinstance(parsed, Negation):
+            return (self.match(parsed.selector, elem) and
+                    not self.match(parsed.subselector, elem))
+        if isinstance(parsed, CombinedSelector):
+            return (self.match(parsed.subselector, elem) and
+                    self.match_combined(parsed, elem))
+        raise ExpressionError('%s is not supported' % type(parsed).__name__)
+
+    def match_combined(self, parsed, elem):
+        left = parsed.selector
+        combinator = parsed.combinator
+        if combinator in ' >':
+            while elem is not self.root:
+                elem = elem.getparent()
+                if elem is None:
+                    return False
+                if self.match(left, elem):
+                    return True
+                if combinator == '>':
+                    return False
+            return False
+        for sibling in self.itersiblings(elem, preceding=True):
+            if self.match(left, sibling):
+                return True
+            if combinator == '+':
+                return False
+        return False
+
+    def match_attrib(self, parsed, elem):
+        values = self.attribs(elem).get(ascii_lower(parsed.attrib))
+        if not values:
+            return False
+        operator = parsed.operator
+        value = parsed.value
+        if operator == 'exists':
+            return True
+        if operator == '=':
+            return value in values
+        if operator == '~=':
+            return bool(is_non_whitespace(value)) and any(
+                value in val.split() for val in values)
+        if not value:
+            return False
+        if operator == '|=':
+            return any(val == value or val.startswith(value + '-')
+                       for val in values)
+        if operator == '^=':
+            return any(val.startswith(value) for val in values)
+        if operator == '$=':
+            return any(val.endswith(value) for val in values)
+        if operator == '*=':
+            return any(value in val for val in values)
+        raise ExpressionError('Unknown attribute operator: %s' % operator)
+
+    def match_function(self, function, elem):
+        fname = function.name.replace('-', '_')
+        if fname == 'lang':
+            lang = ascii_lower(function.arguments[0].value)
+            if not lang:
+                return False
+            lp = lang + '-'
+            return any(tlang == lang or tlang.startswith(lp)
+                       for tlang in self.langs(elem) or ())
+        return self.dispatch_map[fname](self, function, elem)
+    # }}}
+
+
+class _DummyRoot(object):
+    tag = 'html'
+
+
+_dummy_root = _DummyRoot()
+
+
+def _validate(checker, parsed):
+    'Raise SelectorError for anything Select would refuse to evaluate'
+    if isinstance(parsed, Element):
+        return
+    if isinstance(parsed, Pseudo):
+        get_func_for_pseudo(checker, parsed.ident)
+    elif isinstance(parsed, Function):
+        fname = parsed.name.replace('-', '_')
+        if fname not in checker.dispatch_map:
+            raise ExpressionError(
+                "The pseudo-class :%s() is unknown" % parsed.name)
+        if fname == 'lang':
+            if parsed.argument_types() not in (['STRING'], ['IDENT']):
+                raise ExpressionError(
+                    "Expected a single string or ident for :lang(), got %r" %
+                    parsed.arguments)
+        else:
+            parsed.parsed_arguments
+    elif isinstance(parsed, Negation):
+        _validate(checker, parsed.subselector)
+    elif isinstance(parsed, Attrib):
+        if parsed.operator not in checker.attribute_operator_mapping:
+            raise ExpressionError(
+                'Unknown attribute operator: %s' % parsed.operator)
+    elif isinstance(parsed, CombinedSelector):
+        if parsed.combinator not in checker.combinator_mapping:
+            raise ExpressionError(
+                'Unknown combinator: %r' % parsed.combinator)
+        _validate(checker, parsed.subselector)
+    elif not isinstance(parsed, (Class, Hash)):
+        raise ExpressionError('%s is not supported' % type(parsed).__name__)
+    _validate(checker, parsed.selector)
+
+
+def _index_key(parsed):
+    'Return the most selective index key of the rightmost compound selector'
+    if isinstance(parsed, CombinedSelector):
+        parsed = parsed.subselector
+    cls = tag = None
+    while True:
+        if isinstance(parsed, Hash):
+            return 'id', ascii_lower(parsed.id)
+        if isinstance(parsed, Class):
+            cls = ascii_lower(parsed.class_name)
+        elif isinstance(parsed, Pseudo) and parsed.ident == 'root':
+            break
+        elif isinstance(parsed, Element):
+            if parsed.element and parsed.element != '*':
+                tag = ascii_lower(parsed.element)
+            break
+        parsed = parsed.selector
+    if cls is not None:
+        return 'class', cls
+    if tag is not None:
+        return 'tag', tag
+    return None, None
@@ -6,6 +6,7 @@ from lxml import etree
 from lxml import html
 
 from ebook_converter.css_selectors.errors import ExpressionError
+from ebook_converter.css_selectors.index import SelectorIndex
 from ebook_converter.css_selectors.errors import SelectorSyntaxError
 from ebook_converter.css_selectors.parser import parse
 from ebook_converter.css_selectors.parser import tokenize
@@ -648,7 +649,10 @@ by William Shakespeare
         select = Select(document)
 
         def select_ids(selector):
-            for elem in select(selector):
+            elems = list(select(selector))
+            indexed = SelectorIndex([selector])(document)
+            self.ae(set(indexed(selector)), set(elems))
+            for elem in elems:
                 yield elem.get('id')
 
         def pcss(main, *selectors, **kwargs):
@@ -736,6 +740,8 @@ by William Shakespeare
         self.ae(pcss(r'[h\a0 ref]', r'[h\]ref]'), [])
 
         self.assertRaises(ExpressionError, lambda : tuple(select('body:nth-child')))
+        indexed = SelectorIndex(['body:nth-child'])(document)
+        self.assertRaises(ExpressionError, lambda : tuple(indexed('body:nth-child')))
 
         select = Select(document, ignore_inappropriate_pseudo_classes=True)
         self.assertGreater(len(tuple(select('p:hover'))), 0)
@@ -743,7 +749,11 @@ by William Shakespeare
     def test_select_shakespeare(self):
         document = html.document_fromstring(self.HTML_SHAKESPEARE)
         select = Select(document)
-        count = lambda s: sum(1 for r in select(s))
+
+        def count(s):
+            ans = sum(1 for r in select(s))
+            self.ae(set(SelectorIndex([s])(document)(s)), set(select(s)))
+            return ans
 
         # Data borrowed from http://mootools.net/slickspeed/
 
@@ -0,0 +1,293 @@
+"""
+Extracting and rendering pages of comics (CBZ, CBR and CBC files).
+
+Pages are independent of each other, so they are rendered in a pool of
+forked worker processes, one page at a time in every worker. Only paths of
+pages are sent to the workers and paths of the rendered images are sent
+back, so the memory used is bounded by the number of workers, not by the
+number of pages.
+"""
+import multiprocessing
+import os
+import re
+import traceback
+
+from ebook_converter import logging
+from ebook_converter.ptempfile import PersistentTemporaryDirectory
+
+LOG = logging.default_log
+
+# Images of pages larger than this are left at their original size
+MAX_SCREEN_SIZE = 3000
+# Spreading pages over worker processes doesn't pay off for less pages than
+# that per worker
+MIN_PAGES_PER_WORKER = 2
+# Pages are decoded at reduced size (which is possible for JPEG images) only
+# as long as they stay this many times larger than the screen, so that
+# trimming their borders doesn't make them smaller than the screen
+DRAFT_HEADROOM = 2
+PAGE_EXTENSIONS = {'jpeg', 'jpg', 'gif', 'png', 'webp'}
+
+
+def extract_archive(path, dest):
+    """
+    Extract comic (or comic collection) archive at path into directory dest.
+    """
+    from ebook_converter.ebooks.metadata.archive import archive_type
+    from ebook_converter.utils.zipfile import ZipFile
+    with open(path, 'rb') as stream:
+        atype = archive_type(stream)
+        if atype == 'rar':
+            raise ValueError('%s is a RAR archive, which is not supported. '
+                             'Repack it as a ZIP (CBZ) file.' % path)
+        with ZipFile(stream) as zf:
+            zf.extractall(dest)
+
+
+def extract_comic(path_to_comic_file):
+    """
+    Extract the comic into a temporary directory, return path to it.
+    """
+    tdir = PersistentTemporaryDirectory(suffix='_comic_extract')
+    extract_archive(path_to_comic_file, tdir)
+    # Page names end up in URLs of the book
+    for dirpath, dirnames, filenames in os.walk(tdir):
+        for name in filenames:
+            if '#' in name:
+                os.rename(os.path.join(dirpath, name),
+                          os.path.join(dirpath, name.replace('#', '_')))
+    return tdir
+
+
+def page_sort_key(path):
+    """
+    Sort key, which orders numbers in path by their value, so that page2
+    comes before page10.
+    """
+    return [(0, int(x), '') if x.isdigit() else (1, 0, x)
+            for x in re.split(r'(\d+)', path.lower())]
+
+
+def find_pages(dir, sort_on_mtime=False, verbose=False):
+    """
+    Find valid comic pages in a previously un-archived comic.
+
+    :param dir: Directory in which extracted comic lives
+    :param sort_on_mtime: If True sort pages based on their last modified
+                          time. Otherwise, sort alphabetically.
+    """
+    pages = []
+    for dirpath, dirnames, filenames in os.walk(dir, followlinks=True):
+        for name in filenames:
+            if name.rpartition('.')[-1].lower() in PAGE_EXTENSIONS:
+                pages.append(os.path.join(dirpath, name))
+    if sort_on_mtime:
+        pages.sort(key=lambda x: os.stat(x).st_mtime)
+    else:
+        pages.sort(key=page_sort_key)
+    if verbose:
+        LOG.info('Found comic pages...')
+        LOG.info('\t%s', '\n\t'.join([os.path.relpath(p, dir)
+                                      for p in pages]))
+    return pages
+
+
+def screen_size(opts):
+    """
+    Return size of the screen in pixels, which the pages are rendered for.
+    """
+    width, height = opts.output_profile.comic_screen_size
+    if opts.comic_image_size:
+        try:
+            width, height = [int(x.strip()) for x in
+                             opts.comic_image_size.split('x')]
+        except ValueError:
+            pass
+    return width, height
+
+
+class PageProcessor(list):
+    """
+    Render one page of the comic into one (or two, for landscape pages which
+    are split) images in directory dest. Paths to the images are the items of
+    the list.
+    """
+
+    def __init__(self, path_to_page, dest, opts, num):
+        list.__init__(self)
+        self.path_to_page = path_to_page
+        self.opts = opts
+        self.num = num
+        self.dest = dest
+        self.rotate = False
+        self.render()
+
+    def render(self):
+        from ebook_converter.utils.img import (image_from_data, scale_image,
+                                               crop_image, draft_image)
+        with open(self.path_to_page, 'rb') as f:
+            img = image_from_data(f.read())
+        width, height = img.size
+        split = width > height and not self.opts.landscape
+        self.rotate = width > height and self.opts.landscape
+        if not self.opts.keep_aspect_ratio and not self.opts.wide:
+            scrwidth, scrheight = screen_size(self.opts)
+            if self.rotate:
+                scrwidth, scrheight = scrheight, scrwidth
+            if split:
+                scrwidth *= 2
+            draft_image(img, DRAFT_HEADROOM * scrwidth,
+                        DRAFT_HEADROOM * scrheight)
+            width, height = img.size
+        if self.num == 0:  # First image so create a thumbnail from it
+            fmt = self.opts.output_format.lower()
+            with open(os.path.join(self.dest, 'thumbnail.' + fmt), 'wb') as f:
+                f.write(scale_image(img, as_png=fmt == 'png')[-1])
+        self.pages = [img]
+        if split:
+            half = width // 2
+            split1 = crop_image(img, 0, 0, half, height)
+            split2 = crop_image(img, half, 0, width - half, height)
+            self.pages = ([split2, split1] if self.opts.right2left
+                          else [split1, split2])
+        self.process_pages()
+
+    def _fit(self, img, scrwidth, scrheight):
+        # Preserve the aspect ratio by adding border
+        from ebook_converter.utils.img import (add_borders_to_image,
+                                               resize_image)
+        sizex, sizey = img.size
+        aspect = sizex / sizey
+        if aspect <= scrwidth / scrheight:
+            newsizey = scrheight
+            newsizex = int(newsizey * aspect)
+            deltax = (scrwidth - newsizex) // 2
+            deltay = 0
+        else:
+            newsizex = scrwidth
+            newsizey = int(newsizex // aspect)
+            deltax = 0
+            deltay = (scrheight - newsizey) // 2
+        if newsizex < MAX_SCREEN_SIZE and newsizey < MAX_SCREEN_SIZE:
+            # Too large and resizing fails, so better to leave it as
+            # original size
+            img = resize_image(img, newsizex, newsizey)
+            img = add_borders_to_image(img, left=deltax, right=deltax,
+                                       top=deltay, bottom=deltay)
+        return img
+
+    def process_pages(self):
+        from ebook_converter.utils.img import (
+            image_to_data, rotate_image, remove_borders_from_image,
+            normalize_image, resize_image, gaussian_sharpen_image,
+            grayscale_image, despeckle_image, quantize_image)
+        scrwidth, scrheight = screen_size(self.opts)
+        for i, img in enumerate(self.pages):
+            if self.rotate:
+                img = rotate_image(img, -90)
+
+            if not self.opts.disable_trim:
+                img = remove_borders_from_image(img)
+
+            # Do the Photoshop "Auto Levels" equivalent
+            if not self.opts.dont_normalize:
+                img = normalize_image(img)
+
+            if self.opts.keep_aspect_ratio:
+                img = self._fit(img, scrwidth, scrheight)
+            elif self.opts.wide:
+                # Keep aspect and use device height as scaled image width so
+                # landscape mode is clean. Add 25px back to height for the
+                # battery bar.
+                wscreenx = scrheight + 25
+                wscreeny = int(wscreenx // (scrwidth / scrheight))
+                img = self._fit(img, wscreenx, wscreeny)
+            elif scrwidth < MAX_SCREEN_SIZE and scrheight < MAX_SCREEN_SIZE:
+                img = resize_image(img, scrwidth, scrheight)
+
+            if not self.opts.dont_sharpen:
+                img = gaussian_sharpen_image(img, 0.0, 1.0)
+
+            if not self.opts.dont_grayscale:
+                img = grayscale_image(img)
+
+            if self.opts.despeckle:
+                img = despeckle_image(img)
+
+            if self.opts.output_format.lower() == 'png' and self.opts.colors:
+                img = quantize_image(img,
+                                     max_colors=min(256, self.opts.colors))
+
+            dest = '%d_%d.%s' % (self.num, i, self.opts.output_format)
+            dest = os.path.join(self.dest, dest)
+            with open(dest, 'wb') as f:
+                f.write(image_to_data(img, fmt=self.opts.output_format))
+            self.append(dest)
+
+
+# Options and destination directory of the worker processes, inherited from
+# the parent process
+_worker_args = None
+
+
+def _init_worker(opts, dest):
+    global _worker_args
+    _worker_args = (opts, dest)
+
+
+def render_page(task, opts=None, dest=None):
+    """
+    Render page from task, which is (number, path) tuple. Return tuple of the
+    path, list of the rendered images and error message or None.
+    """
+    if opts is None:
+        opts, dest = _worker_args
+    num, path = task
+    try:
+        return path, list(PageProcessor(path, dest, opts, num)), None
+    except Exception:
+        msg = 'Failed %s' % path
+        if opts.verbose:
+            msg += '\n' + traceback.format_exc()
+        return path, [], msg
+
+
+def iter_rendered_pages(pages, opts, dest):
+    """
+    Render pages into dest, in worker processes if there are enough of them.
+    Results of render_page() are yielded in the order of pages, as soon as
+    they are ready.
+    """
+    from ebook_converter.ebooks.oeb.parallel import worker_count
+    tasks = list(enumerate(pages))
+    workers = worker_count(getattr(opts, 'transform_workers', 0),
+                           len(tasks), min_items=MIN_PAGES_PER_WORKER)
+    if workers == 1:
+        for task in tasks:
+            yield render_page(task, opts, dest)
+        return
+    ctx = multiprocessing.get_context('fork')
+    with ctx.Pool(workers, initializer=_init_worker,
+                  initargs=(opts, dest)) as pool:
+        for result in pool.imap(render_page, tasks):
+            yield result
+
+
+def process_pages(pages, opts, update, tdir):
+    """
+    Render all identified comic pages. Return list of paths to the rendered
+    images and list of pages, which failed to render.
+    """
+    ans, failures = [], []
+    for done, (path, rendered, error) in enumerate(
+            iter_rendered_pages(pages, opts, tdir), start=1):
+        if error is None:
+            ans.extend(rendered)
+            msg = 'Rendered %s' % path
+        else:
+            failures.append(path)
+            msg = error
+        if opts.verbose:
+            LOG.info(msg)
+        update(done / len(pages), msg)
+    return ans, failures
@@ -0,0 +1,393 @@
+"""
+Batch conversion with a pool of warm worker processes.
+
+Each worker imports the plugins, profiles and the modules which Plumber.run
+imports lazily once, and then converts any number of books, so that the
+fixed per-book cost is paid only once per worker instead of once per book.
+
+Jobs are JSON objects, one per line::
+
+    {"id": 1, "input": "in.epub", "output": "out.mobi",
+     "options": {"base_font_size": 12}}
+
+For every job a single line with the result is written back::
+
+    {"id": 1, "input": "...", "output": "...", "status": "ok",
+     "worker": 1234, "timings": {"setup": 0.01, "convert": 1.2,
+     "total": 1.21}}
+
+In case of failure, status is set to "error" and "error" and "traceback"
+keys are added. Jobs whose worker process died (or was killed after running
+longer than the job timeout) are reported as failed as well.
+"""
+import importlib
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+from ebook_converter import logging
+from ebook_converter import ptempfile
+
+
+LOG = logging.default_log
+
+# Modules imported lazily by Plumber.run and the common input/output
+# plugins. Importing them in the worker initializer takes that cost out of
+# the first job handled by each worker.
+WARM_MODULES = ('ebook_converter.ebooks.oeb.base',
+                'ebook_converter.ebooks.oeb.reader',
+                'ebook_converter.ebooks.oeb.writer',
+                'ebook_converter.ebooks.oeb.stylizer',
+                'ebook_converter.ebooks.oeb.transforms.data_url',
+                'ebook_converter.ebooks.oeb.transforms.guide',
+                'ebook_converter.ebooks.oeb.transforms.jacket',
+                'ebook_converter.ebooks.oeb.transforms.metadata',
+                'ebook_converter.ebooks.oeb.transforms.structure',
+                'ebook_converter.ebooks.oeb.transforms.flatcss',
+                'ebook_converter.ebooks.oeb.transforms.page_margin',
+                'ebook_converter.ebooks.oeb.transforms.trimmanifest',
+                'ebook_converter.ebooks.metadata.opf2',
+                'ebook_converter.ebooks.mobi.reader.mobi6',
+                'ebook_converter.ebooks.mobi.writer2.main',
+                'ebook_converter.ebooks.oeb.transforms.htmltoc',
+                'ebook_converter.ebooks.fb2.fb2ml',
+                'ebook_converter.ebooks.docx.to_html',
+                'ebook_converter.ebooks.docx.writer.from_html',
+                'ebook_converter.ebooks.txt.processor',
+                'css_parser')
+# Seconds between checks of the worker processes running the jobs
+MONITOR_INTERVAL = 1.0
+
+
+def warm_up():
+    """
+    Import and initialize everything a conversion needs up front.
+    """
+    from ebook_converter.customize import ui
+
+    # Force plugin registration and profile instantiation
+    list(ui.input_profiles())
+    list(ui.output_profiles())
+    for fmt in ui.available_input_formats():
+        ui.plugin_for_input_format(fmt)
+    for fmt in ui.available_output_formats():
+        ui.plugin_for_output_format(fmt)
+
+    for name in WARM_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            LOG.debug('Unable to preload module %s', name)
+
+
+def redirect_stdout():
+    """
+    Redirect stdout of the worker process to stderr, where the log goes.
+    Anything plugins print to stdout would end up mixed with results written
+    by the parent process otherwise.
+    """
+    try:
+        os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    except (AttributeError, OSError, ValueError):
+        pass
+    sys.stdout = sys.stderr
+
+
+# Queue for telling the parent which job a worker process started
+_started = None
+
+
+def _init_worker(started=None):
+    global _started
+    _started = started
+    redirect_stdout()
+    warm_up()
+
+
+def _run_submitted(token, job):
+    if _started is not None:
+        _started.put((token, os.getpid()))
+    return run_job(job)
+
+
+def error_result(job, error):
+    """
+    Return result dictionary of job, which failed outside of run_job().
+    """
+    return {'id': job.get('id'), 'input': job.get('input'),
+            'output': job.get('output'), 'status': 'error',
+            'error': str(error) or error.__class__.__name__}
+
+
+def run_job(job):
+    """
+    Convert single book described by job dictionary. Return result
+    dictionary.
+    """
+    from ebook_converter.customize.conversion import OptionRecommendation
+    from ebook_converter.ebooks.conversion.plumber import Plumber
+
+    start = time.time()
+    result = {'id': job.get('id'), 'input': job.get('input'),
+              'output': job.get('output'), 'worker': os.getpid(),
+              'status': 'ok'}
+    timings = result['timings'] = {}
+
+    # Temporary files of a job are kept in its own directory, which is
+    # removed as soon as the job is done, so they don't pile up in long
+    # living workers.
+    job_dir = tempfile.mkdtemp(prefix='job_', dir=ptempfile.base_dir())
+    orig_base_dir = ptempfile._base_dir
+    ptempfile._base_dir = job_dir
+    try:
+        if not job.get('input') or not job.get('output'):
+            raise ValueError('Both input and output needs to be provided')
+        plumber = Plumber(job['input'], job['output'], LOG)
+        recommendations = []
+        for name, value in (job.get('options') or {}).items():
+            if plumber.get_option_by_name(name) is None:
+                raise ValueError('Unknown option: %s' % name)
+            recommendations.append((name, value,
+                                    OptionRecommendation.HIGH))
+        plumber.merge_ui_recommendations(recommendations)
+        timings['setup'] = time.time() - start
+
+        convert_start = time.time()
+        plumber.run()
+        timings['convert'] = time.time() - convert_start
+        result['output'] = plumber.output
+    except Exception as exc:
+        result['status'] = 'error'
+        result['error'] = str(exc) or exc.__class__.__name__
+        result['traceback'] = traceback.format_exc()
+    finally:
+        ptempfile._base_dir = orig_base_dir
+        shutil.rmtree(job_dir, ignore_errors=True)
+
+    timings['total'] = time.time() - start
+    return result
+
+
+class BatchConverter(object):
+    """
+    Pool of warm worker processes, which converts submitted jobs.
+    """
+
+    def __init__(self, workers=None, max_jobs_per_worker=None,
+                 job_timeout=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.job_timeout = job_timeout
+        self.pool = None
+        self.monitor = None
+        # Submitted jobs not reported yet, by their tokens
+        self.jobs = {}
+        self.jobs_lock = threading.Condition()
+        self.tokens = itertools.count()
+        # Number of jobs the pool lost with their worker processes
+        self.lost = 0
+
+    def start(self):
+        if self.pool is None:
+            self.started = multiprocessing.SimpleQueue()
+            self.pool = multiprocessing.Pool(
+                self.workers, initializer=_init_worker,
+                initargs=(self.started,),
+                maxtasksperchild=self.max_jobs_per_worker)
+            self.stopping = threading.Event()
+            self.monitor = threading.Thread(target=self.monitor_workers,
+                                            name='BatchMonitor', daemon=True)
+            self.monitor.start()
+        return self
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            with self.jobs_lock:
+                self.jobs_lock.wait_for(lambda: not self.jobs)
+            if self.lost:
+                # The pool waits for the lost jobs forever otherwise
+                self.pool.terminate()
+            self.pool.join()
+            self.stopping.set()
+            self.monitor.join()
+            self.pool = self.monitor = None
+            self.started.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.close()
+
+    def submit(self, job, callback):
+        """
+        Schedule job for conversion. Callback will be called exactly once
+        with the result dictionary, from the thread which collects results
+        from workers or from the thread monitoring them.
+        """
+        token = next(self.tokens)
+        with self.jobs_lock:
+            # Worker process id and time the job was started, once known
+            self.jobs[token] = {'job': job, 'callback': callback,
+                                'pid': None, 'start': None, 'gone': False}
+        return self.pool.apply_async(
+            _run_submitted, (token, job),
+            callback=lambda result: self.finish(token, result),
+            error_callback=lambda exc: self.finish(
+                token, error_result(job, exc)))
+
+    def finish(self, token, result, lost=False):
+        with self.jobs_lock:
+            entry = self.jobs.pop(token, None)
+            if entry is not None:
+                self.lost += lost
+            self.jobs_lock.notify_all()
+        if entry is not None:
+            entry['callback'](result)
+
+    def monitor_workers(self):
+        """
+        Report jobs whose worker process is gone, and kill workers running
+        a job for longer than job_timeout. The pool replaces dead workers,
+        but it never reports jobs they were running.
+        """
+        while not self.stopping.wait(MONITOR_INTERVAL):
+            while not self.started.empty():
+                token, pid = self.started.get()
+                with self.jobs_lock:
+                    entry = self.jobs.get(token)
+                    if entry is not None:
+                        entry['pid'], entry['start'] = pid, time.time()
+            with self.jobs_lock:
+                running = [(token, entry) for token, entry in
+                           self.jobs.items() if entry['pid'] is not None]
+            for token, entry in running:
+                error = None
+                if not _is_alive(entry['pid']):
+                    # The result might be just on its way from a worker,
+                    # which exited after finishing its last job
+                    if entry['gone']:
+                        error = 'Worker process died'
+                    entry['gone'] = True
+                elif (self.job_timeout and
+                      time.time() - entry['start'] > self.job_timeout):
+                    error = 'Timed out after %d seconds' % self.job_timeout
+                    _kill(entry['pid'])
+                if error is not None:
+                    LOG.error('Job %r failed: %s', entry['job'].get('id'),
+                              error)
+                    self.finish(token, error_result(entry['job'],
+                                                    RuntimeError(error)),
+                                lost=True)
+
+    def serve_stream(self, instream, outstream):
+        """
+        Read jobs as JSON lines from the binary instream, and write results
+        as JSON lines into binary outstream, in order of completion. Return
+        the number of failed jobs.
+        """
+        done = threading.Condition()
+        pending = [0]
+        failed = [0]
+
+        def reply(result, submitted=True):
+            line = json.dumps(result, ensure_ascii=False) + '\n'
+            with done:
+                if result['status'] != 'ok':
+                    failed[0] += 1
+                try:
+                    outstream.write(line.encode('utf-8'))
+                    outstream.flush()
+                except (OSError, ValueError):
+                    LOG.error('Unable to write result of job %r',
+                              result.get('id'))
+                if submitted:
+                    pending[0] -= 1
+                    done.notify_all()
+
+        for line in instream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                job = json.loads(line)
+                if not isinstance(job, dict):
+                    raise ValueError('Job has to be a JSON object')
+            except ValueError as exc:
+                reply({'id': None, 'status': 'error',
+                       'error': 'Invalid job: %s' % exc}, submitted=False)
+                continue
+            with done:
+                pending[0] += 1
+            self.submit(job, reply)
+
+        # Every job gets reported, even if its worker dies
+        with done:
+            done.wait_for(lambda: pending[0] == 0)
+        return failed[0]
+
+    def serve_socket(self, path):
+        """
+        Listen on unix socket under path. Every connection is handled as a
+        separate stream of jobs.
+        """
+        converter = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                converter.serve_stream(self.rfile, self.wfile)
+
+        if os.path.exists(path):
+            os.remove(path)
+        server = socketserver.ThreadingUnixStreamServer(path, Handler)
+        server.daemon_threads = True
+        LOG.info('Waiting for jobs on %s', path)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            os.remove(path)
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def _kill(pid):
+    try:
+        os.kill(pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+def serve(workers=None, socket_path=None, max_jobs_per_worker=None,
+          job_timeout=None):
+    """
+    Start batch converter and read jobs from stdin or from the unix socket.
+    """
+    with BatchConverter(workers, max_jobs_per_worker,
+                        job_timeout) as converter:
+        LOG.info('Started %d worker processes', converter.workers)
+        if socket_path:
+            converter.serve_socket(socket_path)
+            return 0
+        failed = converter.serve_stream(sys.stdin.buffer, sys.stdout.buffer)
+    return 1 if failed else 0
@@ -21,8 +21,8 @@ class AZW4Input(InputFormatPlugin):
         from ebook_converter.ebooks.pdb.header import PdbHeaderReader
         from ebook_converter.ebooks.azw4.reader import Reader
 
-        header = PdbHeaderReader(stream)
-        reader = Reader(header, stream, log, options)
-        opf = reader.extract_content(os.getcwd())
+        with PdbHeaderReader(stream) as header:
+            reader = Reader(header, stream, log, options)
+            opf = reader.extract_content(os.getcwd())
 
         return opf
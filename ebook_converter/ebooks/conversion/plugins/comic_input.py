@@ -89,9 +89,9 @@ class ComicInput(InputFormatPlugin):
         }
 
     def get_comics_from_collection(self, stream):
-        from ebook_converter.libunzip import extract as zipextract
+        from ebook_converter.ebooks.comic.input import extract_archive
         tdir = PersistentTemporaryDirectory('_comic_collection')
-        zipextract(stream, tdir)
+        extract_archive(stream.name, tdir)
         comics = []
         with directory.CurrentDir(tdir):
             if not os.path.exists('comics.txt'):
@@ -1,3 +1,4 @@
+import functools
 import hashlib
 import itertools
 import os
@@ -79,6 +80,8 @@ class EPUBInput(InputFormatPlugin):
                 path = os.path.abspath(os.path.join(os.path.dirname(encfile),
                                                     '..', *uri.split('/')))
                 tkey = (key if algorithm == ADOBE_OBFUSCATION else idpf_key)
+                if tkey and self._container is not None:
+                    self._container.extract(os.path.relpath(path))
                 if (tkey and os.path.exists(path)):
                     self._encrypted_font_uris.append(uri)
                     decrypt_font(tkey, path, algorithm)
@@ -266,15 +269,30 @@ class EPUBInput(InputFormatPlugin):
     def convert(self, stream, options, file_ext, log, accelerators):
         from ebook_converter.utils.zipfile import ZipFile
         from ebook_converter.ebooks import DRMError
+        from ebook_converter.ebooks.oeb.reader import ZipReader
 
         _path_or_stream = getattr(stream, 'name', 'stream')
+        self.oeb_reader = self._container = None
         try:
             zf = ZipFile(stream)
-            zf.extractall(os.getcwd())
+            if (getattr(options, 'debug_pipeline', None) is not None or
+                    any(info.flag_bits & 0x1 for info in zf.infolist())):
+                # The input dump is a copy of the whole directory, and
+                # encrypted members cannot be read lazily.
+                zf.extractall(os.getcwd())
+            else:
+                # Only the files this plugin changes on disk are extracted,
+                # the rest is read from the zip file by OEBReader, when
+                # needed.
+                self._container = base.ZipContainer(os.getcwd(), log, zf,
+                                                    ignore_opf=True)
+                zf.extractall(os.getcwd(),
+                              members=self.control_files(zf.infolist()))
         except Exception:
             log.exception('EPUB appears to be invalid ZIP file, trying a '
                           'more forgiving ZIP parser')
             from ebook_converter.utils.localunzip import extractall
+            self._container = None
             stream.seek(0)
             extractall(stream)
         encfile = os.path.abspath(os.path.join('META-INF', 'encryption.xml'))
@@ -312,6 +330,12 @@ class EPUBInput(InputFormatPlugin):
             for elem in opf.iterguide():
                 elem.set('href', os.path.join(path, elem.get('href')))
 
+        if self._container is not None and opf.package_version >= 3.0:
+            # The navigation document is converted on disk
+            for elem in opf.itermanifest():
+                if 'nav' in (elem.get('properties') or '').lower().split():
+                    self._container.extract(elem.get('href', ''))
+
         if opf.package_version >= 3.0:
             f = self.rationalize_cover3
         else:
@@ -362,8 +386,23 @@ class EPUBInput(InputFormatPlugin):
         with open('content.opf', 'wb') as nopf:
             nopf.write(opf.render())
 
+        if self._container is not None:
+            self.oeb_reader = functools.partial(ZipReader, zf)
         return os.path.abspath('content.opf')
 
+    def control_files(self, infolist):
+        """
+        Return names of the zip members needed on disk to find, fix and
+        rewrite the OPF.
+        """
+        names = []
+        for info in infolist:
+            name = base.zip_member_path(info.filename)
+            if (name.split('/')[0].upper() == 'META-INF' or
+                    os.path.splitext(name)[1].lower() in ('.opf', '.ncx')):
+                names.append(info.filename)
+        return names
+
     def convert_epub3_nav(self, nav_path, opf, log, opts):
         from lxml import etree
         from ebook_converter.ebooks.chardet import xml_to_unicode
@@ -1,6 +1,8 @@
+import itertools
 import os
 import re
 import shutil
+import time
 import urllib.parse
 import uuid
 
@@ -241,17 +243,44 @@ class EPUBOutput(OutputFormatPlugin):
                 if str(x) == _uuid:
                     x.content = 'urn:uuid:' + _uuid
 
+        metadata_xml = None
+        extra_entries = []
+        if self.is_periodical:
+            if self.opts.output_profile.epub_periodical_format == 'sony':
+                from ebook_converter.ebooks.epub.periodical import sony_metadata
+                metadata_xml, atom_xml = sony_metadata(oeb)
+                extra_entries = [('atom.xml', 'application/atom+xml', atom_xml)]
+
+        if self.opts.epub_version == '3':
+            # The upgrade works on a container, which needs the book
+            # written out to a directory
+            self.write_from_directory(output_path, input_plugin,
+                                      encrypted_fonts, _uuid, extra_entries,
+                                      metadata_xml)
+        else:
+            self.write_to_zip(output_path, encrypted_fonts, _uuid,
+                              extra_entries, metadata_xml)
+
+        if opts.extract_to is not None:
+            from ebook_converter.utils.zipfile import ZipFile
+            if os.path.exists(opts.extract_to):
+                if os.path.isdir(opts.extract_to):
+                    shutil.rmtree(opts.extract_to)
+                else:
+                    os.remove(opts.extract_to)
+            os.mkdir(opts.extract_to)
+            with ZipFile(output_path) as zf:
+                zf.extractall(path=opts.extract_to)
+            self.log.info('EPUB extracted to %s', opts.extract_to)
+
+    def write_from_directory(self, output_path, input_plugin, encrypted_fonts,
+                             _uuid, extra_entries, metadata_xml):
+        from ebook_converter.customize.ui import plugin_for_output_format
+        from ebook_converter.ebooks.epub import initialize_container
         with TemporaryDirectory('_epub_output') as tdir:
-            from ebook_converter.customize.ui import plugin_for_output_format
-            metadata_xml = None
-            extra_entries = []
-            if self.is_periodical:
-                if self.opts.output_profile.epub_periodical_format == 'sony':
-                    from ebook_converter.ebooks.epub.periodical import sony_metadata
-                    metadata_xml, atom_xml = sony_metadata(oeb)
-                    extra_entries = [('atom.xml', 'application/atom+xml', atom_xml)]
             oeb_output = plugin_for_output_format('oeb')
-            oeb_output.convert(oeb, tdir, input_plugin, opts, log)
+            oeb_output.convert(self.oeb, tdir, input_plugin, self.opts,
+                               self.log)
             opf = [x for x in os.listdir(tdir) if x.endswith('.opf')][0]
             self.condense_ncx([os.path.join(tdir, x) for x in os.listdir(tdir)
                     if x.endswith('.ncx')][0])
@@ -261,27 +290,75 @@ class EPUBOutput(OutputFormatPlugin):
             if encrypted_fonts:
                 encryption = self.encrypt_fonts(encrypted_fonts, tdir, _uuid)
 
-            from ebook_converter.ebooks.epub import initialize_container
             with initialize_container(output_path, os.path.basename(opf),
                     extra_entries=extra_entries) as epub:
                 epub.add_dir(tdir)
-                if encryption is not None:
-                    epub.writestr('META-INF/encryption.xml',
-                                  polyglot.as_bytes(encryption))
-                if metadata_xml is not None:
-                    epub.writestr('META-INF/metadata.xml',
-                            metadata_xml.encode('utf-8'))
-            if opts.extract_to is not None:
-                from ebook_converter.utils.zipfile import ZipFile
-                if os.path.exists(opts.extract_to):
-                    if os.path.isdir(opts.extract_to):
-                        shutil.rmtree(opts.extract_to)
-                    else:
-                        os.remove(opts.extract_to)
-                os.mkdir(opts.extract_to)
-                with ZipFile(output_path) as zf:
-                    zf.extractall(path=opts.extract_to)
-                self.log.info('EPUB extracted to %s', opts.extract_to)
+                self.write_meta_inf(epub, encryption, metadata_xml)
+
+    def write_to_zip(self, output_path, encrypted_fonts, _uuid, extra_entries,
+                     metadata_xml):
+        """
+        Serialize the book straight into the EPUB file, with the same
+        entries as adding the directory written by the OEB output plugin.
+        """
+        from ebook_converter.customize.ui import plugin_for_output_format
+        from ebook_converter.ebooks.epub import initialize_container
+        oeb_output = plugin_for_output_format('oeb')
+        oeb_output.log, oeb_output.opts = self.log, self.opts
+        files = oeb_output.iter_files(self.oeb, raw_members=True)
+        opf, raw, _ = next(files)
+
+        if encrypted_fonts:
+            key = self.font_key(_uuid)
+        encrypted = set()
+        dirs = set()
+        with initialize_container(output_path, os.path.basename(opf),
+                extra_entries=extra_entries) as epub:
+            for name, raw, item in itertools.chain([(opf, raw, None)],
+                                                   files):
+                if name.endswith('.ncx') and item is None:
+                    raw = self.condense_ncx_data(raw)
+                if isinstance(raw, tuple) and name in encrypted_fonts:
+                    raw = item.bytes_representation
+                if name in encrypted_fonts:
+                    self.log.debug('Encrypting font: %s', name)
+                    raw = self.obfuscate_font(raw, key, name)
+                    encrypted.add(name)
+                parent = name.rpartition('/')[0]
+                parents = []
+                while parent and parent not in dirs:
+                    parents.append(parent)
+                    parent = parent.rpartition('/')[0]
+                for parent in reversed(parents):
+                    dirs.add(parent)
+                    epub.writestr(parent + '/', b'', 0o755)
+                if isinstance(raw, tuple):
+                    # Unchanged file from the input EPUB, copied without
+                    # recompressing
+                    self.write_raw_member(epub, name, *raw)
+                    continue
+                epub.writestr(name, raw, 0o100644)
+            encryption = self.encryption_xml(
+                [uri for uri in encrypted_fonts if uri in encrypted])
+            self.write_meta_inf(epub, encryption, metadata_xml)
+
+    def write_raw_member(self, epub, name, info, raw):
+        from ebook_converter.utils.zipfile import ZipInfo
+        zinfo = ZipInfo(name, date_time=time.localtime(time.time())[:6])
+        zinfo.compress_type = info.compress_type
+        zinfo.CRC = info.CRC
+        zinfo.compress_size = info.compress_size
+        zinfo.file_size = info.file_size
+        zinfo.external_attr = 0o100644 << 16
+        epub.writestr(zinfo, raw, raw_bytes=True)
+
+    def write_meta_inf(self, epub, encryption, metadata_xml):
+        if encryption is not None:
+            epub.writestr('META-INF/encryption.xml',
+                          polyglot.as_bytes(encryption))
+        if metadata_xml is not None:
+            epub.writestr('META-INF/metadata.xml',
+                    metadata_xml.encode('utf-8'))
 
     def upgrade_to_epub3(self, tdir, opf):
         self.log.info('Upgrading to EPUB 3...')
@@ -309,10 +386,7 @@ class EPUBOutput(OutputFormatPlugin):
             pass
 
     def encrypt_fonts(self, uris, tdir, _uuid):  # {{{
-        key = re.sub(r'[^a-fA-F0-9]', '', _uuid)
-        if len(key) < 16:
-            raise ValueError('UUID identifier %r is invalid'% _uuid)
-        key = bytearray(polyglot.from_hex_bytes((key + key)[:32]))
+        key = self.font_key(_uuid)
         paths = []
         with directory.CurrentDir(tdir):
             paths = [os.path.join(*x.split('/')) for x in uris]
@@ -326,16 +400,35 @@ class EPUBOutput(OutputFormatPlugin):
                 self.log.debug('Encrypting font: %s', uri)
                 with open(path, 'r+b') as f:
                     data = f.read(1024)
-                    if len(data) >= 1024:
-                        data = bytearray(data)
-                        f.seek(0)
-                        f.write(bytes(bytearray(data[i] ^ key[i%16]
-                                                for i in range(1024))))
-                    else:
-                        self.log.warning('Font %s is invalid, ignoring', path)
+                    f.seek(0)
+                    f.write(self.obfuscate_font(data, key, path))
                 if not isinstance(uri, str):
                     uri = uri.decode('utf-8')
-                fonts.append('''
+                fonts.append(uri)
+            return self.encryption_xml(fonts)
+
+    def font_key(self, _uuid):
+        key = re.sub(r'[^a-fA-F0-9]', '', _uuid)
+        if len(key) < 16:
+            raise ValueError('UUID identifier %r is invalid'% _uuid)
+        return bytearray(polyglot.from_hex_bytes((key + key)[:32]))
+
+    def obfuscate_font(self, data, key, name):
+        """
+        Return data of the font with the first 1024 bytes obfuscated with
+        the key.
+        """
+        if len(data) < 1024:
+            self.log.warning('Font %s is invalid, ignoring', name)
+            return data
+        head = bytearray(data[:1024])
+        return bytes(bytearray(head[i] ^ key[i%16]
+                               for i in range(1024))) + data[1024:]
+
+    def encryption_xml(self, uris):
+        fonts = []
+        for uri in uris:
+            fonts.append('''
                 <enc:EncryptedData>
                     <enc:EncryptionMethod Algorithm="http://ns.adobe.com/pdf/enc#RC"/>
                     <enc:CipherData>
@@ -343,29 +436,36 @@ class EPUBOutput(OutputFormatPlugin):
                     </enc:CipherData>
                 </enc:EncryptedData>
                 '''%(uri.replace('"', '\\"')))
-            if fonts:
-                ans = '''<encryption
-                    xmlns="urn:oasis:names:tc:opendocument:xmlns:container"
-                    xmlns:enc="http://www.w3.org/2001/04/xmlenc#"
-                    xmlns:deenc="http://ns.adobe.com/digitaleditions/enc">
-                    '''
-                ans += '\n'.join(fonts)
-                ans += '\n</encryption>'
-                return ans
+        if fonts:
+            ans = '''<encryption
+                xmlns="urn:oasis:names:tc:opendocument:xmlns:container"
+                xmlns:enc="http://www.w3.org/2001/04/xmlenc#"
+                xmlns:deenc="http://ns.adobe.com/digitaleditions/enc">
+                '''
+            ans += '\n'.join(fonts)
+            ans += '\n</encryption>'
+            return ans
     # }}}
 
     def condense_ncx(self, ncx_path):  # {{{
-        from lxml import etree
-        if not self.opts.pretty_print:
-            tree = etree.parse(ncx_path)
-            for tag in tree.getroot().iter(tag=etree.Element):
-                if tag.text:
-                    tag.text = tag.text.strip()
-                if tag.tail:
-                    tag.tail = tag.tail.strip()
-            compressed = etree.tostring(tree.getroot(), encoding='utf-8')
+        with open(ncx_path, 'rb') as f:
+            raw = f.read()
+        compressed = self.condense_ncx_data(raw)
+        if compressed is not raw:
             with open(ncx_path, 'wb') as f:
                 f.write(compressed)
+
+    def condense_ncx_data(self, raw):
+        from lxml import etree
+        if self.opts.pretty_print:
+            return raw
+        tree = etree.fromstring(raw)
+        for tag in tree.iter(tag=etree.Element):
+            if tag.text:
+                tag.text = tag.text.strip()
+            if tag.tail:
+                tag.tail = tag.tail.strip()
+        return etree.tostring(tree, encoding='utf-8')
     # }}}
 
     def workaround_ade_quirks(self):  # {{{
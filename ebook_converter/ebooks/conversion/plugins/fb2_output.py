@@ -178,7 +178,6 @@ class FB2Output(OutputFormatPlugin):
         linearize_jacket(oeb_book)
 
         fb2mlizer = FB2MLizer(log)
-        fb2_content = fb2mlizer.extract_content(oeb_book, opts)
 
         close = False
         if not hasattr(output_path, 'write'):
@@ -189,9 +188,10 @@ class FB2Output(OutputFormatPlugin):
         else:
             out_stream = output_path
 
-        out_stream.seek(0)
-        out_stream.truncate()
-        out_stream.write(fb2_content.encode('utf-8', 'replace'))
-
-        if close:
-            out_stream.close()
+        try:
+            out_stream.seek(0)
+            out_stream.truncate()
+            fb2mlizer.write_content(oeb_book, opts, out_stream)
+        finally:
+            if close:
+                out_stream.close()
@@ -19,15 +19,17 @@ class MOBIInput(InputFormatPlugin):
         from ebook_converter.ebooks.mobi.reader.mobi6 import MobiReader
         from lxml import html
         parse_cache = {}
+        workers = getattr(options, 'transform_workers', 1)
         try:
             mr = MobiReader(stream, log, options.input_encoding,
-                        options.debug_pipeline)
+                        options.debug_pipeline, workers=workers)
             if mr.kf8_type is None:
                 mr.extract_content('.', parse_cache)
 
         except:
             mr = MobiReader(stream, log, options.input_encoding,
-                        options.debug_pipeline, try_extra_data_fix=True)
+                        options.debug_pipeline, try_extra_data_fix=True,
+                        workers=workers)
             if mr.kf8_type is None:
                 mr.extract_content('.', parse_cache)
 
@@ -26,46 +26,63 @@ class OEBOutput(OutputFormatPlugin):
         if not os.path.exists(output_path):
             os.makedirs(output_path)
         with directory.CurrentDir(output_path):
-            results = oeb_book.to_opf2(page_map=True)
-            for key in (OPF_MIME, NCX_MIME, PAGE_MAP_MIME):
-                href, root = results.pop(key, [None, None])
-                if root is not None:
-                    if key == OPF_MIME:
-                        try:
-                            self.workaround_nook_cover_bug(root)
-                        except:
-                            self.log.exception('Something went wrong while '
-                                               'trying to workaround Nook '
-                                               'cover bug, ignoring')
-                        try:
-                            self.workaround_pocketbook_cover_bug(root)
-                        except:
-                            self.log.exception('Something went wrong while '
-                                               'trying to workaround '
-                                               'Pocketbook cover bug, '
-                                               'ignoring')
-                        self.migrate_lang_code(root)
-                    raw = etree.tostring(root, pretty_print=True,
-                            encoding='utf-8', xml_declaration=True)
-                    if key == OPF_MIME:
-                        # Needed as I can't get lxml to output opf:role and
-                        # not output <opf:metadata> as well
-                        raw = re.sub(br'(<[/]{0,1})opf:', br'\1', raw)
-                    with open(href, 'wb') as f:
-                        f.write(raw)
-
-            for item in oeb_book.manifest:
-                if (
-                        not self.opts.expand_css and item.media_type in OEB_STYLES and hasattr(
-                            item.data, 'cssText') and 'nook' not in self.opts.output_profile.short_name):
-                    condense_sheet(item.data)
-                path = os.path.abspath(polyglot.unquote(item.href))
+            for href, raw, item in self.iter_files(oeb_book):
+                path = os.path.abspath(href)
                 dir = os.path.dirname(path)
                 if not os.path.exists(dir):
                     os.makedirs(dir)
                 with open(path, 'wb') as f:
-                    f.write(item.bytes_representation)
-                item.unload_data_from_memory(memory=path)
+                    f.write(raw)
+                if item is not None:
+                    item.unload_data_from_memory(memory=path)
+
+    def iter_files(self, oeb_book, raw_members=False):
+        """
+        Serialize the book one file at a time. Yield tuples of file name
+        (relative, with / as separator), its contents and the manifest item
+        it comes from, which is None for the OPF (always first), NCX and
+        page map. If raw_members is True, the contents of items which can be
+        copied from the input zip file unchanged is the tuple of ZipInfo and
+        compressed data (see Item.raw_member) instead.
+        """
+        results = oeb_book.to_opf2(page_map=True)
+        for key in (OPF_MIME, NCX_MIME, PAGE_MAP_MIME):
+            href, root = results.pop(key, [None, None])
+            if root is not None:
+                if key == OPF_MIME:
+                    try:
+                        self.workaround_nook_cover_bug(root)
+                    except:
+                        self.log.exception('Something went wrong while '
+                                           'trying to workaround Nook '
+                                           'cover bug, ignoring')
+                    try:
+                        self.workaround_pocketbook_cover_bug(root)
+                    except:
+                        self.log.exception('Something went wrong while '
+                                           'trying to workaround '
+                                           'Pocketbook cover bug, '
+                                           'ignoring')
+                    self.migrate_lang_code(root)
+                raw = etree.tostring(root, pretty_print=True,
+                        encoding='utf-8', xml_declaration=True)
+                if key == OPF_MIME:
+                    # Needed as I can't get lxml to output opf:role and
+                    # not output <opf:metadata> as well
+                    raw = re.sub(br'(<[/]{0,1})opf:', br'\1', raw)
+                yield href, raw, None
+
+        for item in oeb_book.manifest:
+            if raw_members:
+                raw = item.raw_member
+                if raw is not None:
+                    yield polyglot.unquote(item.href), raw, item
+                    continue
+            if (
+                    not self.opts.expand_css and item.media_type in OEB_STYLES and hasattr(
+                        item.data, 'cssText') and 'nook' not in self.opts.output_profile.short_name):
+                condense_sheet(item.data)
+            yield polyglot.unquote(item.href), item.bytes_representation, item
 
     def workaround_nook_cover_bug(self, root):  # {{{
         cov = root.xpath('//*[local-name() = "meta" and @name="cover" and'
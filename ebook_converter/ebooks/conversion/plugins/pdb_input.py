@@ -16,19 +16,20 @@ class PDBInput(InputFormatPlugin):
     def convert(self, stream, options, file_ext, log,
                 accelerators):
 
-        header = PdbHeaderReader(stream)
-        Reader = get_reader(header.ident)
+        with PdbHeaderReader(stream) as header:
+            Reader = get_reader(header.ident)
 
-        if Reader is None:
-            raise PDBError('No reader available for format within container.'
-                           '\n Identity is %s. Book type is %s' %
-                           (header.ident,
-                            IDENTITY_TO_NAME.get(header.ident, 'Unknown')))
+            if Reader is None:
+                raise PDBError('No reader available for format within '
+                               'container.\n Identity is %s. Book type is %s'
+                               % (header.ident,
+                                  IDENTITY_TO_NAME.get(header.ident,
+                                                       'Unknown')))
 
-        log.debug('Detected ebook format as: %s with identity: %s',
-                  IDENTITY_TO_NAME[header.ident], header.ident)
+            log.debug('Detected ebook format as: %s with identity: %s',
+                      IDENTITY_TO_NAME[header.ident], header.ident)
 
-        reader = Reader(header, stream, log, options)
-        opf = reader.extract_content(os.getcwd())
+            reader = Reader(header, stream, log, options)
+            opf = reader.extract_content(os.getcwd())
 
         return opf
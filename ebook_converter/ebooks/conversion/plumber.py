@@ -123,6 +123,36 @@ OptionRecommendation(name='debug_pipeline',
                      'of the conversion process a bug is occurring.'
         ),
 
+OptionRecommendation(name='transform_workers',
+            recommended_value=0, level=OptionRecommendation.LOW,
+            help='Number of worker processes used to run the transforms, '
+            'which can work on every file of the book independently (like '
+            'CSS flattening), and to decompress the text of the input (for '
+            'MOBI and PalmDoc) and compress the text of the output (for '
+            'MOBI), in parallel. By default, when the value is zero, the '
+            'number of CPUs is used. Set to 1 to disable parallel '
+            'processing. Small books are always processed in a single '
+            'process.'
+        ),
+
+OptionRecommendation(name='css_selector_engine',
+            recommended_value='index', level=OptionRecommendation.LOW,
+            choices=['index', 'select'],
+            help='Engine used for matching CSS rules against the HTML. '
+            'The default, index, matches all the rules in a single pass '
+            'over every file, testing only the rules which could possibly '
+            'apply to each element. select matches every rule separately, '
+            'which is slower for books with many CSS rules.'
+        ),
+
+OptionRecommendation(name='style_cache_dir',
+            recommended_value=None, level=OptionRecommendation.LOW,
+            help='Directory used to store styles computed for the HTML '
+            'files of the book, so that converting the same book again, for '
+            'example to a different output format, does not need to compute '
+            'them again. By default computed styles are kept in memory only.'
+        ),
+
 OptionRecommendation(name='input_profile',
             recommended_value='default', level=OptionRecommendation.LOW,
             choices=[x.short_name for x in input_profiles()],
@@ -220,6 +250,14 @@ OptionRecommendation(name='subset_embedded_fonts',
             'particularly large font with lots of unused glyphs.'
         ),
 
+OptionRecommendation(name='subset_cache_dir',
+        recommended_value=None, level=OptionRecommendation.LOW,
+        help='Directory used to store subset fonts, so that converting the '
+            'same book again, or another book with the same fonts and '
+            'characters, does not need to subset them again. By default '
+            'subset fonts are kept in memory only.'
+        ),
+
 OptionRecommendation(name='linearize_tables',
             recommended_value=False, level=OptionRecommendation.LOW,
             help='Some badly designed documents use tables to control the '
@@ -928,7 +966,7 @@ OptionRecommendation(name='search_replace',
             self.log.info('Conversion options changed from defaults:')
             for rec in self.changed_options:
                 if rec.option.name not in ('username', 'password'):
-                    self.log.info(' %s', rec.option.name,
+                    self.log.info(' %s: %s', rec.option.name,
                                   repr(rec.recommended_value))
         if self.opts.verbose > 1:
             self.log.debug('Resolved conversion options')
@@ -1048,6 +1086,7 @@ OptionRecommendation(name='search_replace',
             if not hasattr(self.oeb, 'manifest'):
                 self.oeb = create_oebbook(
                     self.log, self.oeb, self.opts,
+                    reader=getattr(self.input_plugin, 'oeb_reader', None),
                     encoding=self.input_plugin.output_encoding,
                     for_regex_wizard=self.for_regex_wizard, removed_items=getattr(self.input_plugin, 'removed_items_to_ignore', ()))
             if self.for_regex_wizard:
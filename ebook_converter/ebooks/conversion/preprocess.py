@@ -1,8 +1,11 @@
+import contextlib
 import functools
 import json
 import math
 import re
+import time
 
+from ebook_converter.ebooks.conversion.rules import Rule, RuleEngine
 from ebook_converter.utils import entities
 
 
@@ -34,6 +37,11 @@ LIGATURES = {'\uFB00': 'ff',
 # '\u1D6B': 'ue',
 
 _ligpat = re.compile('|'.join(LIGATURES))
+_baen_pat = re.compile(r'<meta\s+name="Publisher"\s+content=".*?Baen.*?"',
+                       re.IGNORECASE)
+# Rules or steps of the preprocessing taking longer than that (in seconds)
+# are reported
+SLOW_RULE_TIME = 0.5
 
 
 def sanitize_head(match):
@@ -433,7 +441,7 @@ def pdftohtml_rules():
                # reliable pattern
                (re.compile(r'((?<=</a>)\s*file:/{2,4}[A-Z].*<br>|file:////?'
                            r'[A-Z].*<br>(?=\s*<hr>))',
-                           re.IGNORECASE), lambda match: ''),
+                           re.IGNORECASE), ''),
 
                # Center separator lines
                (re.compile(r'<br>\s*(?P<break>([*#•✦=] *){3,})\s*<br>'),
@@ -468,12 +476,12 @@ def book_designer_rules():
                 '</span>'),
                # Create header tags
                (re.compile(r'<h2[^><]*?id=BookTitle[^><]*?(align=)*(?(1)'
-                           r'(\w+))*[^><]*?>[^><]*?</h2>', re.IGNORECASE),
+                           r'(\w+))*[^><]*?>([^><]*?)</h2>', re.IGNORECASE),
                 lambda match: '<h1 id="BookTitle" align="%s">%s</h1>' %
                 (match.group(2) if match.group(2) else 'center',
                  match.group(3))),
                (re.compile(r'<h2[^><]*?id=BookAuthor[^><]*?(align=)*(?(1)'
-                           r'(\w+))*[^><]*?>[^><]*?</h2>', re.IGNORECASE),
+                           r'(\w+))*[^><]*?>([^><]*?)</h2>', re.IGNORECASE),
                 lambda match: '<h2 id="BookAuthor" align="%s">%s</h2>' %
                 (match.group(2) if match.group(2) else 'center',
                  match.group(3))),
@@ -485,7 +493,7 @@ def book_designer_rules():
                 lambda match: '<h3 class="subtitle">%s</h3>' %
                 (match.group(1),))]
         book_designer_rules.ans = ans
-    return None
+    return ans
 
 
 class HTMLPreProcessor(object):
@@ -495,10 +503,12 @@ class HTMLPreProcessor(object):
         self.extra_opts = extra_opts
         self.regex_wizard_callback = regex_wizard_callback
         self.current_href = None
+        # Seconds spent in the rules and steps of the preprocessing, summed
+        # over all the processed files
+        self.rule_timings = {}
 
     def is_baen(self, src):
-        return re.compile(r'<meta\s+name="Publisher"\s+content=".*?Baen.*?"',
-                          re.IGNORECASE).search(src) is not None
+        return _baen_pat.search(src) is not None
 
     def is_book_designer(self, raw):
         return re.search('<H2[^><]*id=BookTitle', raw) is not None
@@ -515,18 +525,26 @@ class HTMLPreProcessor(object):
         if self.is_baen(html):
             rules = []
         elif self.is_book_designer(html):
-            rules = book_designer_rules()
+            rules = list(book_designer_rules())
         elif is_pdftohtml:
-            rules = pdftohtml_rules()
+            rules = list(pdftohtml_rules())
         else:
             rules = []
 
         start_rules = []
+        timings = {}
+        timed = functools.partial(_timed, timings)
 
         if not getattr(self.extra_opts, 'keep_ligatures', False):
             html = _ligpat.sub(lambda m: LIGATURES[m.group()], html)
 
         user_sr_rules = {}
+
+        def user_rule_failed(rule, e):
+            self.log.error('User supplied search & replace rule: %s -> %s '
+                           'failed with error: %s, ignoring.',
+                           user_sr_rules[rule.pattern], rule.repl, e)
+
         # Function for processing search and replace
 
         def do_search_replace(search_pattern, replace_txt):
@@ -536,8 +554,10 @@ class HTMLPreProcessor(object):
                 search_re = compile_regular_expression(search_pattern)
                 if not replace_txt:
                     replace_txt = ''
-                rules.insert(0, (search_re, replace_txt))
-                user_sr_rules[(search_re, replace_txt)] = search_pattern
+                rules.insert(0, Rule(search_re, replace_txt,
+                                     'search & replace: %s' % search_pattern,
+                                     on_error=user_rule_failed))
+                user_sr_rules[search_re] = search_pattern
             except Exception as e:
                 self.log.error('Failed to parse %r regexp because %s',
                                search, e)
@@ -563,11 +583,12 @@ class HTMLPreProcessor(object):
         if is_pdftohtml:
             # unwrap/delete soft hyphens
             end_rules.append((re.compile(r'[­](</p>\s*<p>\s*)+\s*'
-                                         r'(?=[\[a-z\d])'), lambda match: ''))
-            # unwrap/delete soft hyphens with formatting
+                                         r'(?=[\[a-z\d])'), ''))
+            # unwrap/delete soft hyphens with formatting, applied after the
+            # previous rule, as the text it leaves may form a new match
             end_rules.append((re.compile(r'[­]\s*(</(i|u|b)>)+(</p>\s*<p>\s*)+'
                                          r'\s*(<(i|u|b)>)+\s*(?=[\[a-z\d])'),
-                              lambda match: ''))
+                              ''))
 
         length = -1
         if getattr(self.extra_opts, 'unwrap_factor', 0.0) > 0.01:
@@ -578,8 +599,7 @@ class HTMLPreProcessor(object):
                 # print("The pdf line length returned is " + str(length))
                 # unwrap em/en dashes
                 end_rules.append((re.compile(r'(?<=.{%i}[–—])\s*<p>\s*'
-                                             r'(?=[\[a-z\d])' % length),
-                                  lambda match: ''))
+                                             r'(?=[\[a-z\d])' % length), ''))
                 end_rules.append(
                     # Un wrap using punctuation
                     (re.compile((r'(?<=.{%i}([a-zäëïöüàèìòùáćéíĺóŕńśúýâêîôûçą'
@@ -588,13 +608,15 @@ class HTMLPreProcessor(object):
                                  r'<p>\s*)+\s*(?=(<(i|b|u)>)?\s*[\w\d$(])') %
                                 length, re.UNICODE), wrap_lines))
 
-        for rule in html_preprocess_rules() + start_rules:
-            html = rule[0].sub(rule[1], html)
+        engine = RuleEngine(html_preprocess_rules() + start_rules)
+        html = engine(html)
+        _add_timings(timings, engine.timings)
 
         if self.regex_wizard_callback is not None:
             self.regex_wizard_callback(self.current_href, html)
 
         if get_preprocess_html:
+            self._report_timings(timings)
             return html
 
         def dump(raw, where):
@@ -615,29 +637,25 @@ class HTMLPreProcessor(object):
 
         # dump(html, 'pre-preprocess')
 
-        for rule in rules + end_rules:
-            try:
-                html = rule[0].sub(rule[1], html)
-            except Exception as e:
-                if rule in user_sr_rules:
-                    self.log.error('User supplied search & replace rule: %s '
-                                   '-> %s failed with error: %s, ignoring.',
-                                   user_sr_rules[rule], rule[1], e)
-                else:
-                    raise
+        engine = RuleEngine(rules + end_rules)
+        html = engine(html)
+        _add_timings(timings, engine.timings)
 
         if is_pdftohtml and length > -1:
             # Dehyphenate
-            dehyphenator = Dehyphenator(self.extra_opts.verbose, self.log)
-            html = dehyphenator(html, 'html', length)
+            with timed('dehyphenate'):
+                dehyphenator = Dehyphenator(self.extra_opts.verbose,
+                                            self.log)
+                html = dehyphenator(html, 'html', length)
 
         if is_pdftohtml:
             from ebook_converter.ebooks.conversion.utils import \
                     HeuristicProcessor
-            pdf_markup = HeuristicProcessor(self.extra_opts, None)
-            totalwords = 0
-            if pdf_markup.get_word_count(html) > 7000:
-                html = pdf_markup.markup_chapters(html, totalwords, True)
+            with timed('markup chapters'):
+                pdf_markup = HeuristicProcessor(self.extra_opts, None)
+                totalwords = 0
+                if pdf_markup.get_word_count(html) > 7000:
+                    html = pdf_markup.markup_chapters(html, totalwords, True)
 
         # dump(html, 'post-preprocess')
 
@@ -654,23 +672,26 @@ class HTMLPreProcessor(object):
         if getattr(self.extra_opts, 'asciiize', False):
             from ebook_converter.utils.localization import get_udc
             from ebook_converter.utils.mreplace import MReplace
-            unihandecoder = get_udc()
-            mr = MReplace(data={'«': '&lt;' * 3, '»': '&gt;' * 3})
-            html = mr.mreplace(html)
-            html = unihandecoder.decode(html)
+            with timed('asciiize'):
+                unihandecoder = get_udc()
+                mr = MReplace(data={'«': '&lt;' * 3, '»': '&gt;' * 3})
+                html = mr.mreplace(html)
+                html = unihandecoder.decode(html)
 
         if getattr(self.extra_opts, 'enable_heuristics', False):
             from ebook_converter.ebooks.conversion.utils import \
                     HeuristicProcessor
-            preprocessor = HeuristicProcessor(self.extra_opts, self.log)
-            html = preprocessor(html)
+            with timed('heuristics'):
+                preprocessor = HeuristicProcessor(self.extra_opts, self.log)
+                html = preprocessor(html)
 
         if is_pdftohtml:
             html = html.replace('<!-- created by ebook-converter\'s '
                                 'pdftohtml -->', '')
 
         if getattr(self.extra_opts, 'smarten_punctuation', False):
-            html = smarten_punctuation(html, self.log)
+            with timed('smarten punctuation'):
+                html = smarten_punctuation(html, self.log)
 
         try:
             unsupported_unicode_chars = (self.extra_opts.output_profile
@@ -684,4 +705,30 @@ class HTMLPreProcessor(object):
                 asciichar = unihandecoder.decode(char)
                 html = html.replace(char, asciichar)
 
+        self._report_timings(timings)
         return html
+
+    def _report_timings(self, timings):
+        _add_timings(self.rule_timings, timings)
+        if self.log is None:
+            return
+        for name, seconds in sorted(timings.items(), key=lambda x: -x[1]):
+            if seconds < SLOW_RULE_TIME:
+                break
+            self.log.debug('Preprocessing %s took %.2f seconds in the '
+                           'rule: %s', self.current_href or 'the file',
+                           seconds, name)
+
+
+def _add_timings(timings, other):
+    for name, seconds in other.items():
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextlib.contextmanager
+def _timed(timings, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _add_timings(timings, {name: time.perf_counter() - start})
@@ -0,0 +1,361 @@
+"""
+Applying lists of (regex, replacement) rules to large strings.
+
+Rules are applied in order, every rule to the output of the previous one,
+exactly as a chain of pattern.sub() calls would, but:
+
+* a rule is skipped without scanning the text with its pattern, when a
+  literal which every match must contain is not in the text,
+* rules with the same replacement put into a RuleGroup are applied in a
+  single pass of one combined alternation pattern; at every position the
+  first rule which matches wins and the replaced text is not searched
+  again, so rules should only be grouped when they cannot interfere with
+  each other,
+* rules which cannot match a line break (nor look at one) are applied to
+  large texts in chunks cut after line breaks, all such consecutive rules
+  to one chunk before moving to the next one. No overlap between the chunks
+  is needed, as no match can span the line break at their boundary.
+
+Time spent in every rule is collected, to find out which rule is slow for
+a given book.
+"""
+import functools
+import time
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse
+
+import re
+
+
+# Texts longer than that are processed in chunks of about that size
+CHUNK_SIZE = 256 * 1024
+# Length of rule names derived from their patterns
+NAME_LENGTH = 48
+
+_NEWLINE = ord('\n')
+# Character categories, which don't contain a line break
+_LOCAL_CATEGORIES = {sre_constants.CATEGORY_DIGIT,
+                     sre_constants.CATEGORY_WORD,
+                     sre_constants.CATEGORY_NOT_SPACE,
+                     sre_constants.CATEGORY_NOT_LINEBREAK,
+                     sre_constants.CATEGORY_UNI_DIGIT,
+                     sre_constants.CATEGORY_UNI_WORD,
+                     sre_constants.CATEGORY_UNI_NOT_SPACE,
+                     sre_constants.CATEGORY_UNI_NOT_LINEBREAK}
+_REPEATS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT,
+            getattr(sre_constants, 'POSSESSIVE_REPEAT', None)} - {None}
+_ATOMIC_GROUP = getattr(sre_constants, 'ATOMIC_GROUP', None)
+
+
+def _set_is_local(items):
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            if av == _NEWLINE:
+                return False
+        elif op is sre_constants.RANGE:
+            if av[0] <= _NEWLINE <= av[1]:
+                return False
+        elif op is sre_constants.CATEGORY:
+            if av not in _LOCAL_CATEGORIES:
+                return False
+        else:
+            # NEGATE and anything unknown
+            return False
+    return True
+
+
+def _is_local(items, dotall):
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            if av == _NEWLINE:
+                return False
+        elif op is sre_constants.NOT_LITERAL:
+            if av != _NEWLINE:
+                return False
+        elif op is sre_constants.ANY:
+            if dotall:
+                return False
+        elif op is sre_constants.IN:
+            if not _set_is_local(av):
+                return False
+        elif op is sre_constants.AT:
+            # Start and end of a chunk would match where they don't in the
+            # whole text, boundaries are the same at a line break and at
+            # the end of the text
+            if av not in (sre_constants.AT_BOUNDARY,
+                          sre_constants.AT_NON_BOUNDARY):
+                return False
+        elif op is sre_constants.SUBPATTERN:
+            group, add_flags, del_flags, p = av
+            sub_dotall = ((dotall or add_flags & re.DOTALL) and
+                          not del_flags & re.DOTALL)
+            if not _is_local(p, sub_dotall):
+                return False
+        elif op in _REPEATS:
+            if not _is_local(av[2], dotall):
+                return False
+        elif op is sre_constants.BRANCH:
+            if not all(_is_local(p, dotall) for p in av[1]):
+                return False
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            if not _is_local(av[1], dotall):
+                return False
+        elif op is sre_constants.GROUPREF_EXISTS:
+            group, yes, no = av
+            if not _is_local(yes, dotall) or (no is not None and
+                                              not _is_local(no, dotall)):
+                return False
+        elif op is _ATOMIC_GROUP:
+            if not _is_local(av, dotall):
+                return False
+        elif op is not sre_constants.GROUPREF:
+            return False
+    return True
+
+
+def _required_literal(items):
+    """
+    Return the longest string, which every match of the parsed pattern
+    items must contain.
+    """
+    best, run = '', []
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            run.append(chr(av))
+            continue
+        if len(run) > len(best):
+            best = ''.join(run)
+        run = []
+        inner = ''
+        if op is sre_constants.SUBPATTERN:
+            inner = _required_literal(av[3])
+        elif op in _REPEATS and av[0] > 0:
+            inner = _required_literal(av[2])
+        elif op is _ATOMIC_GROUP:
+            inner = _required_literal(av)
+        if len(inner) > len(best):
+            best = inner
+    if len(run) > len(best):
+        best = ''.join(run)
+    return best
+
+
+def _has_group_references(items):
+    for op, av in items:
+        if op in (sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS):
+            return True
+        if op is sre_constants.SUBPATTERN:
+            sub = [av[3]]
+        elif op in _REPEATS:
+            sub = [av[2]]
+        elif op is sre_constants.BRANCH:
+            sub = av[1]
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            sub = [av[1]]
+        elif op is _ATOMIC_GROUP:
+            sub = [av]
+        else:
+            continue
+        if any(_has_group_references(p) for p in sub):
+            return True
+    return False
+
+
+@functools.lru_cache(maxsize=512)
+def analyze(pattern):
+    """
+    Return tuple of the literal which every match of the compiled pattern
+    contains (or None), the function telling if the literal is in a text,
+    whether the pattern cannot match nor look at a line break and whether
+    it can be combined with other patterns.
+    """
+    try:
+        parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    except Exception:
+        # Not a pattern of the re module
+        return None, None, False, False
+    ignorecase = bool(parsed.state.flags & re.IGNORECASE) or \
+        '(?' in pattern.pattern
+    literal = _required_literal(parsed.data) or None
+    contains = None
+    if literal is not None:
+        if ignorecase:
+            search = re.compile(re.escape(literal), re.IGNORECASE).search
+            contains = lambda text: search(text) is not None  # noqa: E731
+        else:
+            contains = lambda text: literal in text  # noqa: E731
+    local = (parsed.getwidth()[0] > 0 and
+             _is_local(parsed.data,
+                       bool(parsed.state.flags & re.DOTALL)))
+    combinable = not _has_group_references(parsed.data)
+    return literal, contains, local, combinable
+
+
+class Rule(object):
+    """
+    Single rule replacing matches of the compiled pattern with repl, which
+    is a string or a function, as in pattern.sub(). If on_error is given,
+    exceptions raised by the rule are passed to it and the rule is skipped,
+    otherwise they are raised.
+    """
+
+    def __init__(self, pattern, repl, name=None, on_error=None):
+        self.pattern, self.repl, self.on_error = pattern, repl, on_error
+        self.name = name or pattern.pattern[:NAME_LENGTH]
+        (self.literal, self.contains, self.local,
+         self.combinable) = analyze(pattern)
+        if on_error is not None:
+            # A failing rule is skipped as a whole, which cannot be done
+            # once it was applied to some of the chunks
+            self.local = False
+
+    def rules(self):
+        return (self,)
+
+    def applies(self, text):
+        return self.contains is None or self.contains(text)
+
+    def apply(self, text):
+        return self.pattern.sub(self.repl, text)
+
+
+class RuleGroup(object):
+    """
+    Rules applied in a single pass over the text, using alternation of their
+    patterns. Only rules with the same replacement string are combined, as
+    dispatching every match to the replacement of the rule which matched it
+    costs more than another pass over the text. Otherwise, or if the
+    patterns cannot be combined, the rules are applied one after another.
+
+    A single pass gives the same result as applying the rules one after
+    another only if their matches cannot overlap and the text left by one
+    rule cannot form a new match of another one. Only group rules for which
+    that holds, e.g. rules matching literals which none of the replacements
+    contains and none of the other patterns can match.
+    """
+
+    def __init__(self, rules, name=None):
+        self.members = [make_rule(rule) for rule in rules]
+        self.name = name or ' | '.join(rule.name for rule in self.members)
+        self.local = all(rule.local for rule in self.members)
+        self.on_error = None
+        self.pattern = None
+        self.repl = self.members[0].repl
+        if (isinstance(self.repl, str) and
+                all(rule.repl == self.repl and rule.combinable and
+                    rule.on_error is None for rule in self.members)):
+            self.pattern = _combine(tuple(rule.pattern
+                                          for rule in self.members))
+
+    def rules(self):
+        if self.pattern is None:
+            return self.members
+        return (self,)
+
+    def applies(self, text):
+        return any(rule.applies(text) for rule in self.members)
+
+    def apply(self, text):
+        return self.pattern.sub(self.repl, text)
+
+
+_INLINE_FLAGS = ((re.IGNORECASE, 'i'), (re.MULTILINE, 'm'),
+                 (re.DOTALL, 's'), (re.VERBOSE, 'x'))
+
+
+@functools.lru_cache(maxsize=64)
+def _combine(patterns):
+    parts = []
+    for pattern in patterns:
+        flags = ''.join(c for flag, c in _INLINE_FLAGS
+                        if pattern.flags & flag)
+        parts.append('(?%s:%s)' % (flags, pattern.pattern) if flags else
+                     '(?:%s)' % pattern.pattern)
+    try:
+        return re.compile('|'.join(parts))
+    except re.error:
+        # Like global inline flags or names of groups used in more patterns
+        return None
+
+
+def make_rule(rule):
+    """
+    Return Rule or RuleGroup for rule, which may also be a (pattern, repl)
+    tuple.
+    """
+    if isinstance(rule, (Rule, RuleGroup)):
+        return rule
+    return Rule(*rule)
+
+
+def iter_chunks(text, size=CHUNK_SIZE):
+    """
+    Yield chunks of text, about size long, each ending with a line break
+    (except of the last one).
+    """
+    start, length = 0, len(text)
+    while start < length:
+        end = text.find('\n', start + size - 1)
+        if end == -1:
+            yield text[start:]
+            return
+        yield text[start:end + 1]
+        start = end + 1
+
+
+class RuleEngine(object):
+    """
+    Apply list of rules to texts. Rules may be Rule or RuleGroup instances
+    or (pattern, repl) tuples. Seconds spent in every rule are summed in
+    timings dictionary, keyed by names of the rules.
+    """
+
+    def __init__(self, rules, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.timings = {}
+        # Rules which failed are not applied again
+        self.failed = set()
+        self.stages = []
+        for item in rules:
+            for rule in make_rule(item).rules():
+                if self.stages and self.stages[-1][0] == rule.local:
+                    self.stages[-1][1].append(rule)
+                else:
+                    self.stages.append((rule.local, [rule]))
+
+    def __call__(self, text):
+        for local, rules in self.stages:
+            if local and len(text) > self.chunk_size:
+                text = ''.join(self._apply(chunk, rules) for chunk in
+                               iter_chunks(text, self.chunk_size))
+            else:
+                text = self._apply(text, rules)
+        return text
+
+    def _apply(self, text, rules):
+        timings = self.timings
+        for rule in rules:
+            if rule in self.failed:
+                continue
+            start = time.perf_counter()
+            if rule.applies(text):
+                try:
+                    text = rule.apply(text)
+                except Exception as e:
+                    if rule.on_error is None:
+                        raise
+                    self.failed.add(rule)
+                    rule.on_error(rule, e)
+            timings[rule.name] = (timings.get(rule.name, 0.0) +
+                                  time.perf_counter() - start)
+        return text
+
+    def slowest(self, count=5):
+        """
+        Return list of (name, seconds) of the count slowest rules.
+        """
+        return sorted(self.timings.items(), key=lambda x: -x[1])[:count]
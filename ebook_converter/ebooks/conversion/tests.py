@@ -0,0 +1,226 @@
+"""
+Tests of the rule engine, comparing it with chains of pattern.sub() calls.
+"""
+import re
+import unittest
+from unittest import mock
+
+from ebook_converter.ebooks.conversion.preprocess import HTMLPreProcessor
+from ebook_converter.ebooks.conversion.rules import (Rule, RuleEngine,
+                                                     RuleGroup, iter_chunks)
+
+
+def apply_sequentially(rules, text):
+    for pattern, repl in rules:
+        text = pattern.sub(repl, text)
+    return text
+
+
+def upper(match):
+    return match.group().upper()
+
+
+# Soft hyphen rules of the pdftohtml preprocessing
+SOFT_HYPHEN_RULES = [
+    (re.compile(r'[­](</p>\s*<p>\s*)+\s*(?=[\[a-z\d])'), ''),
+    (re.compile(r'[­]\s*(</(i|u|b)>)+(</p>\s*<p>\s*)+'
+                r'\s*(<(i|u|b)>)+\s*(?=[\[a-z\d])'), '')]
+SOFT_HYPHEN_TEXT = 'ab\xad</i></p><p><i>\xad</p><p>xy'
+
+
+class Options(object):
+    verbose = 0
+
+
+class TestRuleEngine(unittest.TestCase):
+
+    TEXT = '\n'.join('<p>line %d with some <b>words</b>  and  spaces</p>' %
+                     i for i in range(200)) + '\n<p>last</p>'
+
+    def check(self, rules, text, chunk_size=None):
+        expected = apply_sequentially(rules, text)
+        engine = (RuleEngine(rules) if chunk_size is None else
+                  RuleEngine(rules, chunk_size=chunk_size))
+        self.assertEqual(engine(text), expected)
+        return engine
+
+    def test_chunks(self):
+        chunks = list(iter_chunks(self.TEXT, 100))
+        self.assertGreater(len(chunks), 10)
+        self.assertEqual(''.join(chunks), self.TEXT)
+        for chunk in chunks[:-1]:
+            self.assertTrue(chunk.endswith('\n'))
+        self.assertEqual(list(iter_chunks('abc', 100)), ['abc'])
+
+    def test_local_rules(self):
+        rules = [(re.compile(r' {2,}'), ' '),
+                 (re.compile(r'\bline (\d+)'), r'row \1'),
+                 (re.compile(r'<b>(\w+)</b>'), r'<i>\1</i>'),
+                 (re.compile(r'\w+s\b'), upper),
+                 (re.compile(r'(?<!<)p>'), 'P>')]
+        for pattern, repl in rules:
+            self.assertTrue(Rule(pattern, repl).local, pattern.pattern)
+        for size in (1, 7, 50, 64, 100, 1000, len(self.TEXT) + 1):
+            self.check(rules, self.TEXT, size)
+
+    def test_matches_at_chunk_boundaries(self):
+        # Chunks end with the line breaks, at which these rules match or
+        # look, so they are not local and get the whole text
+        text = 'ab\ncd\n' * 100
+        rules = [(re.compile(r'b$'), 'B'),
+                 (re.compile(r'^c'), 'C'),
+                 (re.compile(r'\Ab'), 'x'),
+                 (re.compile(r'd\Z'), 'y'),
+                 (re.compile(r'b\nc'), 'b c'),
+                 (re.compile(r'\s+'), '_'),
+                 (re.compile(r'(?s)d.a'), 'd-a'),
+                 (re.compile(r'[^x]b'), 'Xb')]
+        for pattern, repl in rules:
+            self.assertFalse(Rule(pattern, repl).local, pattern.pattern)
+        for size in (1, 3, 6, 10, 100):
+            self.check(rules, text, size)
+            self.check(rules[4:], text, size)
+        # Local rules matching right before and after the boundaries
+        rules = [(re.compile(r'a\w'), 'A'),
+                 (re.compile(r'b\b'), 'B'),
+                 (re.compile(r'\bc'), 'C'),
+                 (re.compile(r'(?<=\w)d'), '-'),
+                 (re.compile(r'(?<!\w)-'), '+')]
+        for pattern, repl in rules:
+            self.assertTrue(Rule(pattern, repl).local, pattern.pattern)
+        for size in (1, 3, 6, 10, 100):
+            self.check(rules, text, size)
+
+    def test_literal_prefilter(self):
+        rule = Rule(re.compile(r'<p>\s*</p>'), '')
+        self.assertEqual(rule.literal, '</p>')
+        self.assertFalse(rule.applies('<p> <b>'))
+        self.assertTrue(rule.applies('<p> </p>'))
+        rule = Rule(re.compile(r'<P>', re.IGNORECASE), '')
+        self.assertTrue(rule.applies('<p>'))
+        rule = Rule(re.compile(r'(?i:<BR>)'), '')
+        self.assertTrue(rule.applies('<br>'))
+        rule = Rule(re.compile(r'a|b'), '')
+        self.assertIsNone(rule.literal)
+        self.assertTrue(rule.applies('c'))
+
+        skipped = Rule(re.compile(r'<hr\s*/>'), '')
+        applied = Rule(re.compile(r'<b>'), '<strong>')
+        engine = RuleEngine([skipped, applied])
+        with mock.patch.object(skipped, 'apply') as skipped_apply:
+            self.assertEqual(engine('<p><b>x</p>'), '<p><strong>x</p>')
+        skipped_apply.assert_not_called()
+        self.assertIn(skipped.name, engine.timings)
+
+        # Rules whose literal appears only after a previous rule was
+        # applied are not skipped
+        self.check([(re.compile('a'), '<hr/>'),
+                    (re.compile(r'<hr\s*/>'), '<hr>'),
+                    (re.compile('(?i)X'), 'y')], 'abcx' * 10)
+
+    def test_group(self):
+        rules = [(re.compile(r'<br\s*/?>'), ''),
+                 (re.compile(r'&nbsp;', re.IGNORECASE), ''),
+                 (re.compile(r'<(?P<tag>span)>\s*</(?P=tag)>'), ''),
+                 (re.compile(r'(?s)<!--.*?-->'), '')]
+        group = RuleGroup(rules[:2])
+        self.assertIsNotNone(group.pattern)
+        self.assertEqual(group.rules(), (group,))
+        text = ('a<br>b<br/>c&NBSP;d<span></span>e<!-- x\ny -->f\n' * 50)
+        self.assertEqual(RuleEngine([group])(text),
+                         apply_sequentially(rules[:2], text))
+        self.assertEqual(
+            RuleEngine([group] + rules[2:], chunk_size=10)(text),
+            apply_sequentially(rules, text))
+
+        # Rules using group references are not combined
+        group = RuleGroup(rules[1:3])
+        self.assertIsNone(group.pattern)
+        self.assertEqual(RuleEngine([group])(text),
+                         apply_sequentially(rules[1:3], text))
+
+        # Nor are rules with different replacements
+        rules = [(re.compile('a'), 'b'), (re.compile('b'), 'c')]
+        group = RuleGroup(rules)
+        self.assertIsNone(group.pattern)
+        self.assertEqual(len(group.rules()), 2)
+        self.assertEqual(RuleEngine([group])('aabb'),
+                         apply_sequentially(rules, 'aabb'))
+
+    def test_soft_hyphens(self):
+        expected = apply_sequentially(SOFT_HYPHEN_RULES, SOFT_HYPHEN_TEXT)
+        self.assertEqual(expected, 'abxy')
+        self.check(SOFT_HYPHEN_RULES, SOFT_HYPHEN_TEXT)
+        # The text left by the first rule forms a match of the second one,
+        # so the rules give a different result in a single pass
+        self.assertNotEqual(
+            RuleEngine([RuleGroup(SOFT_HYPHEN_RULES)])(SOFT_HYPHEN_TEXT),
+            expected)
+
+        html = ("<html><!-- created by ebook-converter's pdftohtml -->"
+                '<body><p>%s</p></body></html>' % SOFT_HYPHEN_TEXT)
+        html = HTMLPreProcessor(None, Options())(html)
+        self.assertNotIn('\xad', html)
+        self.assertIn('abxy', html)
+
+    def test_callable_replacements(self):
+        calls = []
+
+        def repl(match):
+            calls.append(match.group())
+            return '[%s]' % match.group(1)
+
+        rules = [(re.compile(r'<b>(\w+)</b>'), repl),
+                 (re.compile(r'\d+'), lambda m: str(int(m.group()) * 2)),
+                 (re.compile(r'\[(\w)'), upper)]
+        expected = apply_sequentially(rules, self.TEXT)
+        count = len(calls)
+        del calls[:]
+        for size in (10, 1000):
+            self.assertEqual(RuleEngine(rules, chunk_size=size)(self.TEXT),
+                             expected)
+            self.assertEqual(len(calls), count)
+            del calls[:]
+
+        group = RuleGroup([(re.compile('a'), upper),
+                           (re.compile('b'), upper)])
+        self.assertIsNone(group.pattern)
+        self.assertEqual(RuleEngine([group])('abc'), 'ABc')
+
+    def test_on_error(self):
+        errors = []
+
+        def on_error(rule, e):
+            errors.append((rule, e))
+
+        def fail_late(match):
+            if match.group() == 'last':
+                raise ValueError('last')
+            return match.group().upper()
+
+        good = [(re.compile(r' {2,}'), ' '), (re.compile(r'<b>'), '<i>')]
+        for failing in (Rule(re.compile(r'with'), r'\9', on_error=on_error),
+                        Rule(re.compile(r'[a-z]+'), fail_late,
+                             on_error=on_error)):
+            for size in (100, 1000000):
+                del errors[:]
+                engine = RuleEngine([good[0], failing, good[1]],
+                                    chunk_size=size)
+                # A failing rule is skipped as a whole
+                self.assertEqual(engine(self.TEXT),
+                                 apply_sequentially(good, self.TEXT))
+                self.assertEqual(len(errors), 1)
+                self.assertIs(errors[0][0], failing)
+                self.assertIn(failing, engine.failed)
+
+        engine = RuleEngine([Rule(re.compile(r'[a-z]+'), fail_late)],
+                            chunk_size=100)
+        self.assertRaises(ValueError, engine, self.TEXT)
+
+
+def find_tests():
+    return unittest.defaultTestLoader.loadTestsFromTestCase(TestRuleEngine)
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(find_tests())
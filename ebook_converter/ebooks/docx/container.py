@@ -131,6 +131,16 @@ class DOCX(object):
         with open(path, 'rb') as f:
             return f.read()
 
+    def open(self, name):
+        if hasattr(self, 'zipf'):
+            return self.zipf.open(name)
+        return open(self.names[name], 'rb')
+
+    def size(self, name):
+        if hasattr(self, 'zipf'):
+            return self.zipf.getinfo(name).file_size
+        return os.path.getsize(self.names[name])
+
     def read_content_types(self):
         try:
             raw = self.read('[Content_Types].xml')
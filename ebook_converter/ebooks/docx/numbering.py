@@ -179,6 +179,7 @@ class Numbering(object):
         self.counters = defaultdict(Counter)
         self.starts = {}
         self.pic_map = {}
+        self.seen_instances = set()
 
     def __call__(self, root, styles, rid_map):
         ' Read all numbering style definitions '
@@ -274,7 +275,7 @@ class Numbering(object):
                 counter[ilvl] = lvl.start
 
     def apply_markup(self, items, body, styles, object_map, images):
-        seen_instances = set()
+        seen_instances = self.seen_instances
         for p, num_id, ilvl in items:
             d = self.instances.get(num_id, None)
             if d is not None:
@@ -320,16 +320,31 @@ class Styles(object):
 
         return ans
 
+    def clear_cache(self):
+        '''
+        Forget the styles resolved for the elements seen so far, which only
+        leaves the registered CSS classes.
+        '''
+        self.para_cache, self.para_char_cache, self.run_cache = {}, {}, {}
+
     def resolve(self, obj):
         if obj.tag.endswith('}p'):
             return self.resolve_paragraph(obj)
         if obj.tag.endswith('}r'):
             return self.resolve_run(obj)
 
-    def cascade(self, layers):
-        self.body_font_family = 'serif'
-        self.body_font_size = '10pt'
-        self.body_color = 'black'
+    def cascade(self, layers, keep_body=False):
+        '''
+        Move common properties of runs to their paragraphs and the most
+        common properties of paragraphs to the body. With keep_body, the
+        body properties chosen by the previous call are kept, for documents
+        converted in parts.
+        '''
+        if not keep_body:
+            self.body_font_family = 'serif'
+            self.body_font_size = '10pt'
+            self.body_color = 'black'
+            self.body_values = {}
 
         def promote_property(char_styles, block_style, prop):
             vals = {getattr(s, prop) for s in char_styles}
@@ -356,14 +371,17 @@ class Styles(object):
                     s.text_decoration = inherit
 
         def promote_most_common(block_styles, prop, default):
-            c = Counter()
-            for s in block_styles:
-                val = getattr(s, prop)
-                if val is not inherit:
-                    c[val] += 1
-            val = None
-            if c:
-                val = c.most_common(1)[0][0]
+            if keep_body:
+                val = self.body_values[prop]
+            else:
+                c = Counter()
+                for s in block_styles:
+                    val = getattr(s, prop)
+                    if val is not inherit:
+                        c[val] += 1
+                val = self.body_values[prop] = (c.most_common(1)[0][0] if c
+                                                else None)
+            if val is not None:
                 for s in block_styles:
                     oval = getattr(s, prop)
                     if oval is inherit:
@@ -375,15 +393,15 @@ class Styles(object):
 
         block_styles = tuple(self.resolve_paragraph(p) for p in layers)
 
-        ff = promote_most_common(block_styles, 'font_family', self.body_font_family)
+        ff = promote_most_common(block_styles, 'font_family', 'serif')
         if ff is not None:
             self.body_font_family = ff
 
-        fs = promote_most_common(block_styles, 'font_size', int(self.body_font_size[:2]))
+        fs = promote_most_common(block_styles, 'font_size', 10)
         if fs is not None:
             self.body_font_size = '%.3gpt' % fs
 
-        color = promote_most_common(block_styles, 'color', self.body_color)
+        color = promote_most_common(block_styles, 'color', 'black')
         if color is not None:
             self.body_color = color
 
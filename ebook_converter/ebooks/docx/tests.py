@@ -0,0 +1,310 @@
+"""
+Tests of converting DOCX bodies in parts, comparing them with the
+conversion into a single file.
+"""
+import os
+import re
+import shutil
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+
+from lxml import etree
+from lxml import html
+
+from ebook_converter.ebooks.docx import to_html
+from ebook_converter.ebooks.docx.to_html import Convert
+
+
+W = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+R = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+RELS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+OPF = 'http://www.idpf.org/2007/opf'
+NCX = 'http://www.daisy.org/z3986/2005/ncx/'
+
+CONTENT_TYPES = '''\
+<?xml version="1.0" encoding="UTF-8"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+  <Default Extension="rels"
+      ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+  <Default Extension="xml" ContentType="application/xml"/>
+  <Override PartName="/word/document.xml" ContentType="application/\
+vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>
+</Types>
+'''
+
+PACKAGE_RELS = '''\
+<?xml version="1.0" encoding="UTF-8"?>
+<Relationships xmlns="%s">
+  <Relationship Id="rId1" Type="%s/officeDocument"
+      Target="word/document.xml"/>
+</Relationships>
+''' % (RELS, R)
+
+DOCUMENT_RELS = '''\
+<?xml version="1.0" encoding="UTF-8"?>
+<Relationships xmlns="%s">
+  <Relationship Id="rId1" Type="%s/styles" Target="styles.xml"/>
+  <Relationship Id="rId2" Type="%s/footnotes" Target="footnotes.xml"/>
+  <Relationship Id="rId3" Type="%s/hyperlink"
+      Target="http://example.com/" TargetMode="External"/>
+</Relationships>
+''' % (RELS, R, R, R)
+
+STYLES = '''\
+<?xml version="1.0" encoding="UTF-8"?>
+<w:styles xmlns:w="%s">
+  <w:style w:type="paragraph" w:default="1" w:styleId="Normal">
+    <w:name w:val="Normal"/>
+  </w:style>
+  <w:style w:type="paragraph" w:styleId="Heading1">
+    <w:name w:val="heading 1"/>
+    <w:basedOn w:val="Normal"/>
+    <w:rPr><w:b/><w:sz w:val="32"/></w:rPr>
+  </w:style>
+  <w:style w:type="paragraph" w:styleId="Heading2">
+    <w:name w:val="heading 2"/>
+    <w:basedOn w:val="Normal"/>
+    <w:rPr><w:i/></w:rPr>
+  </w:style>
+  <w:style w:type="character" w:styleId="Emphasis">
+    <w:name w:val="Emphasis"/>
+    <w:rPr><w:i/></w:rPr>
+  </w:style>
+</w:styles>
+''' % W
+
+# Number of chapters of the generated document, and of paragraphs in each
+CHAPTERS = 6
+PARAGRAPHS = 7
+
+
+def run(text, style=None):
+    rpr = '<w:rPr><w:rStyle w:val="%s"/></w:rPr>' % style if style else ''
+    return '<w:r>%s<w:t xml:space="preserve">%s</w:t></w:r>' % (rpr, text)
+
+
+def para(*content, style=None):
+    ppr = '<w:pPr><w:pStyle w:val="%s"/></w:pPr>' % style if style else ''
+    return '<w:p>%s%s</w:p>' % (ppr, ''.join(content))
+
+
+def link(anchor, text):
+    return '<w:hyperlink w:anchor="%s">%s</w:hyperlink>' % (anchor,
+                                                             run(text))
+
+
+def bookmark(name, bid, *content):
+    return ('<w:bookmarkStart w:id="%d" w:name="%s"/>%s'
+            '<w:bookmarkEnd w:id="%d"/>' % (bid, name, ''.join(content),
+                                            bid))
+
+
+def footnote_ref(fid):
+    return ('<w:r><w:rPr><w:vertAlign w:val="superscript"/></w:rPr>'
+            '<w:footnoteReference w:id="%d"/></w:r>' % fid)
+
+
+def field(instr):
+    return ('<w:r><w:fldChar w:fldCharType="begin"/></w:r>'
+            '<w:r><w:instrText xml:space="preserve">%s</w:instrText></w:r>'
+            '<w:r><w:fldChar w:fldCharType="separate"/></w:r>' % instr)
+
+
+def make_docx(path):
+    """
+    Write a document with a Word Table of Contents at its start, chapters
+    linking to the chapters before and after them, footnotes and a second
+    section.
+    """
+    body = [para(field(' TOC \\o "1-2" \\h \\z \\u '),
+                 link('_Toc1', 'Chapter 1'))]
+    for i in range(2, CHAPTERS + 1):
+        body.append(para(link('_Toc%d' % i, 'Chapter %d' % i)))
+    body.append(para('<w:r><w:fldChar w:fldCharType="end"/></w:r>'))
+    body.append(para(run('Before the chapters, see '),
+                     '<w:hyperlink r:id="rId3">%s</w:hyperlink>' %
+                     run('the site'), run('.')))
+    footnotes, fid = [], 0
+    for i in range(1, CHAPTERS + 1):
+        body.append(para(bookmark('_Toc%d' % i, i, run('Chapter %d' % i)),
+                         style='Heading1'))
+        for j in range(1, PARAGRAPHS + 1):
+            content = [run('Text %d.%d of the chapter, ' % (i, j)),
+                       run('emphasized', 'Emphasis'), run(' words.')]
+            if j == 2:
+                fid += 1
+                content.append(footnote_ref(fid))
+                footnotes.append(
+                    '<w:footnote w:id="%d">%s</w:footnote>' %
+                    (fid, para(run('Note %d of chapter %d.' % (fid, i)))))
+            if j == 3 and i < CHAPTERS:
+                content.append(link('_Toc%d' % (i + 1), ' Next chapter'))
+            if j == 4 and i > 1:
+                content.append(link('_Toc%d' % (i - 1), ' Previous chapter'))
+            if j == 5:
+                content.append(link('_Toc1', ' First chapter'))
+            if j == 6:
+                content.append(link('missing', ' Nowhere'))
+            if j == PARAGRAPHS and i == CHAPTERS // 2:
+                # End of the first section
+                content.insert(0, '<w:pPr><w:sectPr><w:pgSz w:w="12240" '
+                               'w:h="15840"/></w:sectPr></w:pPr>')
+            body.append(para(*content))
+        body.append(para(bookmark('sub%d' % i, 100 + i,
+                                  run('Section %d.1' % i)),
+                         style='Heading2'))
+        body.append('<w:tbl><w:tblPr><w:tblW w:w="0" w:type="auto"/>'
+                    '</w:tblPr><w:tr><w:tc>%s</w:tc></w:tr></w:tbl>' %
+                    para(run('Cell of chapter %d' % i)))
+    body.append(para(run('The end.')))
+    body.append('<w:sectPr><w:pgSz w:w="11906" w:h="16838"/></w:sectPr>')
+
+    document = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<w:document xmlns:w="%s" xmlns:r="%s"><w:body>%s'
+                '</w:body></w:document>' % (W, R, ''.join(body)))
+    separators = ('<w:footnote w:type="separator" w:id="-1">%s</w:footnote>'
+                  '<w:footnote w:type="continuationSeparator" w:id="0">%s'
+                  '</w:footnote>' % (para(), para()))
+    notes = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+             '<w:footnotes xmlns:w="%s" xmlns:r="%s">%s%s</w:footnotes>' %
+             (W, R, separators, ''.join(footnotes)))
+    with zipfile.ZipFile(path, 'w') as zf:
+        zf.writestr('[Content_Types].xml', CONTENT_TYPES)
+        zf.writestr('_rels/.rels', PACKAGE_RELS)
+        zf.writestr('word/_rels/document.xml.rels', DOCUMENT_RELS)
+        zf.writestr('word/document.xml', document)
+        zf.writestr('word/styles.xml', STYLES)
+        zf.writestr('word/footnotes.xml', notes)
+
+
+class Book(object):
+    """
+    Result of a conversion: the HTML files in the order of the spine and
+    the entries of the Table of Contents.
+    """
+
+    def __init__(self, opf):
+        self.dir = os.path.dirname(opf)
+        root = etree.parse(opf).getroot()
+        manifest = {item.get('id'): item.get('href') for item in
+                    root.iter('{%s}item' % OPF)}
+        self.spine = [manifest[item.get('idref')] for item in
+                      root.iter('{%s}itemref' % OPF)]
+        self.raw = {}
+        self.roots = {}
+        for name in self.spine:
+            with open(os.path.join(self.dir, name), 'rb') as f:
+                self.raw[name] = f.read()
+            self.roots[name] = html.fromstring(self.raw[name])
+        self.toc = []
+        ncx = os.path.join(self.dir, 'toc.ncx')
+        if os.path.exists(ncx):
+            with open(ncx, 'rb') as f:
+                self.raw['toc.ncx'] = f.read()
+            for point in etree.fromstring(self.raw['toc.ncx']).iter(
+                    '{%s}navPoint' % NCX):
+                text = point.find('{%s}navLabel/{%s}text' % (NCX, NCX)).text
+                src = point.find('{%s}content' % NCX).get('src')
+                self.toc.append((text, src))
+
+    def text(self):
+        text = ' '.join(' '.join(self.roots[name].find('body').itertext())
+                        for name in self.spine)
+        return ' '.join(text.split())
+
+    def links(self):
+        for name in self.spine:
+            for a in self.roots[name].iter('a'):
+                href = a.get('href')
+                if href is not None and not re.match(r'[a-z]+:', href):
+                    yield name, href
+
+
+class TestStreaming(unittest.TestCase):
+
+    def setUp(self):
+        self.tdir = tempfile.mkdtemp()
+        self.docx = os.path.join(self.tdir, 'test.docx')
+        make_docx(self.docx)
+
+    def tearDown(self):
+        shutil.rmtree(self.tdir, ignore_errors=True)
+
+    def convert(self, streaming):
+        dest = os.path.join(self.tdir, 'streaming' if streaming else 'single')
+        os.mkdir(dest)
+        conv = Convert(self.docx, dest_dir=dest, streaming=streaming)
+        try:
+            return Book(conv())
+        finally:
+            conv.docx.close()
+
+    def check_target(self, book, name, href):
+        target, _, anchor = href.partition('#')
+        target = target or name
+        self.assertIn(target, book.spine, '%s in %s' % (href, name))
+        if anchor:
+            ids = book.roots[target].xpath('//*[@id=$id]', id=anchor)
+            self.assertEqual(len(ids), 1, '%s in %s' % (href, name))
+
+    def test_streaming(self):
+        single = self.convert(False)
+        with mock.patch.object(to_html, 'CHUNK_BLOCKS', 5):
+            parts = self.convert(True)
+
+        self.assertEqual(single.spine, ['index.html'])
+        self.assertGreater(len(parts.spine), 5)
+        self.assertEqual(parts.spine[0], 'index.html')
+        self.assertEqual(parts.spine[-1], to_html.NOTES_NAME)
+
+        self.assertEqual(parts.text(), single.text())
+        self.assertIn('Text %d.%d' % (CHAPTERS, PARAGRAPHS), parts.text())
+        self.assertIn('Note %d of chapter' % CHAPTERS, parts.text())
+
+        # Links to other parts, within the parts and between the notes and
+        # their references
+        links = list(parts.links())
+        self.assertEqual(len(links), len(list(single.links())))
+        self.assertTrue(any(not href.startswith('#') and
+                            not href.startswith(to_html.NOTES_NAME)
+                            for name, href in links))
+        self.assertTrue(any(href.startswith(to_html.NOTES_NAME)
+                            for name, href in links))
+        for name, href in links:
+            self.check_target(parts, name, href)
+
+        self.assertEqual([text for text, src in parts.toc],
+                         [text for text, src in single.toc])
+        self.assertEqual(len(parts.toc), CHAPTERS)
+        self.assertGreater(len({src.partition('#')[0]
+                                for text, src in parts.toc}), 1)
+        for text, src in parts.toc:
+            self.check_target(parts, 'toc.ncx', src)
+            target, _, anchor = src.partition('#')
+            elem = parts.roots[target].xpath('//*[@id=$id]', id=anchor)[0]
+            self.assertEqual(' '.join(elem.itertext()).strip(), text)
+
+        for name, raw in parts.raw.items():
+            self.assertNotIn(to_html.PENDING_HREF[1:].encode('ascii'), raw,
+                             name)
+
+    def test_small_document(self):
+        # A document with less blocks than a part has, still cut at the end
+        # of its first section
+        single = self.convert(False)
+        parts = self.convert(True)
+        self.assertEqual(parts.spine, ['index.html', 'index_1.html',
+                                       to_html.NOTES_NAME])
+        self.assertEqual(parts.text(), single.text())
+        for name, href in parts.links():
+            self.check_target(parts, name, href)
+
+
+def find_tests():
+    return unittest.defaultTestLoader.loadTestsFromTestCase(TestStreaming)
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(find_tests())
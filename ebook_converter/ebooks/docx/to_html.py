@@ -1,10 +1,12 @@
 import sys
 import os
 import re
+import copy
 import math
 import errno
 import uuid
 import numbers
+import itertools
 import collections
 import mimetypes
 
@@ -27,13 +29,34 @@ from ebook_converter.ebooks.docx.settings import Settings
 from ebook_converter.ebooks.docx.styles import Styles, inherit, PageProperties
 from ebook_converter.ebooks.docx.tables import Tables
 from ebook_converter.ebooks.docx.theme import Theme
+from ebook_converter.ebooks.docx.toc import TI
 from ebook_converter.ebooks.docx.toc import create_toc
+from ebook_converter.ebooks.docx.toc import heading_items
+from ebook_converter.ebooks.docx.toc import structure_toc
+from ebook_converter.ebooks.docx.toc import toc_entries
+from ebook_converter.ebooks.docx.toc import toc_from_headings
 from ebook_converter.ebooks.metadata.opf2 import OPFCreator
 from ebook_converter.utils.localization import canonicalize_lang
 from ebook_converter.utils.localization import lang_as_iso639_1
 
 
 NBSP = '\xa0'
+# Bodies of documents larger than that (in bytes) are converted in parts, see
+# Convert.convert_streaming()
+STREAMING_THRESHOLD = 10 * 1024 * 1024
+# Maximum number of top level blocks of the body converted into one file
+CHUNK_BLOCKS = 1000
+# Top level elements of the body, after which the body is cut into parts
+BLOCK_TAGS = ('w:p', 'w:tbl', 'w:sdt', 'w:customXml')
+# Footnotes and endnotes of documents converted in parts are written into
+# this file
+NOTES_NAME = 'notes.html'
+# Links to bookmarks in parts not converted yet are given this href,
+# followed by the hex encoded name of the bookmark, and are fixed once all
+# the parts are written
+PENDING_HREF = '#docx-pending-'
+PENDING_PAT = re.compile(rb' href="%s([0-9a-f]*)"' %
+                         re.escape(PENDING_HREF.encode('ascii')))
 
 
 class Text:
@@ -63,7 +86,7 @@ class Convert(object):
 
     def __init__(self, path_or_stream, dest_dir=None, log=None,
                  detect_cover=True, notes_text=None, notes_nopb=False,
-                 nosupsub=False):
+                 nosupsub=False, streaming=None):
         self.docx = DOCX(path_or_stream, log=log)
         self.namespace = self.docx.namespace
         self.ms_pat = re.compile(r'\s{2,}')
@@ -73,16 +96,32 @@ class Convert(object):
         self.notes_text = notes_text or 'Notes'
         self.notes_nopb = notes_nopb
         self.nosupsub = nosupsub
+        # None to convert in parts only documents with large bodies
+        self.streaming = streaming
         self.dest_dir = dest_dir or os.getcwd()
         self.mi = self.docx.metadata
-        self.body = BODY()
         self.theme = Theme(self.namespace)
         self.settings = Settings(self.namespace)
-        self.tables = Tables(self.namespace)
         self.fields = Fields(self.namespace)
+        self.tables = Tables(self.namespace)
         self.styles = Styles(self.namespace, self.tables)
         self.images = Images(self.namespace, self.log)
-        self.object_map = collections.OrderedDict()
+        lang = html_lang(self.mi.language)
+        self.doc_lang = lang or None
+        # Name of the file being written, and of the files holding the
+        # bookmarks and note references of the parts written before
+        self.current_name = 'index.html'
+        self.anchor_files = {}
+        self.noteref_files = {}
+        self.notes_name = ''
+        self.pending_files = None
+        self.first_heading = None
+        self.cascaded = False
+        self.section_count = 0
+        self.reset_state()
+
+    def create_html(self):
+        self.body = BODY()
         self.html = HTML(
             HEAD(
                 META(charset='utf-8'),
@@ -98,14 +137,37 @@ class Convert(object):
             child.tail = '\n\t\t'
         self.html[0][-1].tail = '\n\t'
         self.html[1].text = self.html[1].tail = '\n'
-        lang = html_lang(self.mi.language)
-        if lang:
-            self.html.set('lang', lang)
-            self.doc_lang = lang
-        else:
-            self.doc_lang = None
+        if self.doc_lang:
+            self.html.set('lang', self.doc_lang)
+
+    def reset_state(self):
+        """
+        Start a new HTML file, dropping everything kept for the blocks
+        converted so far.
+        """
+        self.create_html()
+        self.object_map = collections.OrderedDict()
+        self.layers = collections.OrderedDict()
+        self.framed = [[]]
+        self.frame_map = {}
+        self.framed_map = {}
+        self.link_map = collections.defaultdict(list)
+        self.link_source_map = {}
+        self.block_runs = []
+        self.page_map = collections.OrderedDict()
+        self.fields.fields = []
+        self.images.links = []
+        self.tables = self.styles.tables = Tables(self.namespace)
+        self.styles.clear_cache()
 
     def __call__(self):
+        streaming = self.streaming
+        if streaming is None:
+            streaming = (self.docx.size(self.docx.document_name) >
+                         STREAMING_THRESHOLD)
+        if streaming:
+            return self.convert_streaming()
+
         doc = self.docx.document
         (relationships_by_id,
          relationships_by_type) = self.docx.document_relationships
@@ -113,21 +175,188 @@ class Convert(object):
         self.fields(doc, self.log)
         self.read_styles(relationships_by_type)
         self.images(relationships_by_id)
-        self.layers = collections.OrderedDict()
-        self.framed = [[]]
-        self.frame_map = {}
-        self.framed_map = {}
         self.anchor_map = {}
-        self.link_map = collections.defaultdict(list)
-        self.link_source_map = {}
         self.toc_anchor = None
-        self.block_runs = []
-        paras = []
 
         self.log.debug('Converting Word markup to HTML')
 
         self.read_page_properties(doc)
         self.current_rels = relationships_by_id
+        self.convert_blocks(doc)
+        # Apply page breaks at the start of every section, except the first
+        # section (since that will be the start of the file)
+        self.styles.apply_section_page_breaks(self.section_starts[1:])
+
+        notes_header = None
+        if self.footnotes.has_notes:
+            notes_header = self.convert_notes()
+
+        self.cover_image = self.finish_body(notes_header, self.detect_cover)
+
+        return self.write(doc)
+
+    def convert_streaming(self):
+        """
+        Convert the document in parts of at most CHUNK_BLOCKS top level
+        blocks of its body, each into its own HTML file, so that neither
+        the whole document nor the whole HTML are ever held in memory. The
+        styles resolved for the blocks of a part are dropped when it is
+        written, keeping only the CSS classes, which are shared by all the
+        parts.
+        """
+        (relationships_by_id,
+         relationships_by_type) = self.docx.document_relationships
+        self.read_styles(relationships_by_type)
+        self.images(relationships_by_id)
+        self.anchor_map = {}
+        self.toc_anchor = None
+        self.notes_name = NOTES_NAME
+        self.pending_files = set()
+        self.cover_image = None
+        spine, toc, headings = [], [], []
+        toc_state, idcount = [0, None, False], itertools.count()
+
+        self.log.debug('Converting Word markup to HTML in parts')
+
+        sections = self.read_sections()
+        for doc, starts_section in self.read_chunks():
+            self.current_name = ('index_%d.html' % len(spine) if spine else
+                                 'index.html')
+            self.reset_state()
+            self.resolve_alternate_content(doc)
+            self.fields(doc, self.log)
+            self.read_page_properties(doc, sections)
+            self.images.rid_map = self.current_rels = relationships_by_id
+            num_anchors = len(self.anchor_map)
+            self.convert_blocks(doc)
+            # Page breaks at the start of every section, except the first
+            # one of the document and the one continued from the previous
+            # part
+            first_section = 0 if spine and starts_section else 1
+            self.styles.apply_section_page_breaks(
+                self.section_starts[first_section:])
+
+            cover_image = self.finish_body(
+                detect_cover=self.detect_cover and not spine)
+            if cover_image is not None:
+                self.cover_image = cover_image
+
+            toc.extend(toc_entries(doc, self.resolved_link_map, self.styles,
+                                   self.object_map, self.namespace,
+                                   self.current_name, toc_state))
+            headings.extend(heading_items(self.body, self.current_name,
+                                          idcount))
+            for h in self.body.xpath('//*[@data-heading-level]'):
+                del h.attrib['data-heading-level']
+            self.write_html(self.current_name)
+            for anchor in itertools.islice(self.anchor_map, num_anchors,
+                                           None):
+                self.anchor_files[anchor] = self.current_name
+            spine.append(self.current_name)
+            del doc
+
+        if self.footnotes.has_notes:
+            self.current_name = NOTES_NAME
+            self.reset_state()
+            self.finish_body(self.convert_notes())
+            self.write_html(NOTES_NAME)
+            spine.append(NOTES_NAME)
+        self.reset_state()
+
+        self.resolve_pending_links()
+        toc = [x for x in map(self.resolve_toc_entry, toc) if x is not None]
+        if toc:
+            self.log.info('Found Word Table of Contents, using it to '
+                          'generate the Table of Contents')
+            toc = structure_toc(toc)
+        else:
+            toc = toc_from_headings(headings, self.log)
+        self.write_css()
+        return self.write_opf(spine, toc)
+
+    def read_sections(self):
+        """
+        Return page properties of all the sections of the document, in the
+        order read_page_properties() finds them.
+        """
+        p_tag = self.namespace.expand('w:p')
+        sect_tag = self.namespace.expand('w:sectPr')
+        body_tag = self.namespace.expand('w:body')
+        tags = tuple(self.namespace.expand(x) for x in BLOCK_TAGS)
+        sections = []
+        last = None
+        with self.docx.open(self.docx.document_name) as f:
+            for _, elem in etree.iterparse(f, tag=(sect_tag,) + tags):
+                parent = elem.getparent()
+                if elem.tag == sect_tag:
+                    p = next(elem.iterancestors(p_tag), None)
+                    if p is None and parent.tag != body_tag:
+                        continue
+                    if p is None or p is not last:
+                        sections.append([])
+                    sections[-1].append(copy.deepcopy(elem))
+                    last = p
+                elif parent is not None and parent.tag == body_tag:
+                    elem.clear()
+                    while elem.getprevious() is not None:
+                        del parent[0]
+        return [PageProperties(self.namespace, x) for x in sections]
+
+    def read_chunks(self):
+        """
+        Yield (doc, starts_section) for consecutive parts of the body of the
+        document. doc is a tree of the same structure as the whole document,
+        with at most CHUNK_BLOCKS top level blocks in its body, a part also
+        ends with the last block of every section. starts_section is true
+        for parts starting a section.
+        """
+        body_tag = self.namespace.expand('w:body')
+        sect_tag = self.namespace.expand('w:sectPr')
+        tags = tuple(self.namespace.expand(x) for x in BLOCK_TAGS)
+        doc = source = None
+        count = 0
+        starts_section, yielded = True, False
+
+        def new_doc(source):
+            # Not makeelement(), the part must be a document of its own
+            root = source.getparent()
+            doc = etree.Element(root.tag, nsmap=root.nsmap)
+            etree.SubElement(doc, body_tag)
+            return doc
+
+        with self.docx.open(self.docx.document_name) as f:
+            for _, elem in etree.iterparse(f, tag=tags):
+                source = elem.getparent()
+                if source is None or source.tag != body_tag:
+                    continue
+                if doc is None:
+                    doc = new_doc(source)
+                # Everything before elem in the body is complete as well
+                while True:
+                    block = source[0]
+                    doc[0].append(block)
+                    if block is elem:
+                        break
+                count += 1
+                ends_section = next(elem.iter(sect_tag), None) is not None
+                if ends_section or count >= CHUNK_BLOCKS:
+                    yield doc, starts_section
+                    yielded = True
+                    starts_section, doc, count = ends_section, None, 0
+
+        if source is not None and len(source):
+            if doc is None:
+                doc = new_doc(source)
+            for block in tuple(source):
+                doc[0].append(block)
+        if doc is not None and (count or not yielded):
+            yield doc, starts_section
+        elif not yielded:
+            # A document without body
+            yield etree.Element(self.namespace.expand('w:document')), True
+
+    def convert_blocks(self, doc):
+        paras = []
         for wp, page_properties in self.page_map.items():
             self.current_page = page_properties
             if wp.tag.endswith('}p'):
@@ -138,37 +367,44 @@ class Convert(object):
         self.read_block_anchors(doc)
         self.styles.apply_contextual_spacing(paras)
         self.mark_block_runs(paras)
-        # Apply page breaks at the start of every section, except the first
-        # section (since that will be the start of the file)
-        self.styles.apply_section_page_breaks(self.section_starts[1:])
 
-        notes_header = None
+    def convert_notes(self):
+        """
+        Append the footnotes and endnotes to the body and return the header
+        of their section.
+        """
         orig_rid_map = self.images.rid_map
-        if self.footnotes.has_notes:
-            self.body.append(H1(self.notes_text))
-            notes_header = self.body[-1]
-            notes_header.set('class', 'notes-header')
-            for anchor, text, note in self.footnotes:
-                dl = DL(id=anchor)
-                dl.set('class', 'footnote')
-                self.body.append(dl)
-                dl.append(DT('[', A('←' + text, href='#back_%s' % anchor,
-                                    title=text)))
-                dl[-1][0].tail = ']'
-                dl.append(DD())
-                paras = []
-                self.images.rid_map = self.current_rels = note.rels[0]
-                for wp in note:
-                    if wp.tag.endswith('}tbl'):
-                        self.tables.register(wp, self.styles)
-                        self.page_map[wp] = self.current_page
-                    else:
-                        p = self.convert_p(wp)
-                        dl[-1].append(p)
-                        paras.append(wp)
-                self.styles.apply_contextual_spacing(paras)
-                self.mark_block_runs(paras)
+        self.body.append(H1(self.notes_text))
+        notes_header = self.body[-1]
+        notes_header.set('class', 'notes-header')
+        for anchor, text, note in self.footnotes:
+            dl = DL(id=anchor)
+            dl.set('class', 'footnote')
+            self.body.append(dl)
+            back = self.noteref_files.get(anchor, '') + '#back_%s' % anchor
+            dl.append(DT('[', A('←' + text, href=back, title=text)))
+            dl[-1][0].tail = ']'
+            dl.append(DD())
+            paras = []
+            self.images.rid_map = self.current_rels = note.rels[0]
+            for wp in note:
+                if wp.tag.endswith('}tbl'):
+                    self.tables.register(wp, self.styles)
+                    self.page_map[wp] = self.current_page
+                else:
+                    p = self.convert_p(wp)
+                    dl[-1].append(p)
+                    paras.append(wp)
+            self.styles.apply_contextual_spacing(paras)
+            self.mark_block_runs(paras)
+        self.images.rid_map = orig_rid_map
+        return notes_header
 
+    def finish_body(self, notes_header=None, detect_cover=False):
+        """
+        Turn the blocks converted into the body into the final markup.
+        Return path to the cover image found in it, if any.
+        """
         for p, wp in self.object_map.items():
             if (len(p) > 0 and not p.text and len(p[0]) > 0 and
                     not p[0].text and p[0][0].get('class', None) == 'tab'):
@@ -193,11 +429,10 @@ class Convert(object):
                     parent.text = tabs[-1].tail or ''
                     list(map(parent.remove, tabs))
 
-        self.images.rid_map = orig_rid_map
-
         self.resolve_links()
 
-        self.styles.cascade(self.layers)
+        self.styles.cascade(self.layers, keep_body=self.cascaded)
+        self.cascaded = True
 
         self.tables.apply_markup(self.object_map, self.page_map)
 
@@ -236,24 +471,27 @@ class Convert(object):
             if cls:
                 html_obj.set('class', cls)
 
-        if notes_header is not None:
+        if self.first_heading is None:
             for h in self.namespace.children(self.body, 'h1', 'h2', 'h3'):
-                notes_header.tag = h.tag
-                cls = h.get('class', None)
-                if cls and cls != 'notes-header':
-                    notes_header.set('class', '%s notes-header' % cls)
+                self.first_heading = h.tag, h.get('class', None)
                 break
+        if notes_header is not None and self.first_heading is not None:
+            notes_header.tag, cls = self.first_heading
+            if cls and cls != 'notes-header':
+                notes_header.set('class', '%s notes-header' % cls)
 
         self.fields.polish_markup(self.object_map)
 
         self.log.debug('Cleaning up redundant markup generated by Word')
-        self.cover_image = cleanup_markup(self.log, self.html, self.styles,
-                                          self.dest_dir, self.detect_cover,
-                                          self.namespace.XPath)
-
-        return self.write(doc)
-
-    def read_page_properties(self, doc):
+        return cleanup_markup(self.log, self.html, self.styles, self.dest_dir,
+                              detect_cover, self.namespace.XPath)
+
+    def read_page_properties(self, doc, sections=None):
+        """
+        Map the blocks of doc to the page properties of their sections.
+        sections are the page properties of all the sections, when doc is
+        only a part of the document.
+        """
         current = []
         self.page_map = collections.OrderedDict()
         self.section_starts = []
@@ -270,14 +508,20 @@ class Convert(object):
                 for x in paras:
                     self.page_map[x] = pr
                 self.section_starts.append(paras[0])
+                self.section_count += 1
                 current = []
             else:
                 current.append(p)
 
         if current:
             self.section_starts.append(current[0])
-            last = self.namespace.XPath('./w:body/w:sectPr')(doc)
-            pr = PageProperties(self.namespace, last)
+            if sections is None:
+                last = self.namespace.XPath('./w:body/w:sectPr')(doc)
+                pr = PageProperties(self.namespace, last)
+            elif self.section_count < len(sections):
+                pr = sections[self.section_count]
+            else:
+                pr = PageProperties(self.namespace)
             for x in current:
                 self.page_map[x] = pr
 
@@ -393,29 +637,38 @@ class Convert(object):
     def write(self, doc):
         toc = create_toc(doc, self.body, self.resolved_link_map, self.styles,
                          self.object_map, self.log, self.namespace)
+        self.write_html('index.html')
+        self.write_css()
+        return self.write_opf(['index.html'], toc)
+
+    def write_html(self, name):
         raw = html.tostring(self.html, encoding='utf-8',
                             doctype='<!DOCTYPE html>')
-        with open(os.path.join(self.dest_dir, 'index.html'), 'wb') as f:
+        with open(os.path.join(self.dest_dir, name), 'wb') as f:
             f.write(raw)
+
+    def write_css(self):
         css = self.styles.generate_css(self.dest_dir, self.docx,
                                        self.notes_nopb, self.nosupsub)
         if css:
             with open(os.path.join(self.dest_dir, 'docx.css'), 'wb') as f:
                 f.write(css.encode('utf-8'))
 
+    def write_opf(self, spine, toc):
         opf = OPFCreator(self.dest_dir, self.mi)
         opf.toc = toc
         opf.create_manifest_from_files_in([self.dest_dir])
         for item in opf.manifest:
             if item.media_type == 'text/html':
                 item.media_type = mimetypes.guess_type('a.xhtml')[0]
-        opf.create_spine(['index.html'])
+        opf.create_spine(spine)
         if self.cover_image is not None:
             opf.guide.set_cover(self.cover_image)
 
         def process_guide(E, guide):
             if self.toc_anchor is not None:
-                guide.append(E.reference(href='index.html#' + self.toc_anchor,
+                guide.append(E.reference(href='%s#%s' % (self.toc_name,
+                                                         self.toc_anchor),
                                          title='Table of Contents',
                                          type='toc'))
         toc_file = os.path.join(self.dest_dir, 'toc.ncx')
@@ -518,6 +771,7 @@ class Convert(object):
                     'toc', frozenset(self.anchor_map.values()))
                 self.anchor_map[anchor] = current_anchor
                 self.toc_anchor = current_anchor
+                self.toc_name = self.current_name
                 if old_anchor is not None:
                     # The previous anchor was not applied to any element
                     for a, t in tuple(self.anchor_map.items()):
@@ -616,8 +870,9 @@ class Convert(object):
                 span.set('href', relationships_by_id[rid])
                 continue
             anchor = self.namespace.get(hyperlink, 'w:anchor')
-            if anchor and anchor in self.anchor_map:
-                span.set('href', '#' + self.anchor_map[anchor])
+            href = self.anchor_href(anchor) if anchor else None
+            if href is not None:
+                span.set('href', href)
                 continue
             self.log.warning('Hyperlink with unknown target (rid=%s, '
                              'anchor=%s), ignoring', rid, anchor)
@@ -642,14 +897,15 @@ class Convert(object):
             url = hyperlink.get('url', None)
             if url is None:
                 anchor = hyperlink.get('anchor', None)
-                if anchor in self.anchor_map:
-                    span.set('href', '#' + self.anchor_map[anchor])
+                href = self.anchor_href(anchor) if anchor else None
+                if href is not None:
+                    span.set('href', href)
                     continue
                 self.log.warning('Hyperlink field with unknown anchor: %s',
                                  anchor)
             else:
                 if url in self.anchor_map:
-                    span.set('href', '#' + self.anchor_map[url])
+                    span.set('href', self.anchor_href(url))
                     continue
                 span.set('href', url)
 
@@ -669,11 +925,60 @@ class Convert(object):
             if rid in relationships_by_id:
                 dest = relationships_by_id[rid]
                 if dest.startswith('#'):
-                    if dest[1:] in self.anchor_map:
-                        a.set('href', '#' + self.anchor_map[dest[1:]])
+                    href = self.anchor_href(dest[1:]) if dest[1:] else None
+                    if href is not None:
+                        a.set('href', href)
                 else:
                     a.set('href', dest)
 
+    def anchor_href(self, anchor):
+        """
+        Return href of the element with the bookmark anchor, None if there
+        is no such bookmark. Links to bookmarks in parts of the document not
+        converted yet are resolved by resolve_pending_links().
+        """
+        aid = self.anchor_map.get(anchor, None)
+        if aid is None:
+            if self.pending_files is None:
+                return None
+            self.pending_files.add(self.current_name)
+            return PENDING_HREF + anchor.encode('utf-8').hex()
+        name = self.anchor_files.get(anchor, self.current_name)
+        return ('' if name == self.current_name else name) + '#' + aid
+
+    def resolve_pending_links(self):
+        """
+        Point links written before their targets were converted to the
+        targets, or drop their hrefs if there are no such bookmarks.
+        """
+        pending, self.pending_files = self.pending_files, None
+
+        def sub(m):
+            anchor = bytes.fromhex(m.group(1).decode('ascii')).decode('utf-8')
+            href = self.anchor_href(anchor)
+            if href is None:
+                self.log.warning('Hyperlink with unknown target (anchor=%s), '
+                                 'ignoring', anchor)
+                return b''
+            return b' href="%s"' % href.encode('utf-8')
+
+        for name in sorted(pending):
+            self.current_name = name
+            path = os.path.join(self.dest_dir, name)
+            with open(path, 'rb') as f:
+                raw = f.read()
+            with open(path, 'wb') as f:
+                f.write(PENDING_PAT.sub(sub, raw))
+
+    def resolve_toc_entry(self, entry):
+        if not entry.anchor.startswith(PENDING_HREF[1:]):
+            return entry
+        anchor = bytes.fromhex(entry.anchor[len(PENDING_HREF) - 1:]).decode(
+            'utf-8')
+        if anchor in self.anchor_map:
+            return TI(entry.text, self.anchor_files[anchor],
+                      self.anchor_map[anchor], entry.indent)
+
     def convert_run(self, run):
         ans = SPAN()
         self.object_map[ans] = run
@@ -727,8 +1032,10 @@ class Convert(object):
                   self.namespace.is_tag(child, 'w:endnoteReference')):
                 anchor, name = self.footnotes.get_ref(child)
                 if anchor and name:
-                    _l = A(name, id='back_%s' % anchor, href='#' + anchor,
-                           title=name)
+                    if self.notes_name:
+                        self.noteref_files[anchor] = self.current_name
+                    _l = A(name, id='back_%s' % anchor,
+                           href=self.notes_name + '#' + anchor, title=name)
                     _l.set('class', 'noteref')
                     text.add_elem(_l)
                     ans.append(text.elem)
@@ -7,19 +7,8 @@ from ebook_converter.ebooks.metadata.toc import TOC
 from ebook_converter.ebooks.oeb.polish.toc import elem_to_toc_text
 
 
-def from_headings(body, log, namespace, num_levels=3):
-    ' Create a TOC from headings in the document '
-    tocroot = TOC()
-    all_heading_nodes = body.xpath('//*[@data-heading-level]')
-    level_prev = {i+1:None for i in range(num_levels)}
-    level_prev[0] = tocroot
-    level_item_map = {i:frozenset(
-        x for x in all_heading_nodes if int(x.get('data-heading-level')) == i)
-        for i in range(1, num_levels+1)}
-    item_level_map = {e:i for i, elems in level_item_map.items() for e in elems}
-
-    idcount = count()
-
+def heading_items(body, name, idcount, num_levels=3):
+    ' Yield (level, name, id, text) for the headings in body, which is written to the file name '
     def ensure_id(elem):
         ans = elem.get('id', None)
         if not ans:
@@ -27,18 +16,26 @@ def from_headings(body, log, namespace, num_levels=3):
             elem.set('id', ans)
         return ans
 
-    for item in all_heading_nodes:
-        lvl = plvl = item_level_map.get(item, None)
-        if lvl is None:
-            continue
+    for item in body.xpath('//*[@data-heading-level]'):
+        lvl = int(item.get('data-heading-level'))
+        if 1 <= lvl <= num_levels:
+            yield lvl, name, ensure_id(item), elem_to_toc_text(item)
+
+
+def toc_from_headings(items, log, num_levels=3):
+    ' Create a TOC from the items yielded by heading_items() '
+    tocroot = TOC()
+    level_prev = {i+1:None for i in range(num_levels)}
+    level_prev[0] = tocroot
+
+    for lvl, name, elem_id, text in items:
+        plvl = lvl
         parent = None
         while parent is None:
             plvl -= 1
             parent = level_prev[plvl]
         lvl = plvl + 1
-        elem_id = ensure_id(item)
-        text = elem_to_toc_text(item)
-        toc = parent.add_item('index.html', elem_id, text)
+        toc = parent.add_item(name, elem_id, text)
         level_prev[lvl] = toc
         for i in range(lvl+1, num_levels+1):
             level_prev[i] = None
@@ -48,6 +45,11 @@ def from_headings(body, log, namespace, num_levels=3):
         return tocroot
 
 
+def from_headings(body, log, namespace, num_levels=3):
+    ' Create a TOC from headings in the document '
+    return toc_from_headings(heading_items(body, 'index.html', count(), num_levels), log, num_levels)
+
+
 def structure_toc(entries):
     indent_vals = sorted({x.indent for x in entries})
     last_found = [None for i in indent_vals]
@@ -55,7 +57,7 @@ def structure_toc(entries):
 
     if len(indent_vals) > 6:
         for x in entries:
-            newtoc.add_item('index.html', x.anchor, x.text)
+            newtoc.add_item(x.name, x.anchor, x.text)
         return newtoc
 
     def find_parent(level):
@@ -68,7 +70,7 @@ def structure_toc(entries):
     for item in entries:
         level = indent_vals.index(item.indent)
         parent = find_parent(level)
-        last_found[level] = parent.add_item('index.html', item.anchor,
+        last_found[level] = parent.add_item(item.name, item.anchor,
                     item.text)
         for i in range(level+1, len(last_found)):
             last_found[i] = None
@@ -88,12 +90,22 @@ def link_to_txt(a, styles, object_map):
     return tostring(a, method='text', with_tail=False, encoding='unicode').strip()
 
 
-def from_toc(docx, link_map, styles, object_map, log, namespace):
+TI = namedtuple('TI', 'text name anchor indent')
+
+
+def toc_entries(docx, link_map, styles, object_map, namespace, name='index.html', state=None):
+    '''
+    Return the entries of the Word Table of Contents in docx, which is
+    written to the file name. state holds the nesting of fields, pass the
+    same list for consecutive parts of a document converted in parts.
+    '''
     XPath, get, ancestor = namespace.XPath, namespace.get, namespace.ancestor
-    toc_level = None
-    level = 0
-    TI = namedtuple('TI', 'text anchor indent')
+    if state is None:
+        state = [0, None, False]
+    level, toc_level, done = state
     toc = []
+    if done:
+        return toc
     for tag in XPath('//*[(@w:fldCharType and name()="w:fldChar") or name()="w:hyperlink" or name()="w:instrText"]')(docx):
         n = tag.tag.rpartition('}')[-1]
         if n == 'fldChar':
@@ -103,6 +115,7 @@ def from_toc(docx, link_map, styles, object_map, log, namespace):
             elif t == 'end':
                 level -= 1
                 if toc_level is not None and level < toc_level:
+                    done = True
                     break
         elif n == 'instrText':
             if level > 0 and tag.text and tag.text.strip().startswith('TOC '):
@@ -121,7 +134,14 @@ def from_toc(docx, link_map, styles, object_map, log, namespace):
                         ml = 0
                     if ps.text_align in {'center', 'right'}:
                         ml = 0
-                    toc.append(TI(txt, href[1:], ml))
+                    target, _, anchor = href.partition('#')
+                    toc.append(TI(txt, target or name, anchor, ml))
+    state[:] = level, toc_level, done
+    return toc
+
+
+def from_toc(docx, link_map, styles, object_map, log, namespace):
+    toc = toc_entries(docx, link_map, styles, object_map, namespace)
     if toc:
         log.info('Found Word Table of Contents, using it to generate the '
                  'Table of Contents')
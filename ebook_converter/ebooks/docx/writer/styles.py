@@ -1,4 +1,6 @@
+import functools
 import numbers
+import weakref
 from collections import Counter, defaultdict
 from operator import attrgetter
 
@@ -28,6 +30,7 @@ def parse_css_font_family(raw):
                 yield val
 
 
+@functools.lru_cache(maxsize=256)
 def css_font_family_to_docx(raw):
     generic = {'serif':'Cambria', 'sansserif':'Candara', 'sans-serif':'Candara', 'fantasy':'Comic Sans', 'cursive':'Segoe Script'}
     for ff in parse_css_font_family(raw):
@@ -147,8 +150,10 @@ class DOCXStyle(object):
         self.calculate_hash()
 
     def calculate_hash(self):
-        self._hash = hash(tuple(
-            getattr(self, x) for x in self.ALL_PROPS))
+        # Styles are interned by the tuple of their properties, which do not
+        # change after the style is created
+        self._key = tuple(getattr(self, x) for x in self.ALL_PROPS)
+        self._hash = hash(self._key)
 
     def makeelement(self, parent, name, **attrs):
         return parent.makeelement(self.w(name), **{self.w(k):v for k, v in attrs.items()})
@@ -157,10 +162,8 @@ class DOCXStyle(object):
         return self._hash
 
     def __eq__(self, other):
-        for x in self.ALL_PROPS:
-            if getattr(self, x) != getattr(other, x, None):
-                return False
-        return True
+        return self is other or (type(self) is type(other) and
+                                 self._key == other._key)
 
     def __ne__(self, other):
         return not self == other
@@ -633,23 +636,29 @@ class StylesManager(object):
         self.log = log
         self.block_styles, self.text_styles = {}, {}
         self.styles_for_html_blocks = {}
+        # Text styles already created for the CSS styles of elements, the same
+        # CSS style is used for text and tails of its children
+        self.text_styles_for_css = weakref.WeakKeyDictionary()
 
     def create_text_style(self, css_style, is_parent_style=False):
+        try:
+            cached = self.text_styles_for_css[css_style]
+        except KeyError:
+            cached = self.text_styles_for_css[css_style] = {}
+        except TypeError:
+            # Not weak referenceable
+            cached = {}
+        try:
+            return cached[is_parent_style]
+        except KeyError:
+            pass
         ans = TextStyle(self.namespace, css_style, is_parent_style=is_parent_style)
-        existing = self.text_styles.get(ans, None)
-        if existing is None:
-            self.text_styles[ans] = ans
-        else:
-            ans = existing
+        ans = cached[is_parent_style] = self.text_styles.setdefault(ans, ans)
         return ans
 
     def create_block_style(self, css_style, html_block, is_table_cell=False, parent_bg=None):
         ans = BlockStyle(self.namespace, css_style, html_block, is_table_cell=is_table_cell, parent_bg=parent_bg)
-        existing = self.block_styles.get(ans, None)
-        if existing is None:
-            self.block_styles[ans] = ans
-        else:
-            ans = existing
+        ans = self.block_styles.setdefault(ans, ans)
         self.styles_for_html_blocks[html_block] = ans
         return ans
 
@@ -1,3 +1,5 @@
+import functools
+
 from ebook_converter.tinycss.color3 import parse_color_string
 
 
@@ -14,6 +16,7 @@ def int_or_zero(raw):
 # convert_color() {{{
 
 
+@functools.lru_cache(maxsize=1024)
 def convert_color(value):
     if not value:
         return
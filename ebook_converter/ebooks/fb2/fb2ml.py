@@ -1,6 +1,7 @@
 """
 Transform OEB content into FB2 markup
 """
+import base64
 from datetime import datetime
 import re
 import textwrap
@@ -13,7 +14,6 @@ from ebook_converter import constants as const
 from ebook_converter.constants_old import __appname__, __version__
 from ebook_converter.ebooks.oeb import base
 from ebook_converter.ebooks.oeb import parse_utils
-from ebook_converter import polyglot
 from ebook_converter.utils import entities
 from ebook_converter.utils.img import save_cover_data_to
 from ebook_converter.utils.localization import lang_as_iso639_1
@@ -23,6 +23,47 @@ __license__ = 'GPL 3'
 __copyright__ = '2009, John Schember <john@nachtimwald.com>'
 __docformat__ = 'restructuredtext en'
 
+# Length of lines of base64 encoded images
+BASE64_LINE = 72
+# Bytes of image data encoded at once, whole lines without padding
+BASE64_CHUNK = BASE64_LINE // 4 * 3 * 1024
+# Markup is cleaned and written out in pieces of about that size
+FLUSH_SIZE = 256 * 1024
+
+
+def base64_lines(data):
+    """
+    Yield base64 encoding of data in pieces of lines BASE64_LINE long,
+    separated by line breaks.
+    """
+    data = memoryview(data)
+    for start in range(0, len(data), BASE64_CHUNK):
+        raw = base64.standard_b64encode(data[start:start + BASE64_CHUNK])
+        raw = raw.decode('ascii')
+        lines = '\n'.join(raw[i:i + BASE64_LINE]
+                          for i in range(0, len(raw), BASE64_LINE))
+        yield lines if start == 0 else '\n' + lines
+
+
+def safe_cut(text):
+    """
+    Return position just after the last non-whitespace character of text,
+    which is outside of tags, or 0. Matches of the patterns of clean_text()
+    consist only of tags and whitespace, so none of them can span such a
+    position and both parts of the text can be cleaned separately.
+    """
+    end = len(text)
+    while end:
+        gt = text.rfind('>', 0, end)
+        if gt == -1:
+            return 0
+        lt = text.find('<', gt + 1, end)
+        segment = text[gt + 1:end if lt == -1 else lt].rstrip()
+        if segment:
+            return gt + 1 + len(segment)
+        end = gt
+    return 0
+
 
 class FB2MLizer(object):
     '''
@@ -60,14 +101,29 @@ class FB2MLizer(object):
 
         return self.fb2mlize_spine()
 
+    def write_content(self, oeb_book, opts, stream):
+        """
+        Write the FB2 document encoded in UTF-8 into the binary stream. The
+        document is written out while it is generated, unless it has to be
+        pretty printed.
+        """
+        if opts.pretty_print:
+            stream.write(self.extract_content(oeb_book, opts)
+                         .encode('utf-8', 'replace'))
+            return
+        self.log.info('Converting XHTML to FB2 markup...')
+        self.oeb_book = oeb_book
+        self.opts = opts
+        self.reset_state()
+        if self.opts.sectionize == 'toc':
+            self.create_flat_toc(self.oeb_book.toc, 1)
+
+        stream.write(b'<?xml version="1.0" encoding="UTF-8"?>\n')
+        for text in self.clean_parts(self.fb2mlize_parts()):
+            stream.write(text.encode('utf-8', 'replace'))
+
     def fb2mlize_spine(self):
-        output = (
-            self.fb2_header(),
-            self.get_text(),
-            self.fb2mlize_images(),
-            self.fb2_footer(),
-        )
-        output = self.clean_text('\n'.join(output))
+        output = ''.join(self.clean_parts(self.fb2mlize_parts()))
 
         if self.opts.pretty_print:
             output = etree.tostring(etree.fromstring(output),
@@ -75,6 +131,38 @@ class FB2MLizer(object):
 
         return '<?xml version="1.0" encoding="UTF-8"?>\n' + output
 
+    def fb2mlize_parts(self):
+        """
+        Yield pieces of the FB2 markup, before it is cleaned.
+        """
+        yield self.fb2_header()
+        yield '\n'
+        yield from self.iter_text()
+        yield '\n'
+        yield from self.iter_images()
+        yield '\n'
+        yield self.fb2_footer()
+
+    def clean_parts(self, parts):
+        """
+        Clean pieces of markup with clean_text(), yielding the cleaned text
+        in parts of about FLUSH_SIZE. The result is the same as if all the
+        pieces were cleaned at once.
+        """
+        pending, size = [], 0
+        for part in parts:
+            pending.append(part)
+            size += len(part)
+            if size < FLUSH_SIZE:
+                continue
+            text = ''.join(pending)
+            cut = safe_cut(text)
+            if cut:
+                yield self.clean_text(text[:cut])
+                text = text[cut:]
+            pending, size = [text], len(text)
+        yield self.clean_text(''.join(pending))
+
     def clean_text(self, text):
         # Remove pointless tags, but keep their contents.
         text = re.sub(r'(?mu)<(strong|emphasis|strikethrough|sub|sup)>'
@@ -302,6 +390,12 @@ class FB2MLizer(object):
         return ''
 
     def get_text(self):
+        return ''.join(self.iter_text())
+
+    def iter_text(self):
+        """
+        Yield the markup of the body, one spine item at a time.
+        """
         from ebook_converter.ebooks.oeb.stylizer import Stylizer
         text = ['<body>']
 
@@ -324,27 +418,36 @@ class FB2MLizer(object):
                 page_section_open = True
                 self.section_level += 1
 
-            text += self.dump_text(item.data.find(base.tag('xhtml', 'body')),
-                                   stylizer, item)
+            self._dump_text(item.data.find(base.tag('xhtml', 'body')),
+                            stylizer, item, [], text)
 
             if page_section_open:
                 text.append('</section>')
                 self.section_level -= 1
 
+            yield ''.join(text)
+            text = []
+
         # Close any open sections
         while self.section_level > 0:
             text.append('</section>')
             self.section_level -= 1
 
         text.append('</body>')
-        return ''.join(text)
+        yield ''.join(text)
 
     def fb2mlize_images(self):
+        return ''.join(self.iter_images())
+
+    def iter_images(self):
         """
+        Yield the <binary> elements of images in pieces, the data of every
+        image encoded incrementally.
+
         This function uses the self.image_hrefs dictionary mapping. It is
         populated by the dump_text function.
         """
-        images = []
+        first = True
         for item in self.oeb_book.manifest:
             # Don't write the image if it's not referenced in the document's
             # text.
@@ -353,24 +456,25 @@ class FB2MLizer(object):
             if item.media_type in base.OEB_RASTER_IMAGES:
                 try:
                     if item.media_type not in ('image/jpeg', 'image/png'):
-                        imdata = save_cover_data_to(item.data,
-                                                    compression_quality=70)
-                        raw_data = polyglot.as_base64_unicode(imdata)
+                        data = save_cover_data_to(item.data,
+                                                  compression_quality=70)
                         content_type = 'image/jpeg'
                     else:
-                        raw_data = polyglot.as_base64_unicode(item.data)
+                        data = item.data
                         content_type = item.media_type
-                    # Don't put the encoded image on a single line.
-                    step = 72
-                    data = '\n'.join(raw_data[i:i+step]
-                                     for i in range(0, len(raw_data), step))
-                    images.append('<binary id="%s" content-type="%s">%s'
-                                  '</binary>' % (self.image_hrefs[item.href],
-                                                 content_type, data))
+                    if isinstance(data, str):
+                        data = data.encode('utf-8')
                 except Exception as e:
                     self.log.error('Error: Could not include file %s because '
                                    '%s.', item.href, e)
-        return '\n'.join(images)
+                    continue
+                yield ('%s<binary id="%s" content-type="%s">' %
+                       ('' if first else '\n', self.image_hrefs[item.href],
+                        content_type))
+                # Don't put the encoded image on a single line.
+                yield from base64_lines(data)
+                yield '</binary>'
+                first = False
 
     def create_flat_toc(self, nodes, level):
         for item in nodes:
@@ -440,6 +544,15 @@ class FB2MLizer(object):
 
         @return: List of string representing the XHTML converted to FB2 markup.
         """
+        fb2_out = []
+        self._dump_text(elem_tree, stylizer, page, tag_stack, fb2_out)
+        return fb2_out
+
+    def _dump_text(self, elem_tree, stylizer, page, tag_stack, fb2_out):
+        """
+        Append the FB2 markup of elem_tree to the fb2_out list, for
+        dump_text().
+        """
         elem = elem_tree
 
         # Ensure what we are converting is not a string and that the fist tag
@@ -450,18 +563,16 @@ class FB2MLizer(object):
             if (p is not None and isinstance(p.tag, (str, bytes)) and
                     parse_utils.namespace(p.tag) == const.XHTML_NS and
                     elem.tail):
-                return [elem.tail]
-            return []
+                fb2_out.append(elem.tail)
+            return
 
         style = stylizer.style(elem_tree)
         if style['display'] in ('none', 'oeb-page-head', 'oeb-page-foot') \
            or style['visibility'] == 'hidden':
             if hasattr(elem, 'tail') and elem.tail:
-                return [elem.tail]
-            return []
+                fb2_out.append(elem.tail)
+            return
 
-        # FB2 generated output.
-        fb2_out = []
         # FB2 tags in the order they are opened. This will be used to close
         # the tags.
         tags = []
@@ -596,7 +707,7 @@ class FB2MLizer(object):
 
         # Process sub-elements.
         for item in elem_tree:
-            fb2_out += self.dump_text(item, stylizer, page, tag_stack+tags)
+            self._dump_text(item, stylizer, page, tag_stack+tags, fb2_out)
 
         # Close open FB2 tags.
         tags.reverse()
@@ -611,8 +722,6 @@ class FB2MLizer(object):
             if not self.in_p:
                 fb2_out.append('</p>')
 
-        return fb2_out
-
     def close_tags(self, tags):
         text = []
         for tag in tags:
@@ -1,13 +1,61 @@
-import array
 import itertools
 import re
-import sys
 
 from ebook_converter.utils.config import OptionParser
 from ebook_converter.utils.filenames import ascii_filename
 from ebook_converter.ebooks.lrf.meta import LRFMetaFile
 from ebook_converter.ebooks.lrf.objects import get_object, PageTree, \
-        StyleObject, Font, Text, TOCObject, BookAttr, ruby_tags
+        StyleObject, Font, Text, TOCObject, BookAttr, ImageStream, \
+        object_map, ruby_tags
+
+
+class LRFObjects(object):
+    """
+    Objects of the LRF document keyed by their ids, in the order of the
+    object index. Objects are parsed (and initialized) when they are first
+    accessed, so that only the objects, which are actually used, are read.
+    """
+
+    def __init__(self, document):
+        self._document = document
+        self._objects = {}
+
+    def __getitem__(self, objid):
+        try:
+            return self._objects[objid]
+        except KeyError:
+            pass
+        doc = self._document
+        offset, size = doc.object_index()[objid][:2]
+        obj = get_object(doc, doc._file, objid, offset, size,
+                         doc.scramble_key)
+        # Store the object first, so that objects referring to each other
+        # don't get parsed over and over
+        self._objects[objid] = obj
+        if hasattr(obj, 'initialize'):
+            obj.initialize()
+        return obj
+
+    def __contains__(self, objid):
+        return objid in self._document.object_index()
+
+    def __len__(self):
+        return len(self._document.object_index())
+
+    def __iter__(self):
+        return iter(list(self._document.object_index()))
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return [self[objid] for objid in self]
+
+    def items(self):
+        return [(objid, self[objid]) for objid in self]
+
+    def get(self, objid, default=None):
+        return self[objid] if objid in self else default
 
 
 class LRFDocument(LRFMetaFile):
@@ -40,28 +88,20 @@ class LRFDocument(LRFMetaFile):
             setattr(self.device_info, a, getattr(self, a))
 
     def _parse_objects(self):
-        self.objects = {}
-        self._file.seek(self.object_index_offset)
-        obj_array = array.array("I", self._file.read(4 * 4 *
-                                                     self.number_of_objects))
-        if sys.byteorder == 'big':
-            obj_array.byteswap()
-
-        for i in range(self.number_of_objects):
-            if not self.keep_parsing:
-                break
-            objid, objoff, objsize = obj_array[i*4:i*4+3]
-            self._parse_object(objid, objoff, objsize)
-        for obj in self.objects.values():
+        self.objects = LRFObjects(self)
+        # Page trees, the TOC and book attributes are needed to walk the
+        # document, and images and fonts to write them out. All the other
+        # objects are parsed when they are referenced.
+        eager = (PageTree, TOCObject, BookAttr, ImageStream, Font)
+        for objid, (offset, size, obj_type) in self.object_index().items():
             if not self.keep_parsing:
                 break
-            if hasattr(obj, 'initialize'):
-                obj.initialize()
+            if (obj_type < len(object_map) and
+                    object_map[obj_type] in eager):
+                self._parse_object(objid)
 
-    def _parse_object(self, objid, objoff, objsize):
-        obj = get_object(self, self._file, objid, objoff, objsize,
-                         self.scramble_key)
-        self.objects[objid] = obj
+    def _parse_object(self, objid):
+        obj = self.objects[objid]
         if isinstance(obj, PageTree):
             self.page_trees.append(obj)
         elif isinstance(obj, TOCObject):
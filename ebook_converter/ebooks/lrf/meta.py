@@ -480,6 +480,7 @@ class LRFMetaFile(object):
         file.seek(0, 2)
         self.size = file.tell()
         self._file = file
+        self._object_index = None
         if self.lrf_header != LRFMetaFile.LRF_HEADER:
             raise LRFException(file.name + " has an invalid LRF header. Are "
                                "you sure it is an LRF file?")
@@ -503,6 +504,7 @@ class LRFMetaFile(object):
             self._file.seek(8, os.SEEK_CUR)
             count -= 1
         self._file.flush()
+        self._object_index = None
 
     @safe
     def unpack(self, fmt=DWORD, start=0):
@@ -574,37 +576,45 @@ class LRFMetaFile(object):
         self._file.write(val)
 
     def _objects(self):
+        """
+        Yield (id, offset, size) of all the objects from the object index.
+        """
         self._file.seek(self.object_index_offset)
-        c = self.number_of_objects
-        while c > 0:
-            c -= 1
-            raw = self._file.read(16)
-            pos = self._file.tell()
-            yield struct.unpack('<IIII', raw)[:3]
-            self._file.seek(pos)
+        raw = self._file.read(16 * self.number_of_objects)
+        for i in range(len(raw) // 16):
+            yield struct.unpack_from('<III', raw, i * 16)
+
+    def object_index(self):
+        """
+        Return dict mapping ids of all the objects to their (offset, size,
+        type) tuples. The object index, and the start tags of the objects
+        (to get their types) are read only once.
+        """
+        if self._object_index is None:
+            index, by_type = {}, {}
+            for id, offset, size in self._objects():
+                self._file.seek(offset)
+                raw = self._file.read(8)
+                if len(raw) < 8:
+                    continue
+                tag_id, obj_id, obj_type = struct.unpack('<HIH', raw)
+                if tag_id == 0xF500:
+                    index[obj_id] = (offset, size, obj_type)
+                    by_type.setdefault(obj_type, []).append((obj_id, offset,
+                                                             size))
+            self._object_index, self._objects_by_type = index, by_type
+        return self._object_index
 
     def get_objects_by_type(self, type):
-        from ebook_converter.ebooks.lrf.tags import Tag
-        objects = []
-        for id, offset, size in self._objects():
-            self._file.seek(offset)
-            tag = Tag(self._file)
-            if tag.id == 0xF500:
-                obj_id, obj_type = struct.unpack("<IH", tag.contents)
-                if obj_type == type:
-                    objects.append((obj_id, offset, size))
-        return objects
+        self.object_index()
+        return list(self._objects_by_type.get(type, []))
 
     def get_object_by_id(self, tid):
-        from ebook_converter.ebooks.lrf.tags import Tag
-        for id, offset, size in self._objects():
-            self._file.seek(offset)
-            tag = Tag(self._file)
-            if tag.id == 0xF500:
-                obj_id, obj_type = struct.unpack("<IH", tag.contents)
-                if obj_id == tid:
-                    return obj_id, offset, size, obj_type
-        return (False, False, False, False)
+        try:
+            offset, size, obj_type = self.object_index()[tid]
+        except KeyError:
+            return (False, False, False, False)
+        return tid, offset, size, obj_type
 
     @safe
     def get_cover(self):
@@ -36,7 +36,7 @@ class LRFObject(object):
             a[i] ^= xorKey
             i += 1
             l -= 1
-        return a.tostring()
+        return a.tobytes()
 
     @classmethod
     def parse_empdots(self, tag, f):
@@ -145,11 +145,26 @@ class LRFStream(LRFObject):
     tag_map.update(LRFObject.tag_map)
 
     def __init__(self, document, stream, id, scramble_key, boundary):
-        self.stream = ''
+        self._stream = b''
+        # Stream as read from the file, it is descrambled and decompressed
+        # only when it is first used
+        self._raw_stream = None
         self.stream_size = 0
         self.stream_read = False
         LRFObject.__init__(self, document, stream, id, scramble_key, boundary)
 
+    @property
+    def stream(self):
+        if self._raw_stream is not None:
+            self._stream = self.decode_stream(self._raw_stream)
+            self._raw_stream = None
+        return self._stream
+
+    @stream.setter
+    def stream(self, val):
+        self._raw_stream = None
+        self._stream = val
+
     def read_stream_size(self, tag, stream):
         self.stream_size = tag.dword
 
@@ -161,9 +176,14 @@ class LRFStream(LRFObject):
             raise LRFParseError('There can be only one stream per object')
         if not hasattr(self, 'stream_flags'):
             raise LRFParseError('Stream flags not initialized')
-        self.stream = stream.read(self.stream_size)
+        self._raw_stream = stream.read(self.stream_size)
+        if stream.read(2) != b'\x06\xF5':
+            print("Warning: corrupted end-of-stream tag at %08X; skipping it"%(stream.tell()-2))
+        self.end_stream(None, None)
+
+    def decode_stream(self, data):
         if self.stream_flags & 0x200 !=0:
-            l = len(self.stream)
+            l = len(data)
             key = self._scramble_key&0xFF
             if key != 0 and key <= 0xF0:
                 key = l % key + 0xF
@@ -171,15 +191,13 @@ class LRFStream(LRFObject):
                 key = 0
             if l > 0x400 and (isinstance(self, ImageStream) or isinstance(self, Font) or isinstance(self, SoundStream)):
                 l = 0x400
-            self.stream = self.descramble_buffer(self.stream, l, key)
+            data = self.descramble_buffer(data, l, key)
         if self.stream_flags & 0x100 !=0:
-            decomp_size = struct.unpack("<I", self.stream[:4])[0]
-            self.stream = zlib.decompress(self.stream[4:])
-            if len(self.stream) != decomp_size:
+            decomp_size = struct.unpack("<I", data[:4])[0]
+            data = zlib.decompress(data[4:])
+            if len(data) != decomp_size:
                 raise LRFParseError("Stream decompressed size is wrong!")
-        if stream.read(2) != b'\x06\xF5':
-            print("Warning: corrupted end-of-stream tag at %08X; skipping it"%(stream.tell()-2))
-        self.end_stream(None, None)
+        return data
 
 
 class PageTree(LRFObject):
@@ -37,6 +37,16 @@ NULL_VALUES = {'user_metadata': {},
                'author_link_map': {},
                'language': 'und'}
 
+# Null values of the fields, which are shared by all Metadata objects, as
+# they are immutable
+IMMUTABLE_NULL_VALUES = {k: v for k, v in NULL_VALUES.items()
+                         if isinstance(v, (str, tuple)) and k != 'language'}
+# Factories of mutable null values. These are created for the object on
+# first access of the field only, so that constructing the object doesn't
+# need to copy any of them.
+NULL_FACTORIES = {k: v.copy for k, v in NULL_VALUES.items()
+                  if k not in IMMUTABLE_NULL_VALUES and k != 'language'}
+
 field_metadata = FieldMetadata()
 
 
@@ -49,6 +59,76 @@ ck = lambda typ: typ.lower().strip().replace(':', '').replace(',', '')
 cv = lambda val: val.strip().replace(',', '|')
 
 
+def _get_field(_data, field):
+    try:
+        return _data[field]
+    except KeyError:
+        factory = NULL_FACTORIES.get(field)
+        if factory is None:
+            return None
+        val = _data[field] = factory()
+        return val
+
+
+class _SimpleField(object):
+    """
+    Descriptor of the standard field, which is stored in _data.
+    """
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        return _get_field(obj._data, self.name)
+
+    def __set__(self, obj, val):
+        if val is None:
+            if self.name in NULL_FACTORIES:
+                obj._data.pop(self.name, None)
+                return
+            val = NULL_VALUES.get(self.name, None)
+        obj._data[self.name] = val
+
+
+class _IdentifiersField(_SimpleField):
+
+    def __set__(self, obj, val):
+        obj.set_identifiers(val or {})
+
+
+class _TopLevelIdentifierField(_SimpleField):
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        return (obj._data.get('identifiers') or {}).get(self.name, None)
+
+    def __set__(self, obj, val):
+        field, val = obj._clean_identifier(self.name, val)
+        identifiers = _get_field(obj._data, 'identifiers')
+        identifiers.pop(field, None)
+        if val:
+            identifiers[field] = val
+
+
+class _LanguageField(_SimpleField):
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        return (obj._data.get('languages') or
+                (NULL_VALUES['language'],))[0]
+
+    def __set__(self, obj, val):
+        langs = []
+        if val and val.lower() != 'und':
+            langs = [val]
+        obj._data['languages'] = langs
+
+
 class Metadata(object):
 
     '''
@@ -70,6 +150,7 @@ class Metadata(object):
     becomes a reserved field name.
     '''
     __calibre_serializable__ = True
+    __slots__ = ('_data', '_formatter', 'template_cache', '__dict__')
 
     def __init__(self, title, authors=('Unknown',), other=None,
                  template_cache=None, formatter=None):
@@ -78,9 +159,9 @@ class Metadata(object):
         @param authors: List of strings or []
         @param other: None or a metadata object
         '''
-        _data = copy.deepcopy(NULL_VALUES)
-        _data.pop('language')
-        object.__setattr__(self, '_data', _data)
+        object.__setattr__(self, '_data', dict(IMMUTABLE_NULL_VALUES))
+        object.__setattr__(self, '_formatter', formatter)
+        object.__setattr__(self, 'template_cache', template_cache)
         if other is not None:
             self.smart_update(other)
         else:
@@ -90,9 +171,20 @@ class Metadata(object):
                 # List of strings or []
                 self.author = list(authors) if authors else []  # Needed for backward compatibility
                 self.authors = list(authors) if authors else []
-        from ebook_converter.ebooks.metadata.book.formatter import SafeFormat
-        self.formatter = SafeFormat() if formatter is None else formatter
-        self.template_cache = template_cache
+
+    @property
+    def formatter(self):
+        # Formatter is needed for composite custom fields only, so it is
+        # created on first use
+        if self._formatter is None:
+            from ebook_converter.ebooks.metadata.book.formatter import \
+                SafeFormat
+            object.__setattr__(self, '_formatter', SafeFormat())
+        return self._formatter
+
+    @formatter.setter
+    def formatter(self, val):
+        object.__setattr__(self, '_formatter', val)
 
     def is_null(self, field):
         '''
@@ -116,23 +208,16 @@ class Metadata(object):
         null_val = copy.copy(NULL_VALUES.get(field))
         setattr(self, field, null_val)
 
-    def __getattribute__(self, field):
-        _data = object.__getattribute__(self, '_data')
-        if field in SIMPLE_GET:
-            return _data.get(field, None)
-        if field in TOP_LEVEL_IDENTIFIERS:
-            return _data.get('identifiers').get(field, None)
-        if field == 'language':
-            try:
-                return _data.get('languages', [])[0]
-            except:
-                return NULL_VALUES['language']
-        try:
-            return object.__getattribute__(self, field)
-        except AttributeError:
-            pass
-        if field in _data['user_metadata']:
-            d = _data['user_metadata'][field]
+    def __getattr__(self, field):
+        # Called only for the fields, which are not found in the usual way,
+        # that is the custom fields
+        if field[:1] == '_':
+            raise AttributeError(
+                    'Metadata object has no attribute named: '+ repr(field))
+        _data = self._data
+        user_metadata = _data.get('user_metadata')
+        if user_metadata and field in user_metadata:
+            d = user_metadata[field]
             val = d['#value#']
             if d['datatype'] != 'composite':
                 return val
@@ -152,40 +237,36 @@ class Metadata(object):
                 'Metadata object has no attribute named: '+ repr(field))
 
     def __setattr__(self, field, val, extra=None):
-        _data = object.__getattribute__(self, '_data')
-        if field in SIMPLE_SET:
-            if val is None:
-                val = copy.copy(NULL_VALUES.get(field, None))
-            _data[field] = val
-        elif field in TOP_LEVEL_IDENTIFIERS:
-            field, val = self._clean_identifier(field, val)
-            identifiers = _data['identifiers']
-            identifiers.pop(field, None)
-            if val:
-                identifiers[field] = val
-        elif field == 'identifiers':
-            if not val:
-                val = copy.copy(NULL_VALUES.get('identifiers', None))
-            self.set_identifiers(val)
-        elif field == 'language':
-            langs = []
-            if val and val.lower() != 'und':
-                langs = [val]
-            _data['languages'] = langs
-        elif field in _data['user_metadata']:
-            _data['user_metadata'][field]['#value#'] = val
-            _data['user_metadata'][field]['#extra#'] = extra
-        else:
-            # You are allowed to stick arbitrary attributes onto this object as
-            # long as they don't conflict with global or user metadata names
-            # Don't abuse this privilege
-            self.__dict__[field] = val
+        if field not in FIELD_DESCRIPTORS:
+            user_metadata = self._data.get('user_metadata')
+            if user_metadata and field in user_metadata:
+                user_metadata[field]['#value#'] = val
+                user_metadata[field]['#extra#'] = extra
+                return
+        # Standard fields are set by their descriptors. You are allowed to
+        # stick arbitrary attributes onto this object as long as they don't
+        # conflict with global or user metadata names. Don't abuse this
+        # privilege
+        object.__setattr__(self, field, val)
+
+    def __getstate__(self):
+        return (self.__dict__, {name: getattr(self, name) for name in
+                                ('_data', '_formatter', 'template_cache')})
+
+    def __setstate__(self, state):
+        # Bypass __setattr__, which needs _data already set
+        attrs, slots = state
+        for name, val in slots.items():
+            object.__setattr__(self, name, val)
+        self.__dict__.update(attrs)
 
     def __iter__(self):
-        return iter(object.__getattribute__(self, '_data'))
+        _data = self._data
+        return iter(list(_data) + [k for k in NULL_FACTORIES
+                                   if k not in _data])
 
     def has_key(self, key):
-        return key in object.__getattribute__(self, '_data')
+        return key in self._data or key in NULL_FACTORIES
 
     def deepcopy(self, class_generator=lambda : Metadata(None)):
         ''' Do not use this method unless you know what you are doing, if you
@@ -196,24 +277,26 @@ class Metadata(object):
         if not isinstance(m, Metadata):
             return None
         object.__setattr__(m, '__dict__', copy.deepcopy(self.__dict__))
+        for name in ('_data', '_formatter', 'template_cache'):
+            object.__setattr__(m, name, copy.deepcopy(getattr(self, name)))
         return m
 
     def deepcopy_metadata(self):
         m = Metadata(None)
-        object.__setattr__(m, '_data', copy.deepcopy(object.__getattribute__(self, '_data')))
+        object.__setattr__(m, '_data', copy.deepcopy(self._data))
         return m
 
     def get(self, field, default=None):
         try:
-            return self.__getattribute__(field)
+            return getattr(self, field)
         except AttributeError:
             return default
 
     def get_extra(self, field, default=None):
-        _data = object.__getattribute__(self, '_data')
-        if field in _data['user_metadata']:
+        user_metadata = self._data.get('user_metadata') or {}
+        if field in user_metadata:
             try:
-                return _data['user_metadata'][field]['#extra#']
+                return user_metadata[field]['#extra#']
             except:
                 return default
         raise AttributeError(
@@ -229,11 +312,7 @@ class Metadata(object):
         needed is large. Also, we don't want any manipulations of the returned
         dict to show up in the book.
         '''
-        ans = object.__getattribute__(self,
-            '_data')['identifiers']
-        if not ans:
-            ans = {}
-        return copy.deepcopy(ans)
+        return dict(self._data.get('identifiers') or {})
 
     def _clean_identifier(self, typ, val):
         if typ:
@@ -248,24 +327,21 @@ class Metadata(object):
         this method will delete it.
         '''
         cleaned = {ck(k):cv(v) for k, v in identifiers.items() if k and v}
-        object.__getattribute__(self, '_data')['identifiers'] = cleaned
+        self._data['identifiers'] = cleaned
 
     def set_identifier(self, typ, val):
         'If val is empty, deletes identifier of type typ'
         typ, val = self._clean_identifier(typ, val)
         if not typ:
             return
-        identifiers = object.__getattribute__(self,
-            '_data')['identifiers']
+        identifiers = _get_field(self._data, 'identifiers')
 
         identifiers.pop(typ, None)
         if val:
             identifiers[typ] = val
 
     def has_identifier(self, typ):
-        identifiers = object.__getattribute__(self,
-            '_data')['identifiers']
-        return typ in identifiers
+        return typ in (self._data.get('identifiers') or ())
 
     # field-oriented interface. Intended to be the same as in LibraryDatabase
 
@@ -279,14 +355,14 @@ class Metadata(object):
         '''
         return a list of the custom fields in this book
         '''
-        return iter(object.__getattribute__(self, '_data')['user_metadata'])
+        return iter(self._data.get('user_metadata') or ())
 
     def all_field_keys(self):
         '''
         All field keys known by this instance, even if their value is None
         '''
-        _data = object.__getattribute__(self, '_data')
-        return frozenset(ALL_METADATA_FIELDS.union(frozenset(_data['user_metadata'])))
+        return frozenset(ALL_METADATA_FIELDS.union(frozenset(
+            self._data.get('user_metadata') or ())))
 
     def metadata_for_field(self, key):
         '''
@@ -301,23 +377,25 @@ class Metadata(object):
         Return a dictionary containing all non-None metadata fields, including
         the custom ones.
         '''
-        result = {}
-        _data = object.__getattribute__(self, '_data')
-        for attr in STANDARD_METADATA_FIELDS:
-            v = _data.get(attr, None)
-            if v is not None:
-                result[attr] = v
-        # separate these because it uses the self.get(), not _data.get()
+        _data = self._data
+        result = {attr: v for attr, v in _data.items()
+                  if v is not None and attr in STANDARD_METADATA_FIELDS}
+        for attr, factory in NULL_FACTORIES.items():
+            if attr not in _data and attr in STANDARD_METADATA_FIELDS:
+                result[attr] = factory()
+        # top level identifiers are kept in identifiers
+        identifiers = _data.get('identifiers') or {}
         for attr in TOP_LEVEL_IDENTIFIERS:
-            v = self.get(attr, None)
+            v = identifiers.get(attr, None)
             if v is not None:
                 result[attr] = v
-        for attr in _data['user_metadata']:
+        user_metadata = _data.get('user_metadata') or {}
+        for attr in user_metadata:
             v = self.get(attr, None)
             if v is not None:
                 result[attr] = v
-                if _data['user_metadata'][attr]['datatype'] == 'series':
-                    result[attr+'_index'] = _data['user_metadata'][attr]['#extra#']
+                if user_metadata[attr]['datatype'] == 'series':
+                    result[attr+'_index'] = user_metadata[attr]['#extra#']
         return result
 
     # End of field-oriented interface
@@ -355,8 +433,7 @@ class Metadata(object):
         return a dict containing all the custom field metadata associated with
         the book.
         '''
-        _data = object.__getattribute__(self, '_data')
-        user_metadata = _data['user_metadata']
+        user_metadata = _get_field(self._data, 'user_metadata')
         if not make_copy:
             return user_metadata
         res = {}
@@ -370,8 +447,7 @@ class Metadata(object):
         None. field is the key name, not the label. Return a copy if requested,
         just in case the user wants to change values in the dict.
         '''
-        _data = object.__getattribute__(self, '_data')
-        _data = _data['user_metadata']
+        _data = self._data.get('user_metadata') or {}
         if field in _data:
             if make_copy:
                 return copy.deepcopy(_data[field])
@@ -396,8 +472,7 @@ class Metadata(object):
                 else:
                     m['#value#'] = None
             um[key] = m
-        _data = object.__getattribute__(self, '_data')
-        _data['user_metadata'] = um
+        self._data['user_metadata'] = um
 
     def set_user_metadata(self, field, metadata):
         '''
@@ -421,8 +496,7 @@ class Metadata(object):
                     m['#value#'] = []
                 else:
                     m['#value#'] = None
-            _data = object.__getattribute__(self, '_data')
-            _data['user_metadata'][field] = m
+            _get_field(self._data, 'user_metadata')[field] = m
 
     def template_to_attribute(self, other, ops):
         '''
@@ -464,10 +538,18 @@ class Metadata(object):
         Merge the information in `other` into self. In case of conflicts, the information
         in `other` takes precedence, unless the information in `other` is NULL.
         '''
-        def copy_not_none(dest, src, attr):
-            v = getattr(src, attr, None)
-            if v not in (None, NULL_VALUES.get(attr, None)):
-                setattr(dest, attr, copy.deepcopy(v))
+        if isinstance(other, Metadata):
+            # Fields missing from _data have null values, which are not
+            # copied anyway, so don't create them
+            def copy_not_none(dest, src, attr):
+                v = src._data.get(attr, None)
+                if v not in (None, NULL_VALUES.get(attr, None)):
+                    setattr(dest, attr, copy.deepcopy(v))
+        else:
+            def copy_not_none(dest, src, attr):
+                v = getattr(src, attr, None)
+                if v not in (None, NULL_VALUES.get(attr, None)):
+                    setattr(dest, attr, copy.deepcopy(v))
 
         unknown = 'Unknown'
         if other.title and other.title != unknown:
@@ -797,6 +879,18 @@ class Metadata(object):
     # }}}
 
 
+# Standard fields are descriptors, so that getting and setting them doesn't go
+# through __getattr__ and __setattr__
+for _field in SIMPLE_SET:
+    setattr(Metadata, _field, _SimpleField(_field))
+Metadata.identifiers = _IdentifiersField('identifiers')
+for _field in TOP_LEVEL_IDENTIFIERS:
+    setattr(Metadata, _field, _TopLevelIdentifierField(_field))
+Metadata.language = _LanguageField('language')
+del _field
+FIELD_DESCRIPTORS = SIMPLE_GET | TOP_LEVEL_IDENTIFIERS | {'language'}
+
+
 def field_from_string(field, raw, field_metadata):
     ''' Parse the string raw to return an object that is suitable for calling
     set() on a Metadata object. '''
@@ -829,3 +923,49 @@ def field_from_string(field, raw, field_metadata):
     if val is object:
         val = raw
     return val
+
+
+def benchmark(count=20000, repeat=3):
+    """
+    Measure throughput of constructing Metadata objects, merging them with
+    smart_update() and serializing them to JSON, as done when reading
+    metadata of many books.
+    """
+    import json
+    import time
+    from ebook_converter.utils.config_base import to_json
+    from ebook_converter.utils.date import utcnow
+
+    source = Metadata('A Title', ['First Author', 'Second Author'])
+    source.tags = ['Fiction', 'Science']
+    source.series, source.series_index = 'Series', 2.0
+    source.publisher = 'Publisher'
+    source.pubdate = utcnow()
+    source.comments = '<p>Comments</p>'
+    source.languages = ['eng']
+    source.set_identifiers({'isbn': '9780306406157', 'uuid': 'abcd'})
+
+    def construct():
+        for i in range(count):
+            Metadata('Title %d' % i, ['Author'])
+
+    def update():
+        for i in range(count):
+            Metadata('Title %d' % i).smart_update(source)
+
+    def serialize():
+        for i in range(count):
+            json.dumps(source.all_non_none_fields(), default=to_json)
+
+    for func in (construct, update, serialize):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print('%-10s %10.0f objects/s' % (func.__name__, count / best))
+
+
+if __name__ == '__main__':
+    benchmark()
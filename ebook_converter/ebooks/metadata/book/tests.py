@@ -0,0 +1,506 @@
+"""
+Tests of the Metadata class and of the templates formatting its fields.
+"""
+import copy
+import datetime
+import pickle
+import string
+import unittest
+
+from ebook_converter.ebooks.metadata.book.base import Metadata
+from ebook_converter.ebooks.metadata.book.base import NULL_FACTORIES
+from ebook_converter.ebooks.metadata.book.base import NULL_VALUES
+from ebook_converter.ebooks.metadata.book.formatter import SafeFormat
+from ebook_converter.utils import formatter
+from ebook_converter.utils import formatter_functions
+
+
+def column(datatype, is_multiple=False, **kw):
+    """
+    Return metadata of a custom column of the datatype.
+    """
+    ans = {'datatype': datatype, 'name': datatype.title(), 'label': datatype,
+           'display': {}, 'is_custom': True, 'kind': 'field',
+           'is_multiple': {}}
+    if is_multiple:
+        ans['is_multiple'] = {'cache_to_list': '|', 'ui_to_list': ',',
+                              'list_to_ui': ', '}
+    ans.update(kw)
+    return ans
+
+
+def make_metadata():
+    mi = Metadata('A Title', ['An Author', 'Another Author'])
+    mi.tags = ['Fantasy', 'Old']
+    mi.comments = 'Short'
+    mi.publisher = 'Publisher'
+    mi.series = 'Saga'
+    mi.series_index = 2.0
+    mi.languages = ['eng']
+    mi.author_sort_map = {'An Author': 'Author, An'}
+    mi.set_identifier('isbn', '9780000000001')
+    mi.set_user_metadata('#genre', column('text', True))
+    mi.set_user_metadata('#volume', column('series'))
+    mi.set_user_metadata('#summary', column(
+        'composite', display={'composite_template': '{title} by {authors}'}))
+    mi.set('#genre', ['Epic', 'Quest'])
+    mi.set('#volume', 'Cycle', extra=3.0)
+    mi.custom_attribute = {'a': [1, 2]}
+    return mi
+
+
+class TestMetadata(unittest.TestCase):
+
+    def assert_same(self, mi, other):
+        self.assertEqual(mi.all_non_none_fields(), other.all_non_none_fields())
+        self.assertEqual(mi.get_all_user_metadata(False),
+                         other.get_all_user_metadata(False))
+        self.assertEqual(mi.custom_attribute, other.custom_attribute)
+        self.assertEqual(other.get('#summary'), 'A Title by An Author & '
+                         'Another Author')
+
+    def test_defaults(self):
+        mi = Metadata(None)
+        self.assertEqual(mi.title, 'Unknown')
+        self.assertEqual(mi.authors, ['Unknown'])
+        self.assertEqual(mi.author_sort, 'Unknown')
+        self.assertEqual(mi.tags, [])
+        self.assertEqual(mi.identifiers, {})
+        self.assertEqual(mi.get_identifiers(), {})
+        self.assertEqual(mi.languages, [])
+        self.assertEqual(mi.language, 'und')
+        self.assertEqual(mi.cover_data, (None, None))
+        self.assertEqual(mi.author_sort_map, {})
+        self.assertEqual(mi.get_all_user_metadata(False), {})
+        self.assertIsNone(mi.isbn)
+        self.assertIsNone(mi.series)
+        self.assertIsNone(mi.publisher)
+        self.assertIsNone(mi.get('#missing'))
+        self.assertRaises(AttributeError, getattr, mi, '#missing')
+        for field in ('title', 'authors', 'tags', 'identifiers', 'language',
+                      'series', 'cover_data'):
+            self.assertTrue(mi.is_null(field), field)
+        for field in NULL_FACTORIES:
+            self.assertTrue(mi.has_key(field), field)
+            self.assertIn(field, set(mi))
+        self.assertEqual(Metadata('Title', []).authors, ['Unknown'])
+
+        mi.tags = ['tag']
+        mi.language = 'fra'
+        self.assertEqual(mi.languages, ['fra'])
+        self.assertFalse(mi.is_null('tags'))
+        mi.tags = None
+        self.assertEqual(mi.tags, [])
+        mi.set_null('language')
+        self.assertEqual(mi.language, 'und')
+        self.assertEqual(mi.languages, [])
+
+    def test_independence(self):
+        first, second = Metadata(None), Metadata(None)
+        first.tags.append('tag')
+        first.identifiers['isbn'] = '1'
+        first.languages.append('eng')
+        first.author_sort_map['a'] = 'b'
+        first.author_link_map['a'] = 'c'
+        first.user_categories['cat'] = []
+        first.device_collections.append('col')
+        first.set_user_metadata('#genre', column('text', True))
+        first.get('#genre').append('Epic')
+        first.authors.append('Author')
+
+        self.assertEqual(first.isbn, '1')
+        self.assertEqual(first.language, 'eng')
+        self.assertEqual(first.get('#genre'), ['Epic'])
+        for mi in (second, Metadata(None)):
+            self.assertEqual(mi.tags, [])
+            self.assertEqual(mi.identifiers, {})
+            self.assertIsNone(mi.isbn)
+            self.assertEqual(mi.languages, [])
+            self.assertEqual(mi.author_sort_map, {})
+            self.assertEqual(mi.author_link_map, {})
+            self.assertEqual(mi.user_categories, {})
+            self.assertEqual(mi.device_collections, [])
+            self.assertEqual(mi.get_all_user_metadata(False), {})
+            self.assertEqual(mi.authors, ['Unknown'])
+        self.assertEqual(NULL_VALUES['tags'], [])
+        self.assertEqual(NULL_VALUES['identifiers'], {})
+        self.assertEqual(NULL_VALUES['authors'], ['Unknown'])
+
+        # The values of the fields set to their null values are not shared
+        # either
+        first.set_null('tags')
+        second.set_null('tags')
+        first.tags.append('tag')
+        self.assertEqual(second.tags, [])
+
+        # Nor are the column metadata passed to set_user_metadata()
+        meta = column('text', True)
+        first.set_user_metadata('#other', meta)
+        second.set_user_metadata('#other', meta)
+        first.set('#other', ['x'])
+        self.assertEqual(second.get('#other'), [])
+
+    def test_copies(self):
+        mi = make_metadata()
+        copies = (copy.deepcopy(mi), pickle.loads(pickle.dumps(mi)),
+                  pickle.loads(pickle.dumps(mi, pickle.HIGHEST_PROTOCOL)),
+                  mi.deepcopy())
+        for other in copies:
+            self.assertIsNot(other, mi)
+            self.assert_same(mi, other)
+            self.assertEqual(other.get_extra('#volume'), 3.0)
+            other.tags.append('New')
+            other.get('#genre').append('New')
+            other.set_identifier('uri', 'u:1')
+            other.custom_attribute['a'].append(3)
+        self.assertEqual(mi.tags, ['Fantasy', 'Old'])
+        self.assertEqual(mi.get('#genre'), ['Epic', 'Quest'])
+        self.assertEqual(mi.get_identifiers(), {'isbn': '9780000000001'})
+        self.assertEqual(mi.custom_attribute, {'a': [1, 2]})
+
+        other = mi.deepcopy_metadata()
+        self.assertEqual(other.all_non_none_fields(),
+                         mi.all_non_none_fields())
+        other.tags.append('New')
+        self.assertEqual(mi.tags, ['Fantasy', 'Old'])
+
+        # Objects with the fields never accessed
+        for other in (copy.deepcopy(Metadata(None)),
+                      pickle.loads(pickle.dumps(Metadata(None)))):
+            self.assertEqual(other.tags, [])
+            self.assertEqual(other.title, 'Unknown')
+            self.assertEqual(other.get_all_user_metadata(False), {})
+
+    def test_smart_update(self):
+        mi = make_metadata()
+        other = Metadata('Other Title', ['Other Author'])
+        other.tags = ['fantasy', 'New']
+        other.comments = 'A much longer comment'
+        other.publisher = None
+        other.set_identifiers({'isbn': '9780000000002', 'uri': 'u:1'})
+        other.set_user_metadata('#genre', column('text', True))
+        other.set('#genre', ['quest', 'Horror'])
+        mi.smart_update(other)
+        self.assertEqual(mi.title, 'Other Title')
+        self.assertEqual(mi.authors, ['Other Author'])
+        # Case-insensitive but case preserving merging
+        self.assertEqual(mi.tags, ['fantasy', 'Old', 'New'])
+        self.assertEqual(mi.get('#genre'), ['Epic', 'quest', 'Horror'])
+        self.assertEqual(mi.comments, 'A much longer comment')
+        self.assertEqual(mi.publisher, 'Publisher')
+        self.assertEqual(mi.series, 'Saga')
+        self.assertEqual(mi.get_identifiers(), {'isbn': '9780000000002',
+                                                'uri': 'u:1'})
+        self.assertEqual(mi.get('#volume'), 'Cycle')
+        self.assertEqual(mi.languages, [])
+        # Nothing of other is shared
+        other.tags.append('Other')
+        other.get('#genre').append('Other')
+        self.assertNotIn('Other', mi.tags)
+        self.assertNotIn('Other', mi.get('#genre'))
+
+        # Null values of other are not copied
+        mi = make_metadata()
+        mi.smart_update(Metadata(None))
+        self.assertEqual(mi.title, 'A Title')
+        self.assertEqual(mi.authors, ['An Author', 'Another Author'])
+        self.assertEqual(mi.tags, ['Fantasy', 'Old'])
+        self.assertEqual(mi.series_index, 2.0)
+
+        mi = Metadata(None)
+        mi.smart_update(make_metadata(), replace_metadata=True)
+        self.assertEqual(mi.title, 'A Title')
+        self.assertEqual(mi.tags, ['Fantasy', 'Old'])
+        self.assertEqual(mi.publisher, 'Publisher')
+        self.assertEqual(mi.isbn, '9780000000001')
+        self.assertEqual(mi.get('#genre'), ['Epic', 'Quest'])
+        self.assertEqual(mi.get_extra('#volume'), 3.0)
+
+        # Objects, which are not Metadata
+        class Book(object):
+            title = 'Plain'
+            authors = ['Plain Author']
+            tags = ['tag']
+            publisher = 'Plain Publisher'
+            isbn = '42'
+            comments = None
+        mi = Metadata(None)
+        mi.smart_update(Book())
+        self.assertEqual(mi.title, 'Plain')
+        self.assertEqual(mi.authors, ['Plain Author'])
+        self.assertEqual(mi.tags, ['tag'])
+        self.assertEqual(mi.publisher, 'Plain Publisher')
+        self.assertEqual(mi.isbn, '42')
+
+        # Constructing from other object is a smart update
+        mi = Metadata(None, other=make_metadata())
+        self.assertEqual(mi.tags, ['Fantasy', 'Old'])
+        self.assertEqual(mi.get('#genre'), ['Epic', 'Quest'])
+
+    def test_user_metadata(self):
+        mi = make_metadata()
+        self.assertEqual(sorted(mi.custom_field_keys()),
+                         ['#genre', '#summary', '#volume'])
+        meta = mi.get_user_metadata('#genre', make_copy=False)
+        self.assertEqual(meta['#value#'], ['Epic', 'Quest'])
+        self.assertIs(meta, mi.get_user_metadata('#genre', make_copy=False))
+        meta = mi.get_user_metadata('#genre', make_copy=True)
+        meta['#value#'].append('Copy')
+        self.assertEqual(mi.get('#genre'), ['Epic', 'Quest'])
+        self.assertIsNone(mi.get_user_metadata('#missing', make_copy=True))
+        self.assertIsNone(mi.get_user_metadata('title', make_copy=False))
+
+        self.assertEqual(mi.get('#volume'), 'Cycle')
+        self.assertEqual(mi.get_extra('#volume'), 3.0)
+        self.assertEqual(mi.get('#volume_index'), 3.0)
+        self.assertEqual(mi.all_non_none_fields()['#volume_index'], 3.0)
+        self.assertEqual(mi.get('#summary'),
+                         'A Title by An Author & Another Author')
+        self.assertRaises(AttributeError, mi.set_user_metadata, 'genre',
+                          column('text'))
+        self.assertEqual(mi.metadata_for_field('#genre')['datatype'], 'text')
+        self.assertEqual(mi.metadata_for_field('title')['datatype'], 'text')
+        self.assertIn('#genre', mi.all_field_keys())
+
+        mi.set_all_user_metadata({'#new': column('int')})
+        self.assertEqual(list(mi.custom_field_keys()), ['#new'])
+        self.assertIsNone(mi.get('#new'))
+        mi.set('#new', 5)
+        self.assertEqual(mi.get('#new'), 5)
+        self.assertFalse(hasattr(mi, '#genre'))
+
+
+def make_book():
+    mi = make_metadata()
+    mi.rating = 8
+    mi.pubdate = datetime.datetime(2007, 3, 27, 12,
+                                   tzinfo=datetime.timezone.utc)
+    mi.set_user_metadata('#count', column('int'))
+    mi.set_user_metadata('#score', column('float'))
+    mi.set_user_metadata('#empty', column('text'))
+    mi.set('#count', 42)
+    mi.set('#score', 3.5)
+    return mi
+
+
+def builtin_functions():
+    """
+    Return dictionary of the builtin template functions, keyed by their
+    names. The functions register themselves when instantiated, which is
+    avoided here to leave the registered functions alone.
+    """
+    ans = {}
+    base = formatter_functions.BuiltinFormatterFunction
+    for cls in vars(formatter_functions).values():
+        if isinstance(cls, type) and issubclass(cls, base) and cls is not base:
+            func = cls.__new__(cls)
+            for name in [func.name] + list(func.aliases):
+                ans[name] = func
+    return ans
+
+
+# Templates and their results, as given by the formatter which parsed the
+# templates and programs again every time they were evaluated
+TEMPLATES = [
+    ('{title}', 'A Title'),
+    ('{authors}', 'An Author & Another Author'),
+    ('{series}', 'Saga'),
+    ('{series_index}', '2'),
+    ('{series_index:05.2f}', '02.00'),
+    ('{series_index:d}', '2'),
+    ('{rating}', '4'),
+    ('{publisher}', 'Publisher'),
+    ('{isbn}', '9780000000001'),
+    ('{#genre}', 'Epic, Quest'),
+    ('{#volume}', 'Cycle'),
+    ('{#summary}', 'A Title by An Author & Another Author'),
+    ('{#count}', '42'),
+    ('{#count:04d}', '0042'),
+    ('{#score:.2f}', '3.50'),
+    ('{#empty}', ''),
+    ('{#empty:|[|]}', ''),
+    ('{series:|[|] }{title}', '[Saga] A Title'),
+    ('{series}{series_index:| #|}', 'Saga #2'),
+    ('{title} - {authors}', 'A Title - An Author & Another Author'),
+    ('{title:>30}', 'A Title'),
+    ('{title:s}', 'A Title'),
+    ('{title:|prefix |}', 'prefix A Title'),
+    ('{#genre:|<|>} and {#empty:|(|)}', '<Epic, Quest> and'),
+    ('{nosuchfield}', 'ERROR Value: unknown field nosuchfield'),
+    ('literal text only', 'literal text only'),
+    ('{{escaped}} {title}', '{escaped} A Title'),
+    ('{title!r}', "'A Title'"),
+    ('{0}', ''),
+    ('{}', ''),
+    ('{title:{series}}',
+     "ERROR Invalid format specifier 'Saga' for object of type 'str'"),
+    ('{title:uppercase()}', 'A TITLE'),
+    ('{title:lowercase()}', 'a title'),
+    ('{title:titlecase()}', 'A Title'),
+    ('{#genre:capitalize()}', 'Epic, Quest'),
+    ('{title:shorten(2,...,2)}', 'A Title'),
+    ('{title:re(A,The)}', 'The Title'),
+    ('{title:re(^A (.*)$,\\1\\, A)}', 'Title, A'),
+    ('{#genre:sublist(0,1,\\,)}', 'Epic'),
+    ('{#genre:sublist(-1,0,\\,)}', 'Quest'),
+    ('{#genre:count(\\,)}', '1'),
+    ('{#genre:contains(Quest,yes,no)}', 'yes'),
+    ('{#genre:in_list(\\,,^quest$,found,missing)}', 'found'),
+    ('{series:ifempty(No series)}', 'Saga'),
+    ('{#empty:ifempty(Nothing)}', 'Nothing'),
+    ('{title:test(set,unset)}', 'set'),
+    ('{#empty:test(set,unset)}', 'unset'),
+    ('{title:lookup(.,publisher,series)}', 'Publisher'),
+    ('{authors:list_item(1,&)}', 'Another Author'),
+    ('{title:strlen()}', '7'),
+    ('{series:uppercase()|[|]}', '[SAGA]'),
+    ('{title:nosuchfunction()}', 'nosuchfunction: unknown function'),
+    ('{title:test(set)}',
+     'ERROR Incorrect number of arguments for function test'),
+    ("{title:'uppercase($)'}", 'A TITLE'),
+    ('{title:\'strcat($, " (", field("publisher"), ")")\'}',
+     'A Title (Publisher)'),
+    ("{:'add(1, 2)'}", '3.0'),
+    ('{:\'strcat(field("series"), " ", field("series_index"))\'}', 'Saga 2'),
+    ('{series_index:0>3s:\'format_number($, "{0:.1f}")\'}', '2.0'),
+    ('{title:\'test($, "yes", "no")\'|<|>}', '<yes>'),
+    ("{title:'nosuchfunction($)'}",
+     'ERROR Formatter: unknown function nosuchfunction near  nosuchfunction'),
+    ('program: field("title")', 'A Title'),
+    ('program: uppercase(field("title"))', 'A TITLE'),
+    ('program: x = "abc"; strcat(x, x)', 'abcabc'),
+    ('program: add(1, 2.5)', '3.5'),
+    ('program: subtract(multiply(3, 4), divide(10, 4))', '9.5'),
+    ('program: cmp(field("#count"), 40, "lt", "eq", "gt")', 'gt'),
+    ('program: first_matching_cmp(10, 5, "small", 15, "medium", "large")',
+     'medium'),
+    ('program: test(field("series"), "has series", "no series")',
+     'has series'),
+    ('program: contains(field("#genre"), "Epic", "epic", "not epic")', 'epic'),
+    ('program: switch(field("title"), "^A ", "article", "Title", "title", '
+     '"none")',
+     'article'),
+    ('program: list_item(field("#genre"), 1, ",")', 'Quest'),
+    ('program: count(field("#genre"), ",")', '2'),
+    ('program: sublist(field("#genre"), 1, 0, ",")', 'Quest'),
+    ('program: re(field("title"), "(\\w+)$", "[\\1]")', 'A [Title]'),
+    ('program: shorten(field("title"), 1, "-", 2)', 'A-le'),
+    ('program: ifempty(field("#empty"), "was empty")', 'was empty'),
+    ('program: and(field("title"), field("series"))', '1'),
+    ('program: or(field("#empty"), "")', ''),
+    ('program: not(field("#empty"))', '1'),
+    ('program: first_non_empty(field("#empty"), field("series"))', 'Saga'),
+    ('program: strcat_max(8, "a", "abc", "b", "defghijklmnopq")',
+     'ERROR strcat_max requires an even number of arguments'),
+    ('program: strcat_max(8, "a", "abc", "b")', 'aabcb'),
+    ('program: raw_field("series_index")', '2.0'),
+    ('program: field("series_index")', '2'),
+    ('program: raw_list("authors", " / ")', 'An Author / Another Author'),
+    ('program: format_number(field("#score"), "{0:5.2f}")', '3.50'),
+    ('program: in_list(field("#genre"), ",", "^epi", "found", "missing")',
+     'found'),
+    ('program: swap_around_comma("Doe, John")', 'John Doe'),
+    ('program: assign(y, "val"); strcat(y, "-", y)', 'val-val'),
+    ('program: substr(field("title"), 2, 0)', 'Title'),
+    ('program: template("{title} by {authors}")',
+     'A Title by An Author & Another Author'),
+    ('program: eval("{series}")', 'No such variable series'),
+    ('program: titlecase("hello world of templates")',
+     'Hello World of Templates'),
+    ('program: series_sort()', 'Saga'),
+    ('program: format_date(field("pubdate"), "yyyy")', '2007'),
+    ('program: lookup(field("#empty"), "", "title", "series")', 'A Title'),
+    ('program:\n# a comment\n  uppercase("x")', 'X'),
+    ('program: 42', '42'),
+    ("program: 'single quoted'", 'single quoted'),
+    ('program: "with \\"escaped\\" quotes"', 'with \\"escaped\\" quotes'),
+    ('program: nosuchfunction(1)',
+     'ERROR Formatter: unknown function nosuchfunction near  nosuchfunction'),
+    ('program: add(1,',
+     'ERROR Formatter: expression is not function or constant near  ,'),
+    ('program: strcat("a" "b")',
+     'ERROR Formatter: missing closing parenthesis near  b'),
+    ('program: field("title"',
+     'ERROR Formatter: missing closing parenthesis near  title'),
+    ('program: add(1, 2, 3)',
+     'ERROR Formatter: incorrect number of arguments for function add '
+     'near  )'),
+    ('program: x = ',
+     'ERROR Formatter: expression is not function or constant near  ='),
+]
+
+
+class InterpretedFormatter(SafeFormat):
+    # Parse the templates by string.Formatter on every call
+    vformat = string.Formatter.vformat
+
+
+class TestTemplates(unittest.TestCase):
+
+    def setUp(self):
+        self.book = make_book()
+        self.funcs = builtin_functions()
+
+    def format(self, template, fmt=None, **kw):
+        fmt = fmt or SafeFormat()
+        return fmt.safe_format(template, self.book, 'ERROR', self.book,
+                               template_functions=self.funcs, **kw)
+
+    def test_templates(self):
+        self.assertGreater(len(TEMPLATES), 100)
+        for func in (formatter.compile_program, formatter._parse_template,
+                     formatter._parse_field_format,
+                     formatter._scan_function_args):
+            func.cache_clear()
+        for template, expected in TEMPLATES:
+            self.assertEqual(self.format(template), expected, template)
+        # Again with everything cached, by a single formatter
+        fmt = SafeFormat()
+        for template, expected in reversed(TEMPLATES):
+            self.assertEqual(self.format(template, fmt), expected, template)
+        self.assertGreater(formatter.compile_program.cache_info().hits, 0)
+        self.assertGreater(formatter._parse_template.cache_info().hits, 0)
+
+    def test_vformat(self):
+        fmt = InterpretedFormatter()
+        for template, expected in TEMPLATES:
+            if not template.startswith('program:'):
+                self.assertEqual(self.format(template, fmt), expected,
+                                 template)
+
+    def test_template_cache(self):
+        # Programs of the columns are kept in the template cache, keyed by
+        # the names of the columns
+        cache = {}
+        for i, (template, expected) in enumerate(TEMPLATES):
+            if not template.startswith('program:'):
+                continue
+            column = '#column%d' % i
+            for _ in range(2):
+                self.assertEqual(self.format(template, column_name=column,
+                                             template_cache=cache),
+                                 expected, template)
+            try:
+                program = formatter.compile_program(template[8:])
+            except ValueError:
+                # Programs, which failed to compile, are not kept
+                self.assertNotIn(column, cache)
+            else:
+                self.assertIs(cache[column], program)
+        self.assertGreater(len(cache), 30)
+
+        # Without the column name, the cache is not used
+        cache = {}
+        self.assertEqual(self.format('program: 42', template_cache=cache),
+                         '42')
+        self.assertEqual(cache, {})
+
+
+def find_tests():
+    loader = unittest.defaultTestLoader
+    return unittest.TestSuite([loader.loadTestsFromTestCase(TestMetadata),
+                               loader.loadTestsFromTestCase(TestTemplates)])
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(find_tests())
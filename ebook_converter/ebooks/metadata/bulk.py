@@ -0,0 +1,306 @@
+"""
+Bulk metadata extraction.
+
+Reads title, authors, identifiers and (optionally) cover of many books on a
+pool of worker processes. For the common formats only the part of the file
+holding the metadata is read: the OPF (found through the zip central
+directory) for EPUB, record 0 with the EXTH header for MOBI, the header for
+PDB and LRF, and the <description> for FB2. Other formats are handled by
+their metadata reader plugins.
+
+For every book a single JSON line is written::
+
+    {"path": "book.epub", "format": "epub", "status": "ok",
+     "title": "...", "authors": ["..."], "identifiers": {"isbn": "..."},
+     "cover": "covers/0123456789abcdef.jpeg", "worker": 1234,
+     "timings": {"total": 0.004}}
+
+"cover" is only set when covers are written into a directory. In case of
+failure, status is set to "error" and "error" key is added.
+"""
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import posixpath
+import re
+import sys
+import time
+import traceback
+
+from ebook_converter import logging
+
+
+LOG = logging.default_log
+
+# Size of chunks in which FB2 files are searched for the end of description
+FB2_CHUNK_SIZE = 64 * 1024
+# Number of books sent to a worker at once
+CHUNK_SIZE = 16
+
+FORMAT_ALIASES = {'azw': 'mobi', 'azw3': 'mobi', 'prc': 'mobi',
+                  'pobi': 'mobi', 'updb': 'pdb', 'fbz': 'fb2'}
+
+
+def _epub_metadata(stream, cover):
+    from lxml import etree
+    from ebook_converter.ebooks.metadata.opf3 import read_metadata
+    from ebook_converter.ebooks.metadata.utils import parse_opf
+    from ebook_converter.utils.zipfile import ZipFile
+
+    zf = ZipFile(stream)
+    container = etree.fromstring(zf.read('META-INF/container.xml'))
+    opf_name = None
+    for rootfile in container.xpath('//*[local-name()="rootfile"]'):
+        if (rootfile.get('media-type') ==
+                'application/oebps-package+xml' and rootfile.get('full-path')):
+            opf_name = rootfile.get('full-path')
+            break
+    if opf_name is None:
+        raise ValueError('No OPF file found in the container')
+    root = parse_opf(io.BytesIO(zf.read(opf_name)))
+    mi, ver, raster_cover, first_spine_item = read_metadata(
+        root, return_extra_data=True)
+    if cover and raster_cover:
+        from urllib.parse import unquote
+        name = posixpath.normpath(posixpath.join(
+            posixpath.dirname(opf_name), unquote(raster_cover)))
+        try:
+            data = zf.read(name)
+        except KeyError:
+            pass
+        else:
+            ext = posixpath.splitext(name)[1][1:].lower() or 'jpeg'
+            mi.cover_data = (ext, data)
+    return mi
+
+
+def _mobi_metadata(stream, cover):
+    from ebook_converter.ebooks.metadata import MetaInformation
+    from ebook_converter.ebooks.mobi.reader.headers import MetadataHeader
+    from ebook_converter.utils.imghdr import what
+
+    mh = MetadataHeader(stream, LOG)
+    if mh.exth is None or mh.exth.mi is None:
+        title = getattr(mh, 'title', None) or 'Unknown'
+        return MetaInformation(title, ['Unknown'])
+    mi = mh.exth.mi
+    if cover:
+        offset = getattr(mh.exth, 'cover_offset', None)
+        if offset is None:
+            offset = getattr(mh.exth, 'thumbnail_offset', None)
+        if offset is not None and mh.first_image_index != 0xffffffff:
+            data = mh.section_data(mh.first_image_index + offset)
+            fmt = what(None, data)
+            if fmt is not None:
+                mi.cover_data = (fmt, data)
+    return mi
+
+
+def _pdb_metadata(stream, cover):
+    from ebook_converter.ebooks.metadata import MetaInformation
+    from ebook_converter.ebooks.pdb.header import PdbHeaderReader
+
+    with PdbHeaderReader(stream) as header:
+        title = header.title.decode('cp1252', 'replace').strip() or 'Unknown'
+    return MetaInformation(title, ['Unknown'])
+
+
+def _lrf_metadata(stream, cover):
+    from ebook_converter.ebooks.metadata import MetaInformation
+    from ebook_converter.ebooks.metadata import string_to_authors
+    from ebook_converter.ebooks.lrf.meta import LRFMetaFile
+
+    lrf = LRFMetaFile(stream)
+    mi = MetaInformation(lrf.title.strip() or 'Unknown',
+                         string_to_authors(lrf.author) or ['Unknown'])
+    book_id = lrf.book_id.strip()
+    if book_id:
+        mi.set_identifier('lrf', book_id)
+    if cover:
+        mi.cover_data = lrf.get_cover()
+    return mi
+
+
+def _fb2_stream(stream):
+    from ebook_converter.utils.zipfile import ZipFile, BadZipfile
+    pos = stream.tell()
+    try:
+        zf = ZipFile(stream)
+    except BadZipfile:
+        stream.seek(pos)
+        return stream
+    names = zf.namelist()
+    names = [x for x in names if x.lower().endswith('.fb2')] or names
+    return zf.open(names[0])
+
+
+def _fb2_metadata(stream, cover):
+    from ebook_converter.ebooks.metadata import fb2
+
+    name = getattr(stream, 'name', 'Unknown')
+    src = _fb2_stream(stream)
+    end_pat = re.compile(br'</(?:[\w-]+:)?description\s*>')
+    raw = b''
+    while True:
+        chunk = src.read(FB2_CHUNK_SIZE)
+        raw += chunk
+        # Look for the end tag also in the tail of the previous chunk
+        match = end_pat.search(raw, max(0, len(raw) - len(chunk) - 64))
+        if match is not None or not chunk:
+            break
+    if match is None:
+        raise ValueError('No description found in the FB2 file')
+    start = re.search(br'<([\w-]+:)?FictionBook\b', raw)
+    if start is None:
+        raise ValueError('Not an FB2 file')
+    # Close the root element right after the description
+    head = raw[:match.end()] + b'</' + (start.group(1) or b'') + \
+        b'FictionBook>'
+    root = fb2._get_fbroot(head)
+    mi = fb2.metadata_from_root(root, name, cover=False)
+    if cover:
+        ctx = fb2.Context(root)
+        imgid = ctx.XPath('substring-after(string(//fb:coverpage/fb:image/'
+                          '@xlink:href), "#")')(root)
+        if imgid:
+            _fb2_cover(raw[match.end():] + src.read(), imgid, mi)
+    return mi
+
+
+def _fb2_cover(raw, imgid, mi):
+    from ebook_converter.ebooks.fb2 import base64_decode
+    from ebook_converter.utils.imghdr import identify
+
+    match = re.search(br'<(?:[\w-]+:)?binary\b[^>]*\bid=["\']%s["\'][^>]*>'
+                      br'([^<]*)<' % re.escape(imgid.encode('utf-8')), raw)
+    if match is not None:
+        data = base64_decode(match.group(1).strip())
+        fmt = identify(data)[0]
+        if fmt:
+            mi.cover_data = (fmt, data)
+
+
+FAST_READERS = {'epub': _epub_metadata,
+                'mobi': _mobi_metadata,
+                'pdb': _pdb_metadata,
+                'lrf': _lrf_metadata,
+                'fb2': _fb2_metadata}
+
+
+def book_format(path):
+    ext = os.path.splitext(path)[1][1:].lower()
+    return FORMAT_ALIASES.get(ext, ext)
+
+
+def book_extensions():
+    """
+    Return set of extensions of files, which metadata can be read from.
+    """
+    from ebook_converter.customize.ui import metadata_readers
+    exts = set(FAST_READERS) | set(FORMAT_ALIASES)
+    for plugin in metadata_readers():
+        exts |= set(plugin.file_types)
+    return exts
+
+
+def read_metadata(path, cover=False):
+    """
+    Return metadata of the book at path. Cover is read only if cover is True.
+    """
+    fmt = book_format(path)
+    with open(path, 'rb') as stream:
+        reader = FAST_READERS.get(fmt)
+        if reader is not None:
+            return reader(stream, cover)
+        from ebook_converter.customize.ui import get_file_type_metadata
+        return get_file_type_metadata(stream, os.path.splitext(path)[1][1:])
+
+
+def extract(path, cover_dir=None):
+    """
+    Read metadata of single book, return result dictionary. If cover_dir is
+    given, cover is written into it.
+    """
+    start = time.time()
+    result = {'path': path, 'format': book_format(path), 'status': 'ok',
+              'worker': os.getpid()}
+    try:
+        mi = read_metadata(path, cover=cover_dir is not None)
+        result['title'] = mi.title
+        result['authors'] = list(mi.authors or [])
+        result['identifiers'] = mi.get_identifiers()
+        cover_data = getattr(mi, 'cover_data', None)
+        if cover_dir is not None:
+            result['cover'] = None
+            if cover_data and cover_data[1]:
+                name = hashlib.sha1(os.path.abspath(path).encode(
+                    'utf-8', 'surrogateescape')).hexdigest()[:16]
+                cover_path = os.path.join(cover_dir, '%s.%s' % (
+                    name, cover_data[0] or 'jpeg'))
+                with open(cover_path, 'wb') as f:
+                    f.write(cover_data[1])
+                result['cover'] = cover_path
+    except Exception as exc:
+        result['status'] = 'error'
+        result['error'] = str(exc) or exc.__class__.__name__
+        LOG.debug(traceback.format_exc())
+    result['timings'] = {'total': time.time() - start}
+    return result
+
+
+def iter_paths(paths):
+    """
+    Yield paths of books from the list of files and directories, which are
+    searched recursively. '-' stands for the list of files read from stdin.
+    """
+    exts = None
+    for path in paths:
+        if path == '-':
+            for line in sys.stdin:
+                line = line.strip()
+                if line:
+                    yield line
+        elif os.path.isdir(path):
+            if exts is None:
+                exts = book_extensions()
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for name in sorted(filenames):
+                    if os.path.splitext(name)[1][1:].lower() in exts:
+                        yield os.path.join(dirpath, name)
+        else:
+            yield path
+
+
+def _extract_job(args):
+    return extract(*args)
+
+
+def _init_worker():
+    from ebook_converter.ebooks.conversion.batch import redirect_stdout
+    redirect_stdout()
+
+
+def run(paths, workers=None, cover_dir=None, outstream=None):
+    """
+    Extract metadata of all books from paths on pool of worker processes,
+    and write results as JSON lines, in order of completion, into binary
+    outstream (stdout by default). Return the number of failures.
+    """
+    outstream = outstream or sys.stdout.buffer
+    if cover_dir is not None:
+        os.makedirs(cover_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    jobs = ((path, cover_dir) for path in iter_paths(paths))
+    failed = 0
+    with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+        for result in pool.imap_unordered(_extract_job, jobs,
+                                          chunksize=CHUNK_SIZE):
+            if result['status'] != 'ok':
+                failed += 1
+            outstream.write((json.dumps(result, ensure_ascii=False) +
+                             '\n').encode('utf-8'))
+            outstream.flush()
+    return failed
@@ -102,6 +102,12 @@ def get_metadata(stream):
     ''' Return fb2 metadata as a L{MetaInformation} object '''
 
     root = _get_fbroot(get_fb2_data(stream)[0])
+    return metadata_from_root(root, getattr(stream, 'name', 'Unknown'))
+
+
+def metadata_from_root(root, name='Unknown', cover=True):
+    ''' Return metadata from the parsed fb2 document. Name of the file is used
+    as the title if the book has none. '''
     ctx = Context(root)
     book_title = _parse_book_title(root, ctx)
     authors = _parse_authors(root, ctx) or ['Unknown']
@@ -111,13 +117,14 @@ def get_metadata(stream):
         book_title = str(book_title)
     else:
         book_title = uenc.force_unicode(os.path.splitext(
-            os.path.basename(getattr(stream, 'name', 'Unknown')))[0])
+            os.path.basename(name))[0])
     mi = MetaInformation(book_title, authors)
 
-    try:
-        _parse_cover(root, mi, ctx)
-    except Exception:
-        pass
+    if cover:
+        try:
+            _parse_cover(root, mi, ctx)
+        except Exception:
+            pass
     try:
         _parse_comments(root, mi, ctx)
     except Exception:
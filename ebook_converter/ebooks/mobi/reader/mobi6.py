@@ -14,7 +14,7 @@ from ebook_converter.ebooks import DRMError, unit_convert
 from ebook_converter.ebooks.chardet import strip_encoding_declarations
 from ebook_converter.ebooks.mobi import MobiError
 from ebook_converter.ebooks.mobi.huffcdic import HuffReader
-from ebook_converter.ebooks.compression.palmdoc import decompress_doc
+from ebook_converter.ebooks.compression.palmdoc import decompress_docs
 from ebook_converter.ebooks.metadata import MetaInformation
 from ebook_converter.ebooks.metadata.opf2 import OPFCreator, OPF
 from ebook_converter.ebooks.metadata.toc import TOC
@@ -46,9 +46,12 @@ class MobiReader(object):
     IMAGE_ATTRS = ('lowrecindex', 'recindex', 'hirecindex')
 
     def __init__(self, filename_or_stream, log, user_encoding=None, debug=None,
-                 try_extra_data_fix=False):
+                 try_extra_data_fix=False, workers=1):
         self.log = log
         self.debug = debug
+        # Number of processes decompressing PalmDoc text, as in
+        # decompress_docs()
+        self.workers = workers
         self.embedded_mi = None
         self.warned_about_trailing_entry_corruption = False
         self.base_css_rules = textwrap.dedent('''
@@ -865,14 +868,19 @@ class MobiReader(object):
             unpack = huff.unpack
 
         elif self.book_header.compression_type == b'\x00\x02':
-            unpack = decompress_doc
+            # PalmDoc records are decompressed in one batch
+            unpack = None
 
         elif self.book_header.compression_type == b'\x00\x01':
             unpack = lambda x: x  # noqa
         else:
             raise MobiError('Unknown compression algorithm: %r' %
                             self.book_header.compression_type)
-        self.mobi_html = b''.join(map(unpack, text_sections))
+        if unpack is None:
+            self.mobi_html = b''.join(decompress_docs(text_sections,
+                                                      workers=self.workers))
+        else:
+            self.mobi_html = b''.join(map(unpack, text_sections))
         if self.mobi_html.endswith(b'#'):
             self.mobi_html = self.mobi_html[:-1]
 
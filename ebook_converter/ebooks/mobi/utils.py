@@ -177,19 +177,21 @@ def rescale_image(data, maxsizeb=IMAGE_MAX_SIZE, dimen=None):
         #data = save_cover_data_to(data)
     if len(data) <= maxsizeb:
         return data
-    orig_data = data  # save it in case compression fails
+    # The image is decoded only once, and then encoded with decreasing
+    # quality, and then size, until it fits.
+    orig_img = image_from_data(data)
+    orig_img.load()
     quality = 90
     while len(data) > maxsizeb and quality >= 5:
-        data = image_to_data(image_from_data(orig_data), compression_quality=quality)
+        data = image_to_data(orig_img, compression_quality=quality)
         quality -= 5
     if len(data) <= maxsizeb:
         return data
-    orig_data = data
 
     scale = 0.9
+    img = orig_img
     while len(data) > maxsizeb and scale >= 0.05:
-        img = image_from_data(data)
-        w, h = img.width(), img.height()
+        w, h = img.size
         img = resize_image(img, int(scale*w), int(scale*h))
         data = image_to_data(img, compression_quality=quality)
         scale -= 0.05
@@ -3,7 +3,7 @@ from struct import pack
 
 from ebook_converter.ebooks import normalize
 from ebook_converter.ebooks.mobi.writer2.serializer import Serializer
-from ebook_converter.ebooks.compression.palmdoc import compress_doc
+from ebook_converter.ebooks.compression.palmdoc import compress_docs
 from ebook_converter.ebooks.mobi.langcodes import iana2mobi
 from ebook_converter.utils.filenames import ascii_filename
 from ebook_converter.ebooks.mobi.writer2 import (PALMDOC, UNCOMPRESSED)
@@ -160,11 +160,17 @@ class MobiWriter(object):
         if self.compression != UNCOMPRESSED:
             self.oeb.logger.info('  Compressing markup content...')
 
+        # Find boundaries of all the records first, so that they can be
+        # compressed independently
+        text_records = []
         while text.tell() < self.text_length:
-            data, overlap = create_text_record(text)
-            if self.compression == PALMDOC:
-                data = compress_doc(data)
+            text_records.append(create_text_record(text))
+        compressed = [data for data, _ in text_records]
+        if self.compression == PALMDOC:
+            compressed = compress_docs(
+                compressed, workers=getattr(self.opts, 'transform_workers', 1))
 
+        for data, (_, overlap) in zip(compressed, text_records):
             data += overlap
             data += pack(b'>B', len(overlap))
 
@@ -8,6 +8,7 @@ import mimetypes
 import numbers
 import operator
 import os
+import posixpath
 import re
 import string
 import sys
@@ -24,6 +25,7 @@ from ebook_converter.ebooks.oeb import parse_utils
 from ebook_converter.utils.cleantext import clean_xml_chars
 from ebook_converter.utils import encoding as uenc
 from ebook_converter.utils.short_uuid import uuid4
+from ebook_converter.utils.zipfile import ZIP_DEFLATED, ZIP_STORED
 
 
 def tag(tag_ns, name):
@@ -565,6 +567,80 @@ class DirContainer(object):
         return names
 
 
+class ZipContainer(DirContainer):
+    """Zip file container, with the directory as an overlay.
+
+    Files are read from the directory if they exist there, and straight from
+    the zip file otherwise, so only the files which need to be modified on
+    disk have to be extracted. Member names are mapped to paths relative to
+    the directory the same way as when extracting the zip file into it.
+    """
+
+    def __init__(self, path, log, zipfile, ignore_opf=False):
+        self.zipfile = zipfile
+        self.members = {}
+        for info in zipfile.infolist():
+            if info.filename.endswith('/'):
+                continue
+            name = zip_member_path(info.filename)
+            if name:
+                self.members.setdefault(name, info)
+        super().__init__(path, log, ignore_opf=ignore_opf)
+
+    def _member(self, path):
+        """Return ZipInfo of the member for the unquoted path, if it is not
+        overridden by a file in the directory."""
+        info = self.members.get(posixpath.normpath(path.replace('\\', '/')))
+        if info is None or os.path.isfile(os.path.join(self.rootdir, path)):
+            return None
+        return info
+
+    def read(self, path):
+        if path is None:
+            path = self.opfname
+        info = self._member(urllib.parse.unquote(path))
+        if info is None:
+            return super().read(path)
+        return self.zipfile.read(info)
+
+    def raw_member(self, path):
+        """Return tuple of ZipInfo and the compressed data of the member for
+        path, or None if the file has to be read the usual way."""
+        info = self._member(urllib.parse.unquote(path))
+        if (info is None or info.flag_bits & 0x1 or
+                info.compress_type not in (ZIP_STORED, ZIP_DEFLATED)):
+            return None
+        return info, self.zipfile.read_raw(info)
+
+    def extract(self, path):
+        """Extract the member for the (unquoted) path into the directory, so
+        that the file can be modified there."""
+        info = self._member(path)
+        if info is not None:
+            self.zipfile.extract(info, self.rootdir)
+
+    def exists(self, path):
+        if not path:
+            return False
+        try:
+            path = urllib.parse.unquote(path)
+        except ValueError:
+            return False
+        return self._member(path) is not None or super().exists(path)
+
+    def namelist(self):
+        names = set(super().namelist())
+        names.update(os.path.join(self.rootdir, name).replace('\\', '/')
+                     for name in self.members)
+        return sorted(names)
+
+
+def zip_member_path(name):
+    """Return relative path of the zip member, as it is extracted."""
+    name = os.path.splitdrive(name.replace('\\', '/'))[1]
+    return '/'.join(x for x in name.split('/') if x not in {'', '.', '..'})
+
+
 class Metadata(object):
     """A collection of OEB data model metadata.
 
@@ -888,6 +964,9 @@ class Manifest(object):
                 loader = oeb.container.read
             self._loader = loader
             self._data = data
+            # Set once data is replaced, so it is no longer the same as the
+            # file loaded from the container
+            self._modified = data is not None
 
         def __repr__(self):
             return 'Item(id=%r, href=%r, media_type=%r)' \
@@ -1012,10 +1091,12 @@ class Manifest(object):
         @data.setter
         def data(self, value):
             self._data = value
+            self._modified = True
 
         @data.deleter
         def data(self):
             self._data = None
+            self._modified = True
 
         def unload_data_from_memory(self, memory=None):
             if isinstance(self._data, bytes):
@@ -1058,6 +1139,23 @@ class Manifest(object):
             return serialize(self.data, self.media_type,
                              pretty_print=self.oeb.pretty_print)
 
+        @property
+        def raw_member(self):
+            """Tuple of ZipInfo and compressed data of the zip file member
+            the item comes from, if the item was not modified and its
+            contents are not parsed, so that it can be copied to zip based
+            output as is. None otherwise."""
+            container = self.oeb.container
+            if (self._modified or not hasattr(container, 'raw_member') or
+                    self._loader != container.read):
+                return None
+            mt = (self.media_type or '').lower()
+            if (mt in OEB_DOCS or mt in OEB_STYLES or
+                    mt[-4:] in ('+xml', '/xml') or mt == 'text/plain'):
+                return None
+            return container.raw_member(getattr(self, 'html_input_href',
+                                                self.href))
+
         def __str__(self):
             return self.unicode_representation
 
@@ -0,0 +1,136 @@
+"""
+Running independent, per spine item parts of transforms in worker processes.
+
+Workers are forked, so they inherit the whole OEBBook and the transform
+object from the parent process, and nothing but arguments and return values
+has to be pickled. Every worker owns a fixed shard of the items and keeps its
+state between calls, so a transform can be split into several phases (like
+stylizing and flattening), with global decisions made in the parent between
+them. Results are always returned in the order of the items, so merging them
+in the parent is deterministic.
+"""
+import multiprocessing
+import os
+import traceback
+
+from lxml import etree
+
+
+# Don't bother with forking for less items than that per worker.
+MIN_ITEMS_PER_WORKER = 4
+
+
+def worker_count(requested, items_count, min_items=MIN_ITEMS_PER_WORKER):
+    """
+    Return number of workers to use for items_count items, with at least
+    min_items items per worker, or 1 if they should be processed serially.
+    If requested is 0, number of CPUs is used.
+    """
+    if requested is None or requested == 1:
+        return 1
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        return 1
+    if multiprocessing.current_process().daemon:
+        # daemonic processes (like the batch conversion workers) cannot
+        # have children
+        return 1
+    if requested <= 0:
+        requested = os.cpu_count() or 1
+    return max(1, min(requested, items_count // min_items))
+
+
+def _worker_loop(conn, target, items):
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            break
+        name, args = msg
+        try:
+            func = getattr(target, name)
+            conn.send((True, [func(item, *args) for item in items]))
+        except BaseException:
+            conn.send((False, traceback.format_exc()))
+    conn.close()
+
+
+class SpineWorkers(object):
+    """
+    Pool of forked workers, each owning every n-th of items. Calling map()
+    runs the named method of target on every item in the worker owning it.
+    """
+
+    def __init__(self, target, items, workers):
+        self.target = target
+        self.items = list(items)
+        self.workers = max(1, min(workers, len(self.items)))
+        self.processes = []
+        self.connections = []
+
+    def start(self):
+        ctx = multiprocessing.get_context('fork')
+        for index in range(self.workers):
+            parent_conn, child_conn = ctx.Pipe()
+            proc = ctx.Process(target=_worker_loop,
+                               args=(child_conn, self.target,
+                                     self.items[index::self.workers]))
+            proc.start()
+            child_conn.close()
+            self.processes.append(proc)
+            self.connections.append(parent_conn)
+        return self
+
+    def close(self):
+        for conn in self.connections:
+            try:
+                conn.send(None)
+                conn.close()
+            except (OSError, ValueError):
+                pass
+        for proc in self.processes:
+            proc.join()
+        self.processes, self.connections = [], []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.close()
+
+    def map(self, name, *args):
+        """
+        Call target.name(item, *args) for all items and return list of
+        results in the order of items.
+        """
+        for conn in self.connections:
+            conn.send((name, args))
+        results = [None] * len(self.items)
+        errors = []
+        for index, conn in enumerate(self.connections):
+            try:
+                ok, value = conn.recv()
+            except EOFError:
+                ok, value = False, 'Worker process died unexpectedly'
+            if not ok:
+                errors.append(value)
+                continue
+            results[index::self.workers] = value
+        if errors:
+            raise RuntimeError('Running %s in worker process failed:\n%s' %
+                               (name, errors[0]))
+        return results
+
+
+def serialize_tree(root):
+    """
+    Serialize (X)HTML tree for sending it back from the worker.
+    """
+    return etree.tostring(root, encoding='utf-8')
+
+
+def parse_tree(raw):
+    """
+    Parse tree serialized by serialize_tree in the parent process.
+    """
+    parser = etree.XMLParser(no_network=True, resolve_entities=False,
+                             strip_cdata=False, huge_tree=True)
+    return etree.fromstring(raw, parser=parser)
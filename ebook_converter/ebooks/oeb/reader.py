@@ -724,6 +724,17 @@ class OEBReader(object):
         # self._ensure_cover_image()
 
 
+class ZipReader(OEBReader):
+    """Read a book, which files not present in its directory are read
+    straight from the zip file."""
+
+    def __init__(self, zipfile):
+        self.zipfile = zipfile
+
+    def Container(self, path, log):
+        return base.ZipContainer(path, log, self.zipfile)
+
+
 def main(argv=sys.argv):
     reader = OEBReader()
     for arg in argv[1:]:
@@ -0,0 +1,129 @@
+"""
+Cache of the styles computed by Stylizer.
+
+Entries are keyed by a content hash of the document, its stylesheets and the
+settings which affect the cascade, so stylizing the same document with the
+same CSS again (in a later transform, or in a later conversion of the same
+book) reuses the computed styles instead of matching all the rules again.
+
+Recently used entries are kept in memory. If a cache directory is given,
+entries are also stored there, so they survive the process.
+"""
+import collections
+import hashlib
+import os
+import tempfile
+from weakref import WeakKeyDictionary
+
+from ebook_converter import logging
+from ebook_converter.utils.serialize import pickle_dumps, pickle_loads
+
+
+LOG = logging.default_log
+
+# Bump when the format of entries or the way styles are computed changes,
+# to invalidate entries stored on disk.
+CACHE_VERSION = 1
+MAX_MEMORY_ENTRIES = 256
+
+
+class StyleCache(object):
+    """
+    Mapping of keys to computed styles, with least recently used entries
+    evicted from memory.
+    """
+
+    def __init__(self, max_entries=MAX_MEMORY_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.hits = self.misses = 0
+
+    def _path(self, cache_dir, key):
+        return os.path.join(cache_dir, 'styles', key[:2], key)
+
+    def get(self, key, cache_dir=None):
+        try:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        except KeyError:
+            pass
+        if cache_dir:
+            try:
+                with open(self._path(cache_dir, key), 'rb') as f:
+                    value = pickle_loads(f.read())
+            except FileNotFoundError:
+                pass
+            except Exception:
+                LOG.debug('Ignoring unreadable style cache entry %s', key)
+            else:
+                self.hits += 1
+                self._remember(key, value)
+                return value
+        self.misses += 1
+        return None
+
+    def set(self, key, value, cache_dir=None):
+        self._remember(key, value)
+        if not cache_dir:
+            return
+        path = self._path(cache_dir, key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(pickle_dumps(value))
+            os.replace(tmp, path)
+        except OSError as exc:
+            LOG.debug('Unable to store style cache entry %s: %s', key, exc)
+
+    def _remember(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = self.misses = 0
+
+
+style_cache = StyleCache()
+
+# Fingerprints of the stylesheets which are never changed after parsing
+_constant_fingerprints = WeakKeyDictionary()
+
+
+def set_constant_fingerprint(stylesheet, data):
+    """
+    Remember the fingerprint of the stylesheet parsed from data, which will
+    not be modified afterwards, so it doesn't need to be serialized.
+    """
+    _constant_fingerprints[stylesheet] = hashlib.sha1(data).digest()
+
+
+def stylesheet_fingerprint(stylesheet):
+    try:
+        return _constant_fingerprints[stylesheet]
+    except (KeyError, TypeError):
+        pass
+    # Stylesheets from the manifest can be changed by transforms, so they
+    # are hashed every time.
+    data = stylesheet.cssText
+    if not isinstance(data, bytes):
+        data = data.encode('utf-8')
+    return hashlib.sha1(data).digest()
+
+
+def cache_key(document, stylesheets, settings):
+    """
+    Return key for the styles of the serialized document, using the list of
+    stylesheets and settings, a tuple of anything else which affects the
+    computed styles.
+    """
+    h = hashlib.sha1()
+    h.update(repr((CACHE_VERSION, settings)).encode('utf-8'))
+    for stylesheet in stylesheets:
+        h.update(stylesheet_fingerprint(stylesheet))
+    h.update(document)
+    return h.hexdigest()
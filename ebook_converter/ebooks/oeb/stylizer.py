@@ -12,6 +12,7 @@ import unicodedata
 from operator import itemgetter
 from weakref import WeakKeyDictionary
 from xml.dom import SyntaxErr as CSSSyntaxError
+from lxml import etree
 from css_parser.css import (CSSStyleRule, CSSPageRule, CSSFontFaceRule,
         cssproperties)
 from css_parser import (profile as cssprofiles, parseString, parseStyle, log as
@@ -20,8 +21,9 @@ from css_parser import (profile as cssprofiles, parseString, parseStyle, log as
 from ebook_converter import constants as const
 from ebook_converter.ebooks import unit_convert
 from ebook_converter.ebooks.oeb import base
+from ebook_converter.ebooks.oeb import stylecache
 from ebook_converter.ebooks.oeb.normalize_css import DEFAULTS, normalizers
-from ebook_converter.css_selectors import Select, SelectorError, INAPPROPRIATE_PSEUDO_CLASSES
+from ebook_converter.css_selectors import Select, SelectorError, SelectorIndex, INAPPROPRIATE_PSEUDO_CLASSES
 from ebook_converter.tinycss.media3 import CSSMedia3Parser
 from ebook_converter.utils import encoding as uenc
 
@@ -29,6 +31,8 @@ from ebook_converter.utils import encoding as uenc
 css_parser_log.setLevel(logging.WARN)
 
 _html_css_stylesheet = None
+# Parsed <style> tags, which are the same in many documents of a book
+_style_tag_stylesheets = stylecache.StyleCache()
 
 
 def html_css_stylesheet():
@@ -38,6 +42,8 @@ def html_css_stylesheet():
                   'data/html.css', 'rb') as f:
             html_css = f.read().decode('utf-8')
         _html_css_stylesheet = parseString(html_css, validate=False)
+        stylecache.set_constant_fingerprint(_html_css_stylesheet,
+                                            html_css.encode('utf-8'))
     return _html_css_stylesheet
 
 
@@ -121,6 +127,17 @@ class StylizerRules(object):
                     self.rules.extend(self.flatten_rule(rule, href, index, is_user_agent_sheet=sheet_index==0))
                     index = index + 1
         self.rules.sort(key=itemgetter(0))  # sort by specificity
+        self._selector_index = None
+
+    @property
+    def selector_index(self):
+        ''' Index of the selectors of all rules, shared by all the documents
+        using these rules. '''
+        if self._selector_index is None:
+            self._selector_index = SelectorIndex(
+                (rule[3] for rule in self.rules),
+                ignore_inappropriate_pseudo_classes=True)
+        return self._selector_index
 
     def flatten_rule(self, rule, href, index, is_user_agent_sheet=False):
         results = []
@@ -212,7 +229,7 @@ class Stylizer(object):
         cssname = os.path.splitext(basename)[0] + '.css'
         stylesheets = [html_css_stylesheet()]
         if base_css:
-            stylesheets.append(parseString(base_css, validate=False))
+            stylesheets.append(self._parse_constant_css(base_css))
         style_tags = base.xpath(tree, '//*[local-name()="style" or local-name()="link"]')
 
         # Add css_parser parsing profiles from output_profile
@@ -235,11 +252,8 @@ class Stylizer(object):
                         text += '\n\n' + uenc.force_unicode(t, 'utf-8')
                 if text:
                     text = oeb.css_preprocessor(text)
-                    # We handle @import rules separately
-                    parser.setFetcher(lambda x: ('utf-8', b''))
-                    stylesheet = parser.parseString(text, href=cssname,
-                            validate=False)
-                    parser.setFetcher(self._fetch_css_file)
+                    stylesheet = self._parse_style_tag(parser, text, cssname,
+                                                       item)
                     for rule in stylesheet.cssRules:
                         if rule.type == rule.IMPORT_RULE:
                             ihref = item.abshref(rule.href)
@@ -257,10 +271,6 @@ class Stylizer(object):
                                                     'file %r', rule.href)
                                 continue
                             stylesheets.append(sitem.data)
-                    # Make links to resources absolute, since these rules will
-                    # be folded into a stylesheet at the root
-                    replaceUrls(stylesheet, item.abshref,
-                            ignoreImportRules=True)
                     stylesheets.append(stylesheet)
             elif (elem.tag == base.tag('xhtml', 'link') and elem.get('href') and elem.get(
                     'rel', 'stylesheet').lower() == 'stylesheet' and elem.get(
@@ -301,8 +311,38 @@ class Stylizer(object):
         self.flatten_style = self.oeb.stylizer_rules.flatten_style
 
         self._styles = {}
+        fake_first_letter = getattr(self.oeb, 'plumber_output_format',
+                                    '').lower() in {'mobi', 'docx'} and any(
+            'first-letter' in rule[3] for rule in self.rules)
+        cache_dir = getattr(self.opts, 'style_cache_dir', None)
+        cache_key = stylecache.cache_key(
+            etree.tostring(tree), stylesheets,
+            (item.href, self.profile.fbase,
+             sorted(self.profile.fnames.items()),
+             getattr(self.opts, 'change_justification', None),
+             fake_first_letter,
+             [x['name'] for x in self.opts.output_profile.extra_css_modules]))
+        cached = stylecache.style_cache.get(cache_key, cache_dir)
+        if cached is not None:
+            self._restore_styles(tree, cached)
+        else:
+            cached = self._compute_styles(tree, item, fake_first_letter)
+            if cached is not None:
+                stylecache.style_cache.set(cache_key, cached, cache_dir)
+
+    def _compute_styles(self, tree, item, fake_first_letter):
+        '''
+        Match the rules against the tree and compute styles of elements.
+        Return styles in a form suitable for caching, or None if the tree
+        was changed in a way which cannot be replayed.
+        '''
+        cacheable = True
         pseudo_pat = re.compile(':{1,2}(%s)' % ('|'.join(INAPPROPRIATE_PSEUDO_CLASSES)), re.I)
-        select = Select(tree, ignore_inappropriate_pseudo_classes=True)
+        if getattr(self.opts, 'css_selector_engine', 'index') == 'select':
+            select = Select(tree, ignore_inappropriate_pseudo_classes=True)
+        else:
+            # Match all the rules in a single pass over the tree
+            select = self.oeb.stylizer_rules.selector_index(tree)
 
         for _, _, cssdict, text, _ in self.rules:
             fl = pseudo_pat.search(text)
@@ -315,10 +355,10 @@ class Stylizer(object):
 
             if fl is not None:
                 fl = fl.group(1)
-                if fl == 'first-letter' and getattr(self.oeb,
-                        'plumber_output_format', '').lower() in {'mobi', 'docx'}:
+                if fl == 'first-letter' and fake_first_letter:
                     # Fake first-letter
                     for elem in matches:
+                        cacheable = False
                         for x in elem.iter('*'):
                             if x.text:
                                 punctuation_chars = []
@@ -341,6 +381,10 @@ class Stylizer(object):
                                 x.insert(0, span)
                                 self.style(span)._update_cssdict(cssdict)
                                 break
+                    if matches and type(select) is not Select:
+                        # The tree has changed, indexed matches are stale
+                        select = Select(tree,
+                                        ignore_inappropriate_pseudo_classes=True)
                 else:  # Element pseudo-class
                     for elem in matches:
                         self.style(elem)._update_pseudo_class(fl, cssdict)
@@ -350,6 +394,7 @@ class Stylizer(object):
         for elem in base.xpath(tree, '//h:*[@style]'):
             self.style(elem)._apply_style_attr(url_replacer=item.abshref)
         num_pat = re.compile(r'[0-9.]+$')
+        resized = []
         for elem in base.xpath(tree, '//h:img[@width or @height]'):
             style = self.style(elem)
             # Check if either height or width is not default
@@ -368,9 +413,57 @@ class Stylizer(object):
                         if num_pat.match(val) is not None:
                             val += 'px'
                         upd[prop] = val
+                resized.append(elem)
                 if upd:
                     style._update_cssdict(upd)
 
+        if not cacheable:
+            return None
+        positions = {elem: index for index, elem in enumerate(tree.iter())}
+        return ([(positions[elem], dict(style._style),
+                  {name: dict(cssdict) for name, cssdict in
+                   style._pseudo_classes.items()})
+                 for elem, style in self._styles.items()],
+                [positions[elem] for elem in resized])
+
+    def _restore_styles(self, tree, cached):
+        styles, resized = cached
+        elems = list(tree.iter())
+        for index, cssdict, pseudo_classes in styles:
+            style = self.style(elems[index])
+            style._style = dict(cssdict)
+            style._pseudo_classes = {name: dict(x) for name, x in
+                                     pseudo_classes.items()}
+        for index in resized:
+            for prop in ('width', 'height'):
+                elems[index].attrib.pop(prop, None)
+
+    def _parse_style_tag(self, parser, text, cssname, item):
+        key = (text, cssname, item.href)
+        stylesheet = _style_tag_stylesheets.get(key)
+        if stylesheet is None:
+            # We handle @import rules separately
+            parser.setFetcher(lambda x: ('utf-8', b''))
+            stylesheet = parser.parseString(text, href=cssname,
+                                            validate=False)
+            parser.setFetcher(self._fetch_css_file)
+            # Make links to resources absolute, since these rules will
+            # be folded into a stylesheet at the root
+            replaceUrls(stylesheet, item.abshref, ignoreImportRules=True)
+            stylecache.set_constant_fingerprint(
+                stylesheet, repr(key).encode('utf-8'))
+            _style_tag_stylesheets.set(key, stylesheet)
+        return stylesheet
+
+    def _parse_constant_css(self, text):
+        stylesheet = _style_tag_stylesheets.get(text)
+        if stylesheet is None:
+            stylesheet = parseString(text, validate=False)
+            stylecache.set_constant_fingerprint(stylesheet,
+                                                text.encode('utf-8'))
+            _style_tag_stylesheets.set(text, stylesheet)
+        return stylesheet
+
     def _fetch_css_file(self, path):
         hrefs = self.oeb.manifest.hrefs
         if path not in hrefs:
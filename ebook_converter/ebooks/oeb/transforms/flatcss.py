@@ -16,6 +16,7 @@ from css_parser import css as cp_css
 from ebook_converter import constants as const
 from ebook_converter.ebooks import unit_convert
 from ebook_converter.ebooks.oeb import base
+from ebook_converter.ebooks.oeb import parallel
 from ebook_converter.ebooks.oeb import parse_utils
 
 from ebook_converter.ebooks.oeb.stylizer import Stylizer
@@ -24,6 +25,11 @@ from ebook_converter.utils.filenames import ascii_filename, ascii_text
 
 COLLAPSE = re.compile(r'[ \t\r\n\v]+')
 STRIPNUM = re.compile(r'[-0-9]+$')
+# Prefix of the temporary class names assigned in worker processes. Generated
+# class names are ASCII only, so they cannot clash with it.
+PARALLEL_CLASS_MARK = '\u2063'
+
+CSSText = collections.namedtuple('CSSText', 'cssText')
 
 
 def asfloat(value, default):
@@ -131,6 +137,19 @@ class EmbedFontsCSSRules(object):
         return self.href
 
 
+class FlattenedStylizer(object):
+    """
+    The parts of the Stylizer, which are used after the spine is flattened,
+    as reported back by worker processes.
+    """
+
+    def __init__(self, profile, page_rule, font_face_rules, body_font_size):
+        self.profile = profile
+        self.page_rule = page_rule
+        self.font_face_rules = [CSSText(x) for x in font_face_rules]
+        self.body_font_size = body_font_size
+
+
 class CSSFlattener(object):
 
     def __init__(self, fbase=None, fkey=None, lineh=None, unfloat=False,
@@ -198,10 +217,17 @@ class CSSFlattener(object):
         # like the AZW3 output inline ToC.
         self.oeb.store_embed_font_rules = EmbedFontsCSSRules(self.body_font_family,
                 self.embed_font_rules)
-        self.stylize_spine()
-        self.sbase = self.baseline_spine() if self.fbase else None
-        self.fmap = FontMapper(self.sbase, self.fbase, self.fkey)
-        self.flatten_spine()
+        workers = parallel.worker_count(
+            getattr(self.opts, 'transform_workers', 1), len(self.items))
+        if workers > 1:
+            self.oeb.logger.info('Flattening CSS using %d worker processes',
+                                 workers)
+            self.parallel_flatten_spine(workers)
+        else:
+            self.stylize_spine()
+            self.sbase = self.baseline_spine() if self.fbase else None
+            self.fmap = FontMapper(self.sbase, self.fbase, self.fkey)
+            self.flatten_spine()
         if epub3_nav is not None:
             self.opts.epub3_nav_parsed = epub3_nav.data
 
@@ -271,36 +297,38 @@ class CSSFlattener(object):
 
     def stylize_spine(self):
         self.stylizers = {}
-        profile = self.context.source
-        css = ''
         for item in self.items:
-            html = item.data
-            body = html.find(base.tag('xhtml', 'body'))
-            if 'style' in html.attrib:
-                b = body.attrib.get('style', '')
-                body.set('style',  html.get('style') + ';' + b)
-                del html.attrib['style']
-            bs = body.get('style', '').split(';')
-            bs.append('margin-top: 0pt')
-            bs.append('margin-bottom: 0pt')
-            if float(self.context.margin_left) >= 0:
-                bs.append('margin-left : %gpt'%
-                        float(self.context.margin_left))
-            if float(self.context.margin_right) >= 0:
-                bs.append('margin-right : %gpt'%
-                        float(self.context.margin_right))
-            bs.extend(['padding-left: 0pt', 'padding-right: 0pt'])
-            if self.page_break_on_body:
-                bs.extend(['page-break-before: always'])
-            if self.context.change_justification != 'original':
-                bs.append('text-align: '+ self.context.change_justification)
-            if self.body_font_family:
-                bs.append('font-family: '+self.body_font_family)
-            body.set('style', '; '.join(bs))
-            stylizer = Stylizer(html, item.href, self.oeb, self.context, profile,
-                    user_css=self.context.extra_css,
-                    extra_css=css)
-            self.stylizers[item] = stylizer
+            self.stylize_item(item)
+
+    def stylize_item(self, item):
+        html = item.data
+        body = html.find(base.tag('xhtml', 'body'))
+        if 'style' in html.attrib:
+            b = body.attrib.get('style', '')
+            body.set('style',  html.get('style') + ';' + b)
+            del html.attrib['style']
+        bs = body.get('style', '').split(';')
+        bs.append('margin-top: 0pt')
+        bs.append('margin-bottom: 0pt')
+        if float(self.context.margin_left) >= 0:
+            bs.append('margin-left : %gpt'%
+                    float(self.context.margin_left))
+        if float(self.context.margin_right) >= 0:
+            bs.append('margin-right : %gpt'%
+                    float(self.context.margin_right))
+        bs.extend(['padding-left: 0pt', 'padding-right: 0pt'])
+        if self.page_break_on_body:
+            bs.extend(['page-break-before: always'])
+        if self.context.change_justification != 'original':
+            bs.append('text-align: '+ self.context.change_justification)
+        if self.body_font_family:
+            bs.append('font-family: '+self.body_font_family)
+        body.set('style', '; '.join(bs))
+        stylizer = Stylizer(html, item.href, self.oeb, self.context,
+                self.context.source, user_css=self.context.extra_css,
+                extra_css='')
+        self.stylizers[item] = stylizer
+        return stylizer
 
     def baseline_node(self, node, stylizer, sizes, csize):
         csize = stylizer.style(node)['font-size']
@@ -311,14 +339,20 @@ class CSSFlattener(object):
             if child.tail:
                 sizes[csize] += len(COLLAPSE.sub(' ', child.tail))
 
+    def baseline_item(self, item, sizes):
+        html = item.data
+        stylizer = self.stylizers[item]
+        body = html.find(base.tag('xhtml', 'body'))
+        fsize = self.context.source.fbase
+        self.baseline_node(body, stylizer, sizes, fsize)
+
     def baseline_spine(self):
         sizes = collections.defaultdict(float)
         for item in self.items:
-            html = item.data
-            stylizer = self.stylizers[item]
-            body = html.find(base.tag('xhtml', 'body'))
-            fsize = self.context.source.fbase
-            self.baseline_node(body, stylizer, sizes, fsize)
+            self.baseline_item(item, sizes)
+        return self.select_sbase(sizes)
+
+    def select_sbase(self, sizes):
         try:
             sbase = max(list(sizes.items()), key=operator.itemgetter(1))[0]
         except:
@@ -524,7 +558,7 @@ class CSSFlattener(object):
 
         pseudo_classes = style.pseudo_classes(self.filter_css)
         if cssdict or pseudo_classes:
-            keep_classes = set()
+            keep_classes = []
 
             if cssdict:
                 items = sorted(cssdict.items())
@@ -535,33 +569,24 @@ class CSSFlattener(object):
                 # name with different case, both cases will apply, leading
                 # to incorrect results.
                 klass = ascii_text(STRIPNUM.sub('', classes_list[0])).lower().strip().replace(' ', '_')
-                if css in styles:
-                    match = styles[css]
-                else:
-                    match = klass + str(names[klass] or '')
-                    styles[css] = match
-                    names[klass] += 1
+                match = self.style_class(styles, names, css, klass)
                 node.attrib['class'] = match
-                keep_classes.add(match)
+                keep_classes.append(match)
 
             for psel, cssdict in pseudo_classes.items():
                 items = sorted(cssdict.items())
                 css = ';\n'.join('%s: %s' % (key, val) for key, val in items)
                 pstyles = pseudo_styles[psel]
-                if css in pstyles:
-                    match = pstyles[css]
-                else:
-                    # We have to use a different class for each psel as
-                    # otherwise you can have incorrect styles for a situation
-                    # like: a:hover { color: red } a:link { color: blue } a.x:hover { color: green }
-                    # If the pcalibre class for a:hover and a:link is the same,
-                    # then the class attribute for a.x tags will contain both
-                    # that class and the class for a.x:hover, which is wrong.
-                    klass = 'pcalibre'
-                    match = klass + str(names[klass] or '')
-                    pstyles[css] = match
-                    names[klass] += 1
-                keep_classes.add(match)
+                # We have to use a different class for each psel as
+                # otherwise you can have incorrect styles for a situation
+                # like: a:hover { color: red } a:link { color: blue } a.x:hover { color: green }
+                # If the pcalibre class for a:hover and a:link is the same,
+                # then the class attribute for a.x tags will contain both
+                # that class and the class for a.x:hover, which is wrong.
+                match = self.style_class(pstyles, names, css, 'pcalibre',
+                                         psel)
+                if match not in keep_classes:
+                    keep_classes.append(match)
                 node.attrib['class'] = ' '.join(keep_classes)
 
         elif 'class' in node.attrib:
@@ -572,6 +597,18 @@ class CSSFlattener(object):
             for child in node:
                 self.flatten_node(child, stylizer, names, styles, pseudo_styles, psize, item_id)
 
+    def style_class(self, styles, names, css, klass, psel=None):
+        """
+        Return class name for css, generating new one based on klass if the
+        css wasn't seen yet.
+        """
+        if css in styles:
+            return styles[css]
+        match = klass + str(names[klass] or '')
+        styles[css] = match
+        names[klass] += 1
+        return match
+
     def flatten_head(self, item, href, global_href):
         html = item.data
         head = html.find(base.tag('xhtml', 'head'))
@@ -652,17 +689,92 @@ class CSSFlattener(object):
                 ans[item] = gc_map[css]
         return ans
 
+    def flatten_item(self, item, names, styles, pseudo_styles):
+        html = item.data
+        stylizer = self.stylizers[item]
+        if self.specializer is not None:
+            self.specializer(item, stylizer)
+        fsize = self.context.dest.fbase
+        self.flatten_node(html, stylizer, names, styles, pseudo_styles, fsize, item.id, recurse=False)
+        self.flatten_node(html.find(base.tag('xhtml', 'body')), stylizer, names, styles, pseudo_styles, fsize, item.id)
+
     def flatten_spine(self):
         names = collections.defaultdict(int)
         styles, pseudo_styles = {}, collections.defaultdict(dict)
         for item in self.items:
-            html = item.data
-            stylizer = self.stylizers[item]
-            if self.specializer is not None:
-                self.specializer(item, stylizer)
-            fsize = self.context.dest.fbase
-            self.flatten_node(html, stylizer, names, styles, pseudo_styles, fsize, item.id, recurse=False)
-            self.flatten_node(html.find(base.tag('xhtml', 'body')), stylizer, names, styles, pseudo_styles, fsize, item.id)
+            self.flatten_item(item, names, styles, pseudo_styles)
+        self.write_flattened_css(styles, pseudo_styles)
+
+    def parallel_flatten_spine(self, workers):
+        """
+        Stylize and flatten spine items in worker processes. Items are
+        flattened with temporary class names, which are then replaced in
+        the order of the spine, exactly as flatten_spine() would name them.
+        """
+        self.stylizers = {}
+        with parallel.SpineWorkers(self, self.items, workers) as pool:
+            self.sbase = None
+            item_sizes = pool.map('_stylize_in_worker')
+            if self.fbase:
+                sizes = collections.defaultdict(float)
+                for isizes in item_sizes:
+                    for size, count in isizes.items():
+                        sizes[size] += count
+                self.sbase = self.select_sbase(sizes)
+            self.fmap = FontMapper(self.sbase, self.fbase, self.fkey)
+            results = pool.map('_flatten_in_worker', self.sbase)
+
+        names = collections.defaultdict(int)
+        styles, pseudo_styles = {}, collections.defaultdict(dict)
+        for item, result in zip(self.items, results):
+            raw, events, page_rule, font_face_rules, body_font_size = result
+            item.data = parallel.parse_tree(raw)
+            classes = {}
+            for index, (psel, css, klass) in enumerate(events):
+                target = styles if psel is None else pseudo_styles[psel]
+                classes[PARALLEL_CLASS_MARK + str(index)] = \
+                    self.style_class(target, names, css, klass)
+            for node in item.data.xpath('//*[@class]'):
+                names_list = []
+                for name in node.get('class').split():
+                    name = classes.get(name, name)
+                    if name not in names_list:
+                        names_list.append(name)
+                node.set('class', ' '.join(names_list))
+            self.stylizers[item] = FlattenedStylizer(
+                self.context.source, page_rule, font_face_rules,
+                body_font_size)
+        self.write_flattened_css(styles, pseudo_styles)
+
+    def _stylize_in_worker(self, item):
+        self.stylize_item(item)
+        if not self.fbase:
+            return None
+        sizes = collections.defaultdict(float)
+        self.baseline_item(item, sizes)
+        return dict(sizes)
+
+    def _flatten_in_worker(self, item, sbase):
+        events = []
+
+        def style_class(styles, names, css, klass, psel=None):
+            if css not in styles:
+                styles[css] = PARALLEL_CLASS_MARK + str(len(events))
+                events.append((psel, css, klass))
+            return styles[css]
+
+        self.style_class = style_class
+        self.sbase = sbase
+        self.fmap = FontMapper(self.sbase, self.fbase, self.fkey)
+        self.flatten_item(item, collections.defaultdict(int), {},
+                          collections.defaultdict(dict))
+        stylizer = self.stylizers[item]
+        return (parallel.serialize_tree(item.data), events,
+                dict(stylizer.page_rule),
+                [base.css_text(x) for x in stylizer.font_face_rules],
+                stylizer.body_font_size)
+
+    def write_flattened_css(self, styles, pseudo_styles):
         items = sorted(((key, val) for (val, key) in styles.items()))
         # :hover must come after link and :active must come after :hover
         psels = sorted(pseudo_styles, key=lambda x :
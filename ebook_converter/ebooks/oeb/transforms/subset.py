@@ -1,5 +1,20 @@
+"""
+Subsetting of the embedded fonts to the characters used in the book.
+
+Characters are collected in a single pass over every document, grouped by the
+chain of class attributes from the body to the element, so that styles are
+computed and matched against the embedded fonts only once for every distinct
+chain, not for every element. Fonts are then subset in worker processes, one
+font at a time in every worker. Subset fonts are cached by the hash of the
+font data and the set of characters, so converting the same book again, or
+another book using the same fonts, skips the subsetting.
+"""
+import hashlib
+import multiprocessing
+import os
 from collections import defaultdict
 
+from ebook_converter.ebooks.oeb import stylecache
 from ebook_converter.ebooks.oeb.base import urlnormalize, css_text
 from ebook_converter.utils.fonts.sfnt.subset import subset, NoGlyphs, UnsupportedFont
 from ebook_converter.tinycss.fonts3 import parse_font_family
@@ -110,6 +125,116 @@ def elem_style(style_rules, cls, inherited_style):
     return style
 
 
+# Bump when the format of cache entries or the subsetting changes
+CACHE_VERSION = 1
+MAX_MEMORY_ENTRIES = 64
+# Every font is subset in its own worker process
+MIN_FONTS_PER_WORKER = 1
+BASE_STYLE = {'font-family': ['serif'], 'font-weight': '400',
+              'font-style': 'normal', 'font-stretch': 'normal'}
+
+
+def collect_font_usage(root, chains, usage):
+    '''
+    Collect the text of all bodies in the document root into usage, mapping
+    class chains to lists of strings. Class chains are numbered in chains,
+    which maps (class attribute, number of the parent chain) to the number,
+    so that the parent is always numbered before its children.
+    '''
+    for body in root.xpath('//*[local-name()="body"]'):
+        stack = [(body, -1)]
+        while stack:
+            elem, parent = stack.pop()
+            key = (elem.get('class', '') or '', parent)
+            chain = chains.get(key)
+            if chain is None:
+                chain = chains[key] = len(chains)
+            texts = usage[chain]
+            if elem.text:
+                texts.append(elem.text)
+            for child in elem:
+                if child.tail:
+                    texts.append(child.tail)
+                stack.append((child, chain))
+
+
+def style_key(style):
+    return (tuple(style.get('font-family') or ()),
+            style.get('font-weight', '400'),
+            style.get('font-style', 'normal'),
+            style.get('font-stretch', 'normal'))
+
+
+class SubsetCache(stylecache.StyleCache):
+    """
+    Subsetting outcomes keyed by cache_key(), with least recently used
+    entries evicted from memory.
+    """
+
+    def _path(self, cache_dir, key):
+        return os.path.join(cache_dir, 'fonts', key[:2], key)
+
+
+subset_cache = SubsetCache(MAX_MEMORY_ENTRIES)
+
+
+def cache_key(raw, chars):
+    h = hashlib.sha1()
+    h.update(repr(CACHE_VERSION).encode('utf-8'))
+    h.update(hashlib.sha1(raw).digest())
+    h.update(''.join(sorted(chars)).encode('utf-8', 'surrogatepass'))
+    return h.hexdigest()
+
+
+def subset_font(raw, chars):
+    '''
+    Subset the font raw to chars. Return tuple of the status ('ok',
+    'noglyphs' or 'unsupported') and the result of subset() or the error
+    message.
+    '''
+    try:
+        return 'ok', subset(raw, chars)
+    except NoGlyphs:
+        return 'noglyphs', None
+    except UnsupportedFont as e:
+        return 'unsupported', str(e)
+
+
+# Fonts to subset, inherited by the forked worker processes
+_worker_tasks = None
+
+
+def _init_worker(tasks):
+    global _worker_tasks
+    _worker_tasks = tasks
+
+
+def _subset_in_worker(index):
+    return index, subset_font(*_worker_tasks[index])
+
+
+def subset_fonts(tasks, workers=1):
+    '''
+    Subset fonts of tasks, list of (raw, chars) tuples. If workers is other
+    than 1, every font is subset in a worker process (0 means number of
+    CPUs). Return list of results of subset_font() in the order of tasks.
+    '''
+    if workers != 1:
+        from ebook_converter.ebooks.oeb.parallel import worker_count
+        workers = worker_count(workers, len(tasks),
+                               min_items=MIN_FONTS_PER_WORKER)
+    if workers == 1:
+        return [subset_font(*task) for task in tasks]
+    # Largest fonts first, so that workers don't wait for the last one
+    order = sorted(range(len(tasks)), key=lambda i: -len(tasks[i][0]))
+    results = [None] * len(tasks)
+    with multiprocessing.get_context('fork').Pool(
+            workers, initializer=_init_worker, initargs=(tasks,)) as pool:
+        for index, result in pool.imap_unordered(_subset_in_worker, order):
+            results[index] = result
+    return results
+
+
 class SubsetFonts(object):
 
     '''
@@ -142,38 +267,70 @@ class SubsetFonts(object):
             else:
                 fonts[item.href] = font
 
+        outcomes = self.subset_used_fonts([font for font in fonts.values()
+                                           if font['chars']])
         for font in fonts.values():
             if not font['chars']:
-                self.log('The font %s is unused. Removing it.', font['src'])
+                self.log.info('The font %s is unused. Removing it.',
+                              font['src'])
                 remove(font)
                 continue
-            try:
-                raw, old_stats, new_stats = subset(font['item'].data, font['chars'])
-            except NoGlyphs:
-                self.log('The font %s has no used glyphs. Removing it.',
-                         font['src'])
+            status, result = outcomes[font['cache_key']]
+            if status == 'noglyphs':
+                self.log.info('The font %s has no used glyphs. Removing it.',
+                              font['src'])
                 remove(font)
                 continue
-            except UnsupportedFont as e:
+            elif status == 'unsupported':
                 self.log.warning('The font %s is unsupported for subsetting. '
-                                 '%s', font['src'], e)
+                                 '%s', font['src'], result)
                 sz = len(font['item'].data)
                 totals[0] += sz
                 totals[1] += sz
             else:
+                raw, old_stats, new_stats = result
                 font['item'].data = raw
                 nlen = sum(new_stats.values())
                 olen = sum(old_stats.values())
-                self.log('Decreased the font %s to %.1f%% of its original '
-                         'size', font['src'], nlen/olen * 100)
+                self.log.info('Decreased the font %s to %.1f%% of its '
+                              'original size', font['src'], nlen/olen * 100)
                 totals[0] += nlen
                 totals[1] += olen
 
             font['item'].unload_data_from_memory()
 
         if totals[0]:
-            self.log('Reduced total font size to %.1f%% of original',
-                     totals[0]/totals[1] * 100)
+            self.log.info('Reduced total font size to %.1f%% of original',
+                          totals[0]/totals[1] * 100)
+
+    def subset_used_fonts(self, fonts):
+        '''
+        Subset fonts, taking them from the cache if possible. Return dict
+        mapping cache keys, which are stored in the fonts, to the results of
+        subset_font().
+        '''
+        cache_dir = getattr(self.opts, 'subset_cache_dir', None)
+        outcomes, tasks = {}, {}
+        for font in fonts:
+            raw = font['item'].data
+            key = font['cache_key'] = cache_key(raw, font['chars'])
+            if key in outcomes or key in tasks:
+                continue
+            cached = subset_cache.get(key, cache_dir)
+            if cached is not None:
+                outcomes[key] = cached
+            else:
+                tasks[key] = (raw, font['chars'])
+        if outcomes:
+            self.log.debug('Reused %d subset fonts from the cache',
+                           len(outcomes))
+        keys = list(tasks)
+        results = subset_fonts([tasks[key] for key in keys],
+                               getattr(self.opts, 'transform_workers', 1))
+        for key, result in zip(keys, results):
+            outcomes[key] = result
+            subset_cache.set(key, result, cache_dir)
+        return outcomes
 
     def find_embedded_fonts(self):
         '''
@@ -214,13 +371,26 @@ class SubsetFonts(object):
         self.style_rules = dict(rules)
 
     def find_font_usage(self):
+        chains, usage = {}, defaultdict(list)
         for item in self.oeb.manifest:
             if not hasattr(item.data, 'xpath'):
                 continue
-            for body in item.data.xpath('//*[local-name()="body"]'):
-                base = {'font-family':['serif'], 'font-weight': '400',
-                        'font-style':'normal', 'font-stretch':'normal'}
-                self.find_usage_in(body, base)
+            collect_font_usage(item.data, chains, usage)
+
+        styles = {-1: BASE_STYLE}
+        fonts = {}
+        for (cls, parent), chain in chains.items():
+            style = styles[chain] = elem_style(self.style_rules, cls,
+                                               styles[parent])
+            texts = usage.get(chain)
+            if not texts:
+                continue
+            key = style_key(style)
+            if key not in fonts:
+                fonts[key] = self.used_font(style)
+            font = fonts[key]
+            if font:
+                font['chars'] |= set(''.join(texts))
 
     def used_font(self, style):
         '''
@@ -287,22 +457,3 @@ class SubsetFonts(object):
             matches = [f for f in matching_set if f['weight'] == wt]
             if matches:
                 return matches[0]
-
-    def find_chars(self, elem):
-        ans = set()
-        if elem.text:
-            ans |= set(elem.text)
-        for child in elem:
-            if child.tail:
-                ans |= set(child.tail)
-        return ans
-
-    def find_usage_in(self, elem, inherited_style):
-        style = elem_style(self.style_rules, elem.get('class', '') or '', inherited_style)
-        for child in elem:
-            self.find_usage_in(child, style)
-        font = self.used_font(style)
-        if font:
-            chars = self.find_chars(elem)
-            if chars:
-                font['chars'] |= chars
@@ -0,0 +1,129 @@
+"""
+Tests of the transforms, converting books which need them.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from ebook_converter.customize.conversion import OptionRecommendation
+from ebook_converter.ebooks.conversion.plumber import Plumber
+from ebook_converter.ebooks.oeb.transforms.subset import subset_cache
+from ebook_converter.utils.fonts.sfnt.tests import FONT_CHARS
+from ebook_converter.utils.fonts.sfnt.tests import font_chars
+from ebook_converter.utils.fonts.sfnt.tests import make_font
+from ebook_converter import logging
+
+
+CONTAINER = '''\
+<?xml version="1.0"?>
+<container version="1.0"
+    xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles>
+    <rootfile full-path="content.opf"
+        media-type="application/oebps-package+xml"/>
+  </rootfiles>
+</container>
+'''
+
+OPF = '''\
+<?xml version="1.0" encoding="utf-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="2.0"
+    unique-identifier="uid">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+    <dc:title>Fonts</dc:title>
+    <dc:language>en</dc:language>
+    <dc:identifier id="uid">urn:uuid:9b1c5a1e-4d7e-4a57-9b43-6f1d0c1ad001
+    </dc:identifier>
+  </metadata>
+  <manifest>
+    <item id="text" href="text.html" media-type="application/xhtml+xml"/>
+    <item id="css" href="style.css" media-type="text/css"/>
+    <item id="used" href="used.ttf" media-type="application/x-font-ttf"/>
+    <item id="other" href="other.ttf" media-type="application/x-font-ttf"/>
+    <item id="unused" href="unused.ttf"
+        media-type="application/x-font-ttf"/>
+  </manifest>
+  <spine>
+    <itemref idref="text"/>
+  </spine>
+</package>
+'''
+
+CSS = '''\
+@font-face { font-family: "Used"; src: url(used.ttf); }
+@font-face { font-family: "Other"; src: url(other.ttf); }
+@font-face { font-family: "Unused"; src: url(unused.ttf); }
+.used { font-family: "Used"; }
+.other { font-family: "Other"; }
+'''
+
+HTML = '''\
+<html xmlns="http://www.w3.org/1999/xhtml">
+<head><title>Fonts</title>
+<link rel="stylesheet" type="text/css" href="style.css"/></head>
+<body><p class="used">abba</p><p class="other">c<b>e</b></p><p>df</p>
+</body>
+</html>
+'''
+
+class TestSubsetFonts(unittest.TestCase):
+
+    def setUp(self):
+        self.tdir = tempfile.mkdtemp()
+        # Outcomes remembered from other tests would skip subsetting
+        subset_cache.clear()
+        self.font = make_font(FONT_CHARS)
+        self.epub = os.path.join(self.tdir, 'in.epub')
+        with zipfile.ZipFile(self.epub, 'w') as zf:
+            zf.writestr('mimetype', 'application/epub+zip',
+                        compress_type=zipfile.ZIP_STORED)
+            zf.writestr('META-INF/container.xml', CONTAINER)
+            zf.writestr('content.opf', OPF)
+            zf.writestr('text.html', HTML)
+            zf.writestr('style.css', CSS)
+            zf.writestr('used.ttf', self.font)
+            zf.writestr('other.ttf', self.font)
+            zf.writestr('unused.ttf', self.font)
+
+    def tearDown(self):
+        shutil.rmtree(self.tdir, ignore_errors=True)
+
+    def convert(self, workers):
+        output = os.path.join(self.tdir, 'out%d.epub' % workers)
+        cache_dir = os.path.join(self.tdir, 'cache')
+        plumber = Plumber(self.epub, output, logging.default_log)
+        plumber.merge_ui_recommendations([
+            ('subset_embedded_fonts', True, OptionRecommendation.HIGH),
+            ('subset_cache_dir', cache_dir, OptionRecommendation.HIGH),
+            ('transform_workers', workers, OptionRecommendation.HIGH)])
+        plumber.run()
+        with zipfile.ZipFile(output) as zf:
+            return {os.path.basename(name): zf.read(name)
+                    for name in zf.namelist() if name.endswith('.ttf')}
+
+    def check_output(self, fonts):
+        # Every font keeps only the characters it is used for, the unused
+        # one is removed
+        self.assertEqual(sorted(fonts), ['other.ttf', 'used.ttf'])
+        self.assertEqual(font_chars(fonts['used.ttf']),
+                         {ord('a'), ord('b')})
+        self.assertEqual(font_chars(fonts['other.ttf']),
+                         {ord('c'), ord('e')})
+
+    def test_subset_serial(self):
+        self.check_output(self.convert(1))
+        self.assertTrue(os.listdir(os.path.join(self.tdir, 'cache',
+                                                'fonts')))
+
+    def test_subset_parallel(self):
+        self.check_output(self.convert(2))
+
+
+def find_tests():
+    return unittest.defaultTestLoader.loadTestsFromTestCase(TestSubsetFonts)
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(find_tests())
@@ -15,7 +15,7 @@ __docformat__ = 'restructuredtext en'
 class Reader(FormatReader):
 
     def __init__(self, header, stream, log, options):
-        record0_size = len(header.section_data(0))
+        record0_size = len(header.section(0))
 
         if record0_size == 132:
             self.reader = Reader132(header, stream, log, options)
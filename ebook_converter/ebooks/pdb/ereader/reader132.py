@@ -52,9 +52,7 @@ class Reader132(FormatReader):
 
         self.log.debug('132 byte header version found.')
 
-        self.sections = []
-        for i in range(header.num_sections):
-            self.sections.append(header.section_data(i))
+        self.sections = header.sections()
 
         self.header_record = HeaderRecord(self.section_data(0))
 
@@ -68,7 +66,7 @@ class Reader132(FormatReader):
         self.mi = get_metadata(stream, False)
 
     def section_data(self, number):
-        return self.sections[number]
+        return bytes(self.sections[number])
 
     def decompress_text(self, number):
         if self.header_record.compression == 2:
@@ -34,9 +34,7 @@ class Reader202(FormatReader):
 
         self.log.debug('202 byte header version found.')
 
-        self.sections = []
-        for i in range(header.num_sections):
-            self.sections.append(header.section_data(i))
+        self.sections = header.sections()
 
         self.header_record = HeaderRecord(self.section_data(0))
 
@@ -47,7 +45,7 @@ class Reader202(FormatReader):
         self.mi = get_metadata(stream, False)
 
     def section_data(self, number):
-        return self.sections[number]
+        return bytes(self.sections[number])
 
     def decompress_text(self, number):
         from ebook_converter.ebooks.compression.palmdoc import decompress_doc
@@ -78,9 +78,7 @@ class Reader(FormatReader):
         self.stream = stream
         self.log = log
 
-        self.sections = []
-        for i in range(header.num_sections):
-            self.sections.append(header.section_data(i))
+        self.sections = header.sections()
 
         if header.ident == BPDB_IDENT:
             self.header_record = LegacyHeaderRecord(self.section_data(0))
@@ -107,7 +105,7 @@ class Reader(FormatReader):
         return mi
 
     def section_data(self, number):
-        return self.sections[number]
+        return bytes(self.sections[number])
 
     def decompress_text(self, number):
         return self.section_data(number).decode(self.encoding,
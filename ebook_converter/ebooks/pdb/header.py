@@ -2,9 +2,13 @@
 Read the header data from a pdb file.
 """
 
+import array
+import io
+import mmap
 import re
 import struct
 import time
+import weakref
 
 
 __license__ = 'GPL v3'
@@ -13,54 +17,127 @@ __docformat__ = 'restructuredtext en'
 
 
 class PdbHeaderReader(object):
+    """
+    Read the PDB header and the table of its records (sections). The file is
+    memory mapped (or read at once, for streams without a file descriptor),
+    the record table is parsed once into an array of offsets, and sections
+    are returned as memoryview slices of the mapped file, without seeking or
+    copying.
+
+    The sections are valid until close() is called, which releases them and
+    the mapping. The reader can be used as a context manager doing that.
+    """
 
     def __init__(self, stream):
         self.stream = stream
+        self.data = self._map(stream)
+        self.view = memoryview(self.data)
+        # Sections handed out, released on close(). Keyed by identity, as
+        # views with the same contents are equal.
+        self._views = weakref.WeakValueDictionary()
         self.ident = self.identity()
         self.num_sections = self.section_count()
         self.title = self.name()
+        self.offsets = self._section_offsets()
+
+    @staticmethod
+    def _map(stream):
+        try:
+            stream.seek(0, 2)
+            if stream.tell() > 0:
+                return mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, OSError, ValueError,
+                io.UnsupportedOperation):
+            pass
+        stream.seek(0)
+        return stream.read()
+
+    def close(self):
+        """
+        Release all the sections and close the memory mapped file.
+        """
+        if self.view is None:
+            return
+        for view in list(self._views.values()):
+            view.release()
+        self._views.clear()
+        self.view.release()
+        self.view = None
+        if isinstance(self.data, mmap.mmap):
+            try:
+                self.data.close()
+            except BufferError:
+                # Views of the sections created by someone else are still
+                # alive, the mapping is closed once they are gone
+                pass
+        self.data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _section_offsets(self):
+        """
+        Return array of start offsets of all the sections, followed by the
+        end of the file.
+        """
+        if 78 + self.num_sections * 8 > len(self.data):
+            raise ValueError('Truncated PDB record table')
+        entries = struct.unpack_from('>%dL' % (self.num_sections * 2),
+                                     self.data, 78)
+        offsets = array.array('L', entries[::2])
+        offsets.append(len(self.data))
+        return offsets
 
     def identity(self):
-        self.stream.seek(60)
-        ident = self.stream.read(8)
-        return ident.decode('utf-8')
+        return bytes(self.view[60:68]).decode('utf-8')
 
     def section_count(self):
-        self.stream.seek(76)
-        return struct.unpack('>H', self.stream.read(2))[0]
+        return struct.unpack_from('>H', self.data, 76)[0]
 
     def name(self):
-        self.stream.seek(0)
-        return re.sub(b'[^-A-Za-z0-9 ]+', b'_', self.stream.read(32).replace(b'\x00', b''))
+        return re.sub(b'[^-A-Za-z0-9 ]+', b'_',
+                      bytes(self.view[0:32]).replace(b'\x00', b''))
 
-    def full_section_info(self, number):
+    def _check_number(self, number):
         if not (0 <= number < self.num_sections):
             raise ValueError('Not a valid section number %i' % number)
 
-        self.stream.seek(78 + number * 8)
-        offset, a1, a2, a3, a4 = struct.unpack('>LBBBB', self.stream.read(8))[0]
+    def full_section_info(self, number):
+        self._check_number(number)
+        offset, a1, a2, a3, a4 = struct.unpack_from('>LBBBB', self.data,
+                                                    78 + number * 8)
         flags, val = a1, a2 << 16 | a3 << 8 | a4
         return (offset, flags, val)
 
     def section_offset(self, number):
-        if not (0 <= number < self.num_sections):
-            raise ValueError('Not a valid section number %i' % number)
-
-        self.stream.seek(78 + number * 8)
-        return struct.unpack('>LBBBB', self.stream.read(8))[0]
+        self._check_number(number)
+        return self.offsets[number]
+
+    def section(self, number):
+        """
+        Return data of the section as a memoryview of the file.
+        """
+        self._check_number(number)
+        view = self.view[self.offsets[number]:self.offsets[number + 1]]
+        self._views[id(view)] = view
+        return view
+
+    def sections(self):
+        """
+        Return list of data of all the sections, as memoryviews of the file.
+        """
+        offsets, view = self.offsets, self.view
+        views = [view[offsets[i]:offsets[i + 1]]
+                 for i in range(self.num_sections)]
+        self._views.update((id(view), view) for view in views)
+        return views
 
     def section_data(self, number):
-        if not (0 <= number < self.num_sections):
-            raise ValueError('Not a valid section number %i' % number)
-
-        start = self.section_offset(number)
-        if number == self.num_sections -1:
-            self.stream.seek(0, 2)
-            end = self.stream.tell()
-        else:
-            end = self.section_offset(number + 1)
-        self.stream.seek(start)
-        return self.stream.read(end - start)
+        self._check_number(number)
+        return bytes(self.view[self.offsets[number]:self.offsets[number + 1]])
 
 
 class PdbHeaderBuilder(object):
@@ -33,9 +33,7 @@ class Reader(FormatReader):
         self.log = log
         self.options = options
 
-        self.sections = []
-        for i in range(header.num_sections):
-            self.sections.append(header.section_data(i))
+        self.sections = header.sections()
 
         self.header_record = HeaderRecord(self.section_data(0))
 
@@ -51,12 +49,16 @@ class Reader(FormatReader):
         return b''
 
     def extract_content(self, output_dir):
-        raw_txt = b''
-
         self.log.info('Decompressing text...')
-        for i in range(1, self.header_record.num_records + 1):
-            self.log.debug('\tDecompressing text section %i', i)
-            raw_txt += self.decompress_text(i)
+        sections = range(1, self.header_record.num_records + 1)
+        if self.header_record.compression in (2, 258):
+            from ebook_converter.ebooks.compression.palmdoc import \
+                decompress_docs
+            raw_txt = b''.join(decompress_docs(
+                (self.section_data(i) for i in sections),
+                workers=getattr(self.options, 'transform_workers', 1)))
+        else:
+            raw_txt = b''.join(self.decompress_text(i) for i in sections)
 
         self.log.info('Converting text to OEB...')
         stream = io.BytesIO(raw_txt)
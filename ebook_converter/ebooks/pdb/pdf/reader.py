@@ -25,7 +25,7 @@ class Reader(FormatReader):
         pdf.close()
         pdf = open(pdf, 'wb')
         for x in range(self.header.section_count()):
-            pdf.write(self.header.section_data(x))
+            pdf.write(self.header.section(x))
         pdf.close()
 
         from ebook_converter.customize.ui import plugin_for_input_format
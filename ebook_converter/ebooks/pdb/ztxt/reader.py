@@ -39,9 +39,7 @@ class Reader(FormatReader):
         self.log = log
         self.options = options
 
-        self.sections = []
-        for i in range(header.num_sections):
-            self.sections.append(header.section_data(i))
+        self.sections = header.sections()
 
         self.header_record = HeaderRecord(self.section_data(0))
 
@@ -1,10 +1,127 @@
+"""
+Files passed between the passes of the parser.
+
+Every pass reads the whole document and writes it anew into a temporary
+file. Unless spilling to disk is requested (for debugging), those files are
+kept in memory: names returned by mktemp() refer to encoded contents held
+in a dictionary, which open_for_read() and open_for_write() serve instead of
+the files on disk. Renaming such a file only moves the reference to its
+contents.
+"""
 import io
+import itertools
+import os
+import shutil
+
+from ebook_converter.ptempfile import better_mktemp
+
+
+# Prefix of names of the in-memory files
+MEMORY_PREFIX = 'rtf2xml-memory:'
+
+_memory_files = {}
+_counter = itertools.count()
+_spill = False
+
+
+def spill_to_disk(spill):
+    """
+    Make the following mktemp() calls return real temporary files if spill
+    is true, names of in-memory files otherwise.
+    """
+    global _spill
+    _spill = bool(spill)
+
+
+def mktemp():
+    """
+    Return name of a new temporary file.
+    """
+    if _spill:
+        return better_mktemp()
+    name = '%s%d' % (MEMORY_PREFIX, next(_counter))
+    _memory_files[name] = b''
+    return name
+
+
+def in_memory(path):
+    return isinstance(path, str) and path.startswith(MEMORY_PREFIX)
+
+
+def clear_memory():
+    """
+    Drop all in-memory files.
+    """
+    _memory_files.clear()
+
+
+class _MemoryBuffer(io.BytesIO):
+    """
+    Contents of in-memory file being written, stored when closed.
+    """
+
+    def __init__(self, name, initial=b''):
+        io.BytesIO.__init__(self, initial)
+        self.seek(0, io.SEEK_END)
+        self.memory_name = name
+
+    def close(self):
+        if not self.closed:
+            _memory_files[self.memory_name] = self.getvalue()
+        io.BytesIO.close(self)
+
+
+def _read_memory(path):
+    try:
+        return _memory_files[path]
+    except KeyError:
+        raise FileNotFoundError('No such in-memory file: %r' % path)
 
 
 def open_for_read(path):
+    if in_memory(path):
+        # Decoded exactly as the files on disk are
+        return io.TextIOWrapper(io.BytesIO(_read_memory(path)),
+                                encoding='utf-8', errors='replace')
     return io.open(path, encoding='utf-8', errors='replace')
 
 
+def open_for_read_binary(path):
+    if in_memory(path):
+        return io.BytesIO(_read_memory(path))
+    return io.open(path, 'rb')
+
+
 def open_for_write(path, append=False):
+    if in_memory(path):
+        raw = _MemoryBuffer(path, _memory_files.get(path, b'') if append
+                            else b'')
+        # Encoded exactly as into the files on disk
+        return io.TextIOWrapper(io.BufferedWriter(raw), encoding='utf-8',
+                                errors='replace', newline='')
     mode = 'a' if append else 'w'
     return io.open(path, mode, encoding='utf-8', errors='replace', newline='')
+
+
+def copy_file(source, dest):
+    """
+    Copy file source to dest, either of which may be in memory.
+    """
+    if in_memory(dest):
+        if in_memory(source):
+            _memory_files[dest] = _read_memory(source)
+        else:
+            with io.open(source, 'rb') as read_obj:
+                _memory_files[dest] = read_obj.read()
+    elif in_memory(source):
+        with io.open(dest, 'wb') as write_obj:
+            write_obj.write(_read_memory(source))
+    else:
+        shutil.copyfile(source, dest)
+
+
+def remove(path):
+    if in_memory(path):
+        _memory_files.pop(path, None)
+    else:
+        os.remove(path)
@@ -11,11 +11,10 @@
 #                                                                       #
 #                                                                       #
 #########################################################################
-import sys, os
+import sys
 
 from ebook_converter.ebooks.rtf2xml import copy, check_brackets
-from ebook_converter.ptempfile import better_mktemp
-from . import open_for_read, open_for_write
+from . import open_for_read, open_for_write, mktemp, remove
 
 
 class AddBrackets:
@@ -45,7 +44,7 @@ class AddBrackets:
         self.__file = in_file
         self.__bug_handler = bug_handler
         self.__copy = copy
-        self.__write_to = better_mktemp()
+        self.__write_to = mktemp()
         self.__run_level = run_level
         self.__state_dict = {
             'before_body'           : self.__before_body_func,
@@ -227,4 +226,4 @@ class AddBrackets:
                 sys.stderr.write(
                     'Sorry, but this files has a mix of old and new RTF.\n'
                     'Some characteristics cannot be converted.\n')
-        os.remove(self.__write_to)
+        remove(self.__write_to)
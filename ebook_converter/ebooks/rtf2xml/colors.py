@@ -10,11 +10,10 @@
 #                                                                       #
 #                                                                       #
 #########################################################################
-import sys, os, re
+import sys, re
 
 from ebook_converter.ebooks.rtf2xml import copy
-from ebook_converter.ptempfile import better_mktemp
-from . import open_for_read, open_for_write
+from . import open_for_read, open_for_write, mktemp, remove
 
 
 class Colors:
@@ -42,7 +41,7 @@ class Colors:
         self.__copy = copy
         self.__bug_handler = bug_handler
         self.__line = 0
-        self.__write_to = better_mktemp()
+        self.__write_to = mktemp()
         self.__run_level = run_level
 
     def __initiate_values(self):
@@ -254,4 +253,4 @@ class Colors:
         if self.__copy:
             copy_obj.copy_file(self.__write_to, "color.data")
         copy_obj.rename(self.__write_to, self.__file)
-        os.remove(self.__write_to)
+        remove(self.__write_to)
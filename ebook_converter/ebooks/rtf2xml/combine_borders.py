@@ -10,11 +10,8 @@
 #                                                                       #
 #                                                                       #
 #########################################################################
-import os
-
 from ebook_converter.ebooks.rtf2xml import copy
-from ebook_converter.ptempfile import better_mktemp
-from . import open_for_read, open_for_write
+from . import open_for_read, open_for_write, mktemp, remove
 
 
 class CombineBorders:
@@ -29,7 +26,7 @@ class CombineBorders:
         self.__file = in_file
         self.__bug_handler = bug_handler
         self.__copy = copy
-        self.__write_to = better_mktemp()
+        self.__write_to = mktemp()
         self.__state = 'default'
         self.__bord_pos = 'default'
         self.__bord_att = []
@@ -89,4 +86,4 @@ class CombineBorders:
         if self.__copy:
             copy_obj.copy_file(self.__write_to, "combine_borders.data")
         copy_obj.rename(self.__write_to, self.__file)
-        os.remove(self.__write_to)
+        remove(self.__write_to)
@@ -10,7 +10,9 @@
 #                                                                       #
 #                                                                       #
 #########################################################################
-import os, shutil
+import os
+
+from . import copy_file
 
 
 class Copy:
@@ -51,12 +53,11 @@ class Copy:
 
     def copy_file(self, file, new_file):
         """
-        Copy the file to a new name
-        If the platform is linux, use the faster linux command
-        of cp. Otherwise, use a safe python method.
+        Copy the file (which may be kept in memory) to a new name in the
+        debug directory.
         """
         write_file = os.path.join(Copy.__dir,new_file)
-        shutil.copyfile(file, write_file)
+        copy_file(file, write_file)
 
     def rename(self, source, dest):
-        shutil.copyfile(source, dest)
+        copy_file(source, dest)
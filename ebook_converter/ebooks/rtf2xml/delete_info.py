@@ -10,11 +10,10 @@
 #                                                                       #
 #                                                                       #
 #########################################################################
-import sys, os
+import sys
 
 from ebook_converter.ebooks.rtf2xml import copy
-from ebook_converter.ptempfile import better_mktemp
-from . import open_for_read, open_for_write
+from . import open_for_read, open_for_write, mktemp, remove
 
 
 class DeleteInfo:
@@ -29,7 +28,7 @@ class DeleteInfo:
         self.__file = in_file
         self.__bug_handler = bug_handler
         self.__copy = copy
-        self.__write_to = better_mktemp()
+        self.__write_to = mktemp()
         self.__run_level = run_level
         self.__initiate_allow()
         self.__bracket_count= 0
@@ -207,5 +206,5 @@ class DeleteInfo:
         if self.__copy:
             copy_obj.copy_file(self.__write_to, "delete_info.data")
         copy_obj.rename(self.__write_to, self.__file)
-        os.remove(self.__write_to)
+        remove(self.__write_to)
         return self.__found_delete
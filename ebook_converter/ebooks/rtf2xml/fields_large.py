@@ -10,10 +10,9 @@
 #                                                                       #
 #                                                                       #
 #########################################################################
-import sys, os
+import sys
 from ebook_converter.ebooks.rtf2xml import field_strings, copy
-from ebook_converter.ptempfile import better_mktemp
-from . import open_for_read, open_for_write
+from . import open_for_read, open_for_write, mktemp, remove
 
 
 class FieldsLarge:
@@ -111,7 +110,7 @@ Examples
         self.__bug_handler = bug_handler
         self.__copy = copy
         self.__run_level = run_level
-        self.__write_to = better_mktemp()
+        self.__write_to = mktemp()
 
     def __initiate_values(self):
         """
@@ -374,4 +373,4 @@ Examples
         if self.__copy:
             copy_obj.copy_file(self.__write_to, "fields_large.data")
         copy_obj.rename(self.__write_to, self.__file)
-        os.remove(self.__write_to)
+        remove(self.__write_to)
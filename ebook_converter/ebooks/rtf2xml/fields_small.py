@@ -10,11 +10,10 @@
 #                                                                       #
 #                                                                       #
 #########################################################################
-import sys, os, re
+import sys, re
 
 from ebook_converter.ebooks.rtf2xml import field_strings, copy
-from ebook_converter.ptempfile import better_mktemp
-from . import open_for_read, open_for_write
+from . import open_for_read, open_for_write, mktemp, remove
 
 
 class FieldsSmall:
@@ -54,7 +53,7 @@ file.
         self.__file = in_file
         self.__bug_handler = bug_handler
         self.__copy = copy
-        self.__write_to = better_mktemp()
+        self.__write_to = mktemp()
         self.__run_level = run_level
 
     def __initiate_values(self):
@@ -456,4 +455,4 @@ file.
         if self.__copy:
             copy_obj.copy_file(self.__write_to, "fields_small.data")
         copy_obj.rename(self.__write_to, self.__file)
-        os.remove(self.__write_to)
+        remove(self.__write_to)
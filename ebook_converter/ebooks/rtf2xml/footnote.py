@@ -10,12 +10,9 @@
 #                                                                       #
 #                                                                       #
 #########################################################################
-import os
-
 from ebook_converter.ebooks.rtf2xml import copy
-from ebook_converter.ptempfile import better_mktemp
 
-from . import open_for_read, open_for_write
+from . import open_for_read, open_for_write, mktemp, remove
 
 
 class Footnote:
@@ -35,7 +32,7 @@ class Footnote:
         self.__file = in_file
         self.__bug_handler = bug_handler
         self.__copy = copy
-        self.__write_to = better_mktemp()
+        self.__write_to = mktemp()
         self.__found_a_footnote = 0
 
     def __first_line_func(self, line):
@@ -119,7 +116,7 @@ class Footnote:
         bottom of the main file.
         """
         self.__initiate_sep_values()
-        self.__footnote_holder = better_mktemp()
+        self.__footnote_holder = mktemp()
         with open_for_read(self.__file) as read_obj:
             with open_for_write(self.__write_to) as self.__write_obj:
                 with open_for_write(self.__footnote_holder) as self.__write_to_foot_obj:
@@ -149,12 +146,12 @@ class Footnote:
                     write_obj.write(line)
                 write_obj.write(
                 'mi<mk<footnt-end\n')
-        os.remove(self.__footnote_holder)
+        remove(self.__footnote_holder)
         copy_obj = copy.Copy(bug_handler=self.__bug_handler)
         if self.__copy:
             copy_obj.copy_file(self.__write_to, "footnote_separate.data")
         copy_obj.rename(self.__write_to, self.__file)
-        os.remove(self.__write_to)
+        remove(self.__write_to)
 
     def update_info(self, file, copy):
         """
@@ -248,7 +245,7 @@ class Footnote:
         """
         if not self.__found_a_footnote:
             return
-        self.__write_to2 = better_mktemp()
+        self.__write_to2 = mktemp()
         self.__state = 'body'
         self.__get_footnotes()
         self.__join_from_temp()
@@ -258,5 +255,5 @@ class Footnote:
         if self.__copy:
             copy_obj.copy_file(self.__write_to2, "footnote_joined.data")
         copy_obj.rename(self.__write_to2, self.__file)
-        os.remove(self.__write_to2)
-        os.remove(self.__footnote_holder)
+        remove(self.__write_to2)
+        remove(self.__footnote_holder)
@@ -10,6 +10,42 @@
 #                                                                       #
 #                                                                       #
 #########################################################################
+import functools
+import io
+
+
+def parse_char_map(char_set, map):
+    """
+    Return dictionary of the map from the text of char_set, or None if there
+    is no such map. Lines from the first one containing <map> up to the one
+    containing </map> are split into NAME:token:code:entity fields, and
+    tokens are mapped to entities (with the line endings).
+    """
+    begin = char_set.find('<%s>' % map)
+    if begin == -1:
+        return None
+    start = char_set.find('\n', begin) + 1
+    if start == 0:
+        return {}
+    end = char_set.find('</%s>' % map, start)
+    end = len(char_set) if end == -1 else char_set.rfind('\n', 0, end) + 1
+    map_dict = {}
+    for line in io.StringIO(char_set[start:end]):
+        if not line.strip():
+            continue
+        fields = line.split(':')
+        map_dict[fields[1]] = fields[3]
+    return map_dict
+
+
+@functools.lru_cache(maxsize=None)
+def builtin_char_map(map):
+    """
+    Return dictionary of the map from char_set module, compiled on first
+    use. The dictionary is shared, it must not be modified.
+    """
+    from ebook_converter.ebooks.rtf2xml.char_set import char_set
+    return parse_char_map(char_set, map)
 
 
 class GetCharMap:
@@ -19,12 +55,13 @@ class GetCharMap:
 
     """
 
-    def __init__(self, bug_handler, char_file):
+    def __init__(self, bug_handler, char_file=None):
         """
 
         Required:
 
-            'char_file'--the file with the mappings
+            'char_file'--the file with the mappings, the maps from char_set
+            module are used if it is None
 
         Returns:
 
@@ -37,25 +74,12 @@ class GetCharMap:
     def get_char_map(self, map):
         # if map == 'ansicpg10000':
         #   map = 'mac_roman'
-        found_map = False
-        map_dict = {}
-        self.__char_file.seek(0)
-        for line in self.__char_file:
-            if not line.strip():
-                continue
-            begin_element = '<%s>' % map
-            end_element = '</%s>' % map
-            if not found_map:
-                if begin_element in line:
-                    found_map = True
-            else:
-                if end_element in line:
-                    break
-                fields = line.split(':')
-                fields[1].replace('\\colon', ':')
-                map_dict[fields[1]] = fields[3]
-
-        if not found_map:
+        if self.__char_file is None:
+            map_dict = builtin_char_map(map)
+        else:
+            self.__char_file.seek(0)
+            map_dict = parse_char_map(self.__char_file.read(), map)
+        if map_dict is None:
             msg = 'no map found\nmap is "%s"\n'%(map,)
             raise self.__bug_handler(msg)
-        return map_dict
+        return dict(map_dict)
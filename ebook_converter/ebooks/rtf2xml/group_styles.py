@@ -10,10 +10,9 @@
 #                                                                       #
 #                                                                       #
 #########################################################################
-import sys, os,  re
+import sys, re
 from ebook_converter.ebooks.rtf2xml import copy
-from ebook_converter.ptempfile import better_mktemp
-from . import open_for_read, open_for_write
+from . import open_for_read, open_for_write, mktemp, remove
 
 
 class GroupStyles:
@@ -45,7 +44,7 @@ class GroupStyles:
         self.__bug_handler = bug_handler
         self.__copy = copy
         self.__run_level = run_level
-        self.__write_to =  better_mktemp()
+        self.__write_to =  mktemp()
         self.__wrap = wrap
 
     def __initiate_values(self):
@@ -248,4 +247,4 @@ class GroupStyles:
         if self.__copy:
             copy_obj.copy_file(self.__write_to, "group_styles.data")
         copy_obj.rename(self.__write_to, self.__file)
-        os.remove(self.__write_to)
+        remove(self.__write_to)
@@ -10,11 +10,10 @@
 #                                                                       #
 #                                                                       #
 #########################################################################
-import sys, os
+import sys
 
 from ebook_converter.ebooks.rtf2xml import copy
-from ebook_converter.ptempfile import better_mktemp
-from . import open_for_read, open_for_write
+from . import open_for_read, open_for_write, mktemp, remove
 
 
 class Header:
@@ -34,7 +33,7 @@ class Header:
         self.__file = in_file
         self.__bug_handler = bug_handler
         self.__copy = copy
-        self.__write_to = better_mktemp()
+        self.__write_to = mktemp()
         self.__found_a_header = False
 
     def __in_header_func(self, line):
@@ -120,7 +119,7 @@ class Header:
         bottom of the main file.
         """
         self.__initiate_sep_values()
-        self.__header_holder = better_mktemp()
+        self.__header_holder = mktemp()
         with open_for_read(self.__file) as read_obj:
             with open_for_write(self.__write_to) as self.__write_obj:
                 with open_for_write(self.__header_holder) as self.__write_to_head_obj:
@@ -146,13 +145,13 @@ class Header:
                     write_obj.write(line)
                 write_obj.write(
                 'mi<mk<header-end\n')
-        os.remove(self.__header_holder)
+        remove(self.__header_holder)
 
         copy_obj = copy.Copy(bug_handler=self.__bug_handler)
         if self.__copy:
             copy_obj.copy_file(self.__write_to, "header_separate.data")
         copy_obj.rename(self.__write_to, self.__file)
-        os.remove(self.__write_to)
+        remove(self.__write_to)
 
     def update_info(self, file, copy):
         """
@@ -246,7 +245,7 @@ class Header:
         """
         if not self.__found_a_header:
             return
-        self.__write_to2 = better_mktemp()
+        self.__write_to2 = mktemp()
         self.__state = 'body'
         self.__get_headers()
         self.__join_from_temp()
@@ -256,5 +255,5 @@ class Header:
         if self.__copy:
             copy_obj.copy_file(self.__write_to, "header_join.data")
         copy_obj.rename(self.__write_to, self.__file)
-        os.remove(self.__write_to)
-        os.remove(self.__header_holder)
+        remove(self.__write_to)
+        remove(self.__header_holder)
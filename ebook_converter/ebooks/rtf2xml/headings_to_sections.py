@@ -10,10 +10,9 @@
 #                                                                       #
 #                                                                       #
 #########################################################################
-import os, re
+import re
 from ebook_converter.ebooks.rtf2xml import copy
-from ebook_converter.ptempfile import better_mktemp
-from . import open_for_read, open_for_write
+from . import open_for_read, open_for_write, mktemp, remove
 
 
 class HeadingsToSections:
@@ -39,7 +38,7 @@ class HeadingsToSections:
         self.__file = in_file
         self.__bug_handler = bug_handler
         self.__copy = copy
-        self.__write_to = better_mktemp()
+        self.__write_to = mktemp()
 
     def __initiate_values(self):
         """
@@ -223,4 +222,4 @@ class HeadingsToSections:
         if self.__copy:
             copy_obj.copy_file(self.__write_to, "sections_to_headings.data")
         copy_obj.rename(self.__write_to, self.__file)
-        os.remove(self.__write_to)
+        remove(self.__write_to)
@@ -10,13 +10,11 @@
 #                                                                       #
 #                                                                       #
 #########################################################################
-import sys, os, io
+import sys
 
 from ebook_converter.ebooks.rtf2xml import get_char_map, copy
-from ebook_converter.ebooks.rtf2xml.char_set import char_set
-from ebook_converter.ptempfile import better_mktemp
 
-from . import open_for_read, open_for_write
+from . import open_for_read, open_for_write, mktemp, remove
 
 
 class Hex2Utf8:
@@ -78,7 +76,7 @@ class Hex2Utf8:
         self.__convert_wingdings = 0
         self.__convert_zapf = 0
         self.__run_level = run_level
-        self.__write_to = better_mktemp()
+        self.__write_to = mktemp()
         self.__bug_handler = bug_handler
         self.__invalid_rtf_handler = invalid_rtf_handler
 
@@ -150,9 +148,8 @@ class Hex2Utf8:
         # 128, and the encoding system for Microsoft characters.
         # New on 2004-05-8: the self.__char_map is not in directory with other
         # modules
-        self.__char_file = io.StringIO(char_set)
+        # The maps of char_set module are compiled once per process
         char_map_obj =  get_char_map.GetCharMap(
-                char_file=self.__char_file,
                 bug_handler=self.__bug_handler,
                 )
         up_128_dict = char_map_obj.get_char_map(map=self.__default_char_map)
@@ -298,7 +295,7 @@ class Hex2Utf8:
         if self.__copy:
             copy_obj.copy_file(self.__write_to, "preamble_utf_convert.data")
         copy_obj.rename(self.__write_to, self.__file)
-        os.remove(self.__write_to)
+        remove(self.__write_to)
 
     def __preamble_for_body_func(self, line):
         """
@@ -556,7 +553,7 @@ class Hex2Utf8:
         if self.__copy:
             copy_obj.copy_file(self.__write_to, "body_utf_convert.data")
         copy_obj.rename(self.__write_to, self.__file)
-        os.remove(self.__write_to)
+        remove(self.__write_to)
 
     def convert_hex_2_utf8(self):
         self.__initiate_values()
@@ -10,11 +10,9 @@
 #                                                                       #
 #                                                                       #
 #########################################################################
-import os
-
 from ebook_converter.ebooks.rtf2xml import copy
 from ebook_converter.utils.cleantext import clean_ascii_chars
-from ebook_converter.ptempfile import better_mktemp
+from . import open_for_read, open_for_write, mktemp, remove
 
 
 class FixLineEndings:
@@ -31,25 +29,25 @@ class FixLineEndings:
         self.__bug_handler = bug_handler
         self.__copy = copy
         self.__run_level = run_level
-        self.__write_to = better_mktemp()
+        self.__write_to = mktemp()
         self.__replace_illegals = replace_illegals
 
     def fix_endings(self):
         # read
-        with open(self.__file, 'rb') as read_obj:
+        with open_for_read(self.__file) as read_obj:
             input_file = read_obj.read()
         # calibre go from win and mac to unix
-        input_file = input_file.replace(b'\r\n', b'\n')
-        input_file = input_file.replace(b'\r', b'\n')
+        input_file = input_file.replace('\r\n', '\n')
+        input_file = input_file.replace('\r', '\n')
         # remove ASCII invalid chars : 0 to 8 and 11-14 to 24-26-27
         if self.__replace_illegals:
             input_file = clean_ascii_chars(input_file)
         # write
-        with open(self.__write_to, 'wb') as write_obj:
+        with open_for_write(self.__write_to) as write_obj:
             write_obj.write(input_file)
         # copy
         copy_obj = copy.Copy(bug_handler=self.__bug_handler)
         if self.__copy:
             copy_obj.copy_file(self.__write_to, "line_endings.data")
         copy_obj.rename(self.__write_to, self.__file)
-        os.remove(self.__write_to)
+        remove(self.__write_to)
@@ -10,12 +10,11 @@
 #                                                                       #
 #                                                                       #
 #########################################################################
-import sys, os, re
+import sys, re
 
 from ebook_converter.ebooks.rtf2xml import copy
-from ebook_converter.ptempfile import better_mktemp
 
-from . import open_for_read, open_for_write
+from . import open_for_read, open_for_write, mktemp, remove
 
 
 class MakeLists:
@@ -52,7 +51,7 @@ class MakeLists:
         self.__no_headings_as_list = no_headings_as_list
         self.__headings_to_sections = headings_to_sections
         self.__copy = copy
-        self.__write_to = better_mktemp()
+        self.__write_to = mktemp()
         self.__list_of_lists = list_of_lists
         self.__write_list_info = write_list_info
 
@@ -460,4 +459,4 @@ class MakeLists:
         if self.__copy:
             copy_obj.copy_file(self.__write_to, "make_lists.data")
         copy_obj.rename(self.__write_to, self.__file)
-        os.remove(self.__write_to)
+        remove(self.__write_to)
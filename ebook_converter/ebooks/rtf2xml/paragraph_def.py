@@ -10,12 +10,11 @@
 #                                                                       #
 #                                                                       #
 #########################################################################
-import sys, os
+import sys
 
 from ebook_converter.ebooks.rtf2xml import copy, border_parse
-from ebook_converter.ptempfile import better_mktemp
 
-from . import open_for_read, open_for_write
+from . import open_for_read, open_for_write, mktemp, remove
 
 
 class ParagraphDef:
@@ -75,7 +74,7 @@ if another paragraph_def is found, the state changes to collect_tokens.
         self.__default_font = default_font
         self.__copy = copy
         self.__run_level = run_level
-        self.__write_to = better_mktemp()
+        self.__write_to = mktemp()
 
     def __initiate_values(self):
         """
@@ -757,5 +756,5 @@ if another paragraph_def is found, the state changes to collect_tokens.
         if self.__copy:
             copy_obj.copy_file(self.__write_to, "paragraphs_def.data")
         copy_obj.rename(self.__write_to, self.__file)
-        os.remove(self.__write_to)
+        remove(self.__write_to)
         return self.__body_style_strings
@@ -10,12 +10,11 @@
 #                                                                       #
 #                                                                       #
 #########################################################################
-import os, re
+import re
 
 from ebook_converter.ebooks.rtf2xml import copy, check_brackets
-from ebook_converter.ptempfile import better_mktemp
 
-from . import open_for_read, open_for_write
+from . import open_for_read, open_for_write, mktemp, remove
 
 
 class ProcessTokens:
@@ -36,7 +35,7 @@ class ProcessTokens:
         self.__bug_handler = bug_handler
         self.__copy = copy
         self.__run_level = run_level
-        self.__write_to = better_mktemp()
+        self.__write_to = mktemp()
         self.initiate_token_dict()
         # self.initiate_token_actions()
         self.compile_expressions()
@@ -825,7 +824,7 @@ class ProcessTokens:
         if self.__copy:
             copy_obj.copy_file(self.__write_to, "processed_tokens.data")
         copy_obj.rename(self.__write_to, self.__file)
-        os.remove(self.__write_to)
+        remove(self.__write_to)
 
         bad_brackets = self.__check_brackets(self.__file)
         if bad_brackets:
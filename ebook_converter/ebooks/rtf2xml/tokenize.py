@@ -10,12 +10,11 @@
 #                                                                       #
 #                                                                       #
 #########################################################################
-import os, re
+import re
 
 from ebook_converter.ebooks.rtf2xml import copy
 from ebook_converter.utils.mreplace import MReplace
-from ebook_converter.ptempfile import better_mktemp
-from . import open_for_read, open_for_write
+from . import open_for_read, open_for_write, mktemp, remove
 
 
 class Tokenize:
@@ -31,7 +30,7 @@ class Tokenize:
         self.__file = in_file
         self.__bug_handler = bug_handler
         self.__copy = copy
-        self.__write_to = better_mktemp()
+        self.__write_to = mktemp()
         # self.__write_to = out_file
         self.__compile_expressions()
         # variables
@@ -194,7 +193,7 @@ class Tokenize:
         if self.__copy:
             copy_obj.copy_file(self.__write_to, "tokenize.data")
         copy_obj.rename(self.__write_to, self.__file)
-        os.remove(self.__write_to)
+        remove(self.__write_to)
 
         # self.__special_tokens = [ '_', '~', "'", '{', '}' ]
 
@@ -44,6 +44,8 @@ class Unihandecoder(object):
                 text = text.decode(self.preferred_encoding)
             except Exception:
                 text = text.decode('utf-8', 'replace')
+        if text.isascii():
+            return text
         # at first unicode normalize it. (see Unicode standards)
         ntext = unicodedata.normalize('NFKC', text)
         return self.decoder.decode(ntext)
@@ -0,0 +1,170 @@
+"""
+Transliteration tables compiled into files loaded lazily per block.
+
+The tables in the *codepoints modules map blocks of 256 code points to lists
+of replacements. Importing them materializes all the blocks, so on first use
+every table is compiled into a file in the cache directory, holding an index
+of blocks followed by the blocks themselves. Only the index is read when the
+table is opened, blocks are read when a character from them is translated for
+the first time.
+
+Tables are mappings of code points to replacements, usable with
+str.translate().
+"""
+import json
+import os
+import re
+import struct
+import tempfile
+
+from ebook_converter import logging
+
+
+LOG = logging.default_log
+
+# Bump when the format of the compiled files changes
+CACHE_VERSION = 1
+MAGIC = b'UHDT'
+HEADER = struct.Struct('<4sIQI')
+INDEX_ENTRY = struct.Struct('<III')
+# Replacement of characters missing in the tables
+MISSING = '?'
+
+_non_ascii = re.compile('[^\x00-\x7f]+')
+_tables = {}
+
+
+def _source_path(module):
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        module + '.py')
+
+
+def _source_stamp(module):
+    try:
+        st = os.stat(_source_path(module))
+    except OSError:
+        return 0
+    return (st.st_mtime_ns ^ (st.st_size << 40)) & 0xffffffffffffffff
+
+
+def _load_module_blocks(module):
+    import importlib
+    mod = importlib.import_module('ebook_converter.ebooks.unihandecode.' +
+                                  module)
+    # Groups are named like 'x4e' and 'x200', after the code point >> 8
+    return {int(name[1:], 16): block
+            for name, block in mod.CODEPOINTS.items()}
+
+
+def compile_table(module, path):
+    """
+    Compile the CODEPOINTS dictionary of module into file at path.
+    """
+    blocks = _load_module_blocks(module)
+    data, index = [], []
+    offset = 0
+    for number in sorted(blocks):
+        raw = json.dumps(blocks[number], ensure_ascii=False,
+                         separators=(',', ':')).encode('utf-8')
+        index.append(INDEX_ENTRY.pack(number, offset, len(raw)))
+        data.append(raw)
+        offset += len(raw)
+    dirname = os.path.dirname(path)
+    os.makedirs(dirname, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dirname)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, CACHE_VERSION, _source_stamp(module),
+                            len(index)))
+        f.write(b''.join(index))
+        f.write(b''.join(data))
+    os.replace(tmp, path)
+
+
+class BlockFile(object):
+    """
+    Blocks of one compiled table. If the table cannot be compiled into a
+    file, the module is loaded into memory instead.
+    """
+
+    def __init__(self, module):
+        from ebook_converter.ptempfile import cache_dir
+        self.module = module
+        self.path = os.path.join(cache_dir(), 'ebook-converter-unihandecode',
+                                 module + '.bin')
+        self.blocks = None
+        self.index = None
+        try:
+            self.index = self._read_index()
+        except (OSError, ValueError, struct.error):
+            try:
+                compile_table(module, self.path)
+                self.index = self._read_index()
+            except (OSError, ValueError, struct.error) as exc:
+                LOG.debug('Unable to use compiled table %s: %s', module, exc)
+                self.blocks = _load_module_blocks(module)
+
+    def _read_index(self):
+        with open(self.path, 'rb') as f:
+            magic, version, stamp, count = HEADER.unpack(
+                f.read(HEADER.size))
+            if (magic != MAGIC or version != CACHE_VERSION or
+                    stamp != _source_stamp(self.module)):
+                raise ValueError('Outdated compiled table')
+            raw = f.read(INDEX_ENTRY.size * count)
+        start = HEADER.size + len(raw)
+        return {number: (start + offset, size) for number, offset, size in
+                INDEX_ENTRY.iter_unpack(raw)}
+
+    def get(self, number):
+        """
+        Return list of replacements of the block, or None.
+        """
+        if self.blocks is not None:
+            return self.blocks.get(number)
+        try:
+            offset, size = self.index[number]
+        except KeyError:
+            return None
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.read(size).decode('utf-8'))
+
+
+def block_file(module):
+    try:
+        return _tables[module]
+    except KeyError:
+        ans = _tables[module] = BlockFile(module)
+        return ans
+
+
+class Table(dict):
+    """
+    Mapping of code points to their replacements from the tables of given
+    modules, blocks of later ones replacing those of the former ones. Blocks
+    are loaded when a code point from them is looked up for the first time.
+    """
+
+    def __init__(self, *modules):
+        dict.__init__(self, ((x, x) for x in range(128)))
+        self.files = [block_file(module) for module in modules]
+
+    def __missing__(self, codepoint):
+        number = codepoint >> 8
+        block = ()
+        for f in self.files:
+            block = f.get(number) or block
+        start = number << 8
+        for i in range(256):
+            if start + i not in self:
+                self[start + i] = block[i] if i < len(block) else MISSING
+        return self[codepoint]
+
+
+def translate(text, table):
+    """
+    Transliterate non-ASCII characters of text using table.
+    """
+    if text.isascii():
+        return text
+    return _non_ascii.sub(lambda m: m.group().translate(table), text)
@@ -14,8 +14,8 @@ unidecode can be found at
 http://interglacial.com/~sburke/tpj/as_html/tpj22.html.
 
 The major differences between this implementation and others is it's written in
-python and it uses a single dictionary instead of loading the code group files
-as needed.
+python and the code group tables are compiled into files, from which they are
+loaded as needed (see tables.py).
 
 
 Copyright (c) 2007 Russell Norris
@@ -52,10 +52,7 @@ purpose.
 This library is free software; you can redistribute it and/or modify
 it under the same terms as Perl itself.
 """
-import re
-
-from ebook_converter.ebooks.unihandecode.unicodepoints import CODEPOINTS
-from ebook_converter.ebooks.unihandecode.zhcodepoints import CODEPOINTS as HANCODES
+from ebook_converter.ebooks.unihandecode import tables
 
 
 __license__ = 'GPL 3'
@@ -65,28 +62,24 @@ __docformat__ = 'restructuredtext en'
 
 class Unidecoder(object):
 
-    codepoints = {}
+    # Modules with the tables of code points, blocks of the later ones
+    # replacing those of the former ones
+    table_modules = ('unicodepoints', 'zhcodepoints')
 
     def __init__(self):
-        self.codepoints = CODEPOINTS
-        self.codepoints.update(HANCODES)
+        self.codepoints = tables.Table(*self.table_modules)
 
     def decode(self, text):
         # Replace characters larger than 127 with their ASCII equivelent.
-        return re.sub('[^\x00-\x7f]',lambda x: self.replace_point(x.group()), text)
+        return tables.translate(text, self.codepoints)
 
     def replace_point(self, codepoint):
         '''
         Returns the replacement character or ? if none can be found.
         '''
-        try:
-            # Split the unicode character xABCD into parts 0xAB and 0xCD.
-            # 0xAB represents the group within CODEPOINTS to query and 0xCD
-            # represents the position in the list of characters for the group.
-            return self.codepoints[self.code_group(codepoint)][self.grouped_point(
-                codepoint)]
-        except:
-            return '?'
+        if not isinstance(codepoint, str):
+            codepoint = str(codepoint, "utf-8")
+        return self.codepoints[ord(codepoint)]
 
     def code_group(self, character):
         '''
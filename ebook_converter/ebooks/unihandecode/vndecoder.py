@@ -2,9 +2,7 @@
 Decode unicode text to an ASCII representation of the text in Vietnamese.
 """
 
-from ebook_converter.ebooks.unihandecode import unidecoder
-from ebook_converter.ebooks.unihandecode import vncodepoints
-from ebook_converter.ebooks.unihandecode import unicodepoints
+from ebook_converter.ebooks.unihandecode.unidecoder import Unidecoder
 
 
 __license__ = 'GPL 3'
@@ -12,10 +10,6 @@ __copyright__ = '2010, Hiroshi Miura <miurahr@linux.com>'
 __docformat__ = 'restructuredtext en'
 
 
-class Vndecoder(unidecoder.Unidecoder):
+class Vndecoder(Unidecoder):
 
-    codepoints = {}
-
-    def __init__(self):
-        self.codepoints = unicodepoints.CODEPOINTS
-        self.codepoints.update(vncodepoints.CODEPOINTS)
+    table_modules = ('unicodepoints', 'vncodepoints')
@@ -70,8 +70,39 @@ def run(args):
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument('from_file', help="Input file to be converted")
-    parser.add_argument('to_file', help="Output file to be written to")
+    parser.add_argument('from_file', nargs='?',
+                        help="Input file to be converted")
+    parser.add_argument('to_file', nargs='?',
+                        help="Output file to be written to")
+    parser.add_argument('--serve', action='store_true',
+                        help='batch mode - start pool of worker processes, '
+                        'and read conversion jobs as JSON lines from stdin '
+                        '(or from the unix socket if --socket is provided). '
+                        'Results are written as JSON lines.')
+    parser.add_argument('--socket', metavar='PATH',
+                        help='path of the unix socket to listen on for jobs '
+                        'in batch mode')
+    parser.add_argument('--metadata', nargs='+', metavar='PATH',
+                        help='bulk metadata mode - read metadata of the books '
+                        'from the files and directories (searched '
+                        'recursively) on pool of worker processes, and write '
+                        'them as JSON lines. "-" reads list of files from '
+                        'stdin.')
+    parser.add_argument('--covers', metavar='DIR',
+                        help='write covers into that directory in bulk '
+                        'metadata mode')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes in batch and bulk '
+                        'metadata modes. Defaults to number of CPUs.')
+    parser.add_argument('--max-jobs-per-worker', type=int, default=None,
+                        help='restart worker process after that many jobs in '
+                        'batch mode. By default workers are never '
+                        'restarted.')
+    parser.add_argument('--job-timeout', type=float, default=None,
+                        metavar='SECONDS',
+                        help='in batch mode, kill the worker process of a job '
+                        'running longer than that and report the job as '
+                        'failed. By default jobs are not limited.')
     parser.add_argument('-v', '--verbose', action='count', default=0,
                         help='be verbose. Adding more "v" will increase '
                         'verbosity')
@@ -83,4 +114,17 @@ def main():
 
     LOG.set_verbose(args.verbose, args.quiet)
 
+    if args.serve or args.socket:
+        from ebook_converter.ebooks.conversion import batch
+        sys.exit(batch.serve(args.workers, args.socket,
+                             args.max_jobs_per_worker, args.job_timeout))
+
+    if args.metadata:
+        from ebook_converter.ebooks.metadata import bulk
+        sys.exit(1 if bulk.run(args.metadata, args.workers,
+                               args.covers) else 0)
+
+    if not args.from_file or not args.to_file:
+        parser.error('both input and output files are required')
+
     sys.exit(run(args))
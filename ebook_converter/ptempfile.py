@@ -81,6 +81,15 @@ def osx_cache_dir():
                 return q
 
 
+def cache_dir():
+    """
+    Return directory for files cached between runs.
+    """
+    if os.getenv('XDG_CACHE_HOME'):
+        return os.getenv('XDG_CACHE_HOME')
+    return os.path.join(os.path.expanduser('~/'), '.cache')
+
+
 def base_dir():
     global _base_dir
     if _base_dir is not None and not os.path.exists(_base_dir):
@@ -229,9 +229,8 @@ class JSONConfig(dict):
         self.update(d)
 
     def _get_cache_dir(self):
-        if os.getenv('XDG_CACHE_HOME'):
-            return os.getenv('XDG_CACHE_HOME')
-        return os.path.join(os.path.expanduser('~/'), '.cache')
+        from ebook_converter.ptempfile import cache_dir
+        return cache_dir()
 
     def __getitem__(self, key):
         try:
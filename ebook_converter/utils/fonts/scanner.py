@@ -90,6 +90,46 @@ def fc_list():
 
 def font_dirs():
     return fc_list()
+
+
+def iter_font_files(folders, allowed_extensions):
+    '''
+    Yield (path, stat result) of the font files in folders and their
+    subfolders. Folders reachable more than once (nested in other folders of
+    the list, or through symlinks) are visited only once.
+    '''
+    visited = set()
+    stack = [folder for folder in reversed(folders)
+             if os.path.isdir(folder)]
+    while stack:
+        folder = stack.pop()
+        try:
+            st = os.stat(folder)
+        except EnvironmentError:
+            continue
+        if (st.st_dev, st.st_ino) in visited:
+            continue
+        visited.add((st.st_dev, st.st_ino))
+        try:
+            with os.scandir(folder) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except EnvironmentError as e:
+            if DEBUG:
+                print(f'Failed to walk font folder: {folder}, {e}')
+            continue
+        subfolders = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subfolders.append(entry.path)
+                    continue
+                if (entry.name.rpartition('.')[-1].lower() not in
+                        allowed_extensions or not entry.is_file()):
+                    continue
+                yield entry.path, entry.stat()
+            except EnvironmentError:
+                continue
+        stack.extend(reversed(subfolders))
 # }}}
 
 # Build font family maps {{{
@@ -168,7 +208,7 @@ def build_families(cached_fonts, folders, family_attr='font-family'):
 
 class FontScanner(Thread):
 
-    CACHE_VERSION = 2
+    CACHE_VERSION = 4
 
     def __init__(self, folders=[], allowed_extensions={'ttf', 'otf'}):
         Thread.__init__(self)
@@ -243,20 +283,20 @@ class FontScanner(Thread):
         :return: (family name, faces) or None, None
         '''
         from ebook_converter.utils.fonts.utils import \
-            supports_text, panose_to_css_generic_family, \
+            coverage_supports_text, panose_to_css_generic_family, \
             get_printable_characters
         if not isinstance(text, str):
             raise TypeError(u'%r is not unicode' % text)
-        text = get_printable_characters(text)
+        text = ''.join(set(get_printable_characters(text)))
         found = {}
 
         def filter_faces(font):
-            try:
-                raw = self.get_font_data(font)
-                return supports_text(raw, text)
-            except Exception:
-                pass
-            return False
+            # Coverage of the faces is read from their cmap tables, when the
+            # fonts are scanned, so no font files are opened here
+            coverage = font.get('coverage')
+            if coverage is None:
+                return False
+            return coverage_supports_text(coverage, text)
 
         for family in self.find_font_families():
             faces = list(filter(filter_faces, self.fonts_for_family(family)))
@@ -291,41 +331,22 @@ class FontScanner(Thread):
         self.reload_cache()
         cached_fonts = self.cached_fonts.copy()
         self.cached_fonts.clear()
-        for folder in self.folders:
-            if not os.path.isdir(folder):
+        for candidate, s in iter_font_files(self.folders,
+                                            self.allowed_extensions):
+            candidate = os.path.normcase(os.path.abspath(candidate))
+            fileid = '{0}||{1}:{2}'.format(candidate, s.st_size, s.st_mtime)
+            if fileid in cached_fonts:
+                # Use previously cached metadata, since the file size and
+                # last modified timestamp have not changed.
+                self.cached_fonts[fileid] = cached_fonts[fileid]
                 continue
             try:
-                files = tuple([os.path.join(root, f)
-                               for root, _, fnames in os.walk(folder)
-                               for f in fnames])
-            except EnvironmentError as e:
+                self.read_font_metadata(candidate, fileid)
+            except Exception as e:
                 if DEBUG:
-                    print(f'Failed to walk font folder: {folder}, {e}')
+                    print(f'Failed to read metadata from font file '
+                          f'{candidate}: {e}')
                 continue
-            for candidate in files:
-                if (candidate.rpartition('.')[-1].lower() not in
-                        self.allowed_extensions or
-                        not os.path.isfile(candidate)):
-                    continue
-                candidate = os.path.normcase(os.path.abspath(candidate))
-                try:
-                    s = os.stat(candidate)
-                except EnvironmentError:
-                    continue
-                fileid = '{0}||{1}:{2}'.format(candidate, s.st_size,
-                                               s.st_mtime)
-                if fileid in cached_fonts:
-                    # Use previously cached metadata, since the file size and
-                    # last modified timestamp have not changed.
-                    self.cached_fonts[fileid] = cached_fonts[fileid]
-                    continue
-                try:
-                    self.read_font_metadata(candidate, fileid)
-                except Exception as e:
-                    if DEBUG:
-                        print(f'Failed to read metadata from font file '
-                              f'{candidate}: {e}')
-                    continue
 
         if frozenset(cached_fonts) != frozenset(self.cached_fonts):
             # Write out the cache only if some font files have changed
@@ -355,8 +376,24 @@ class FontScanner(Thread):
             else:
                 data = fm.to_dict()
                 data['path'] = path
+                data['coverage'] = self.read_coverage(f, fm)
                 self.cached_fonts[fileid] = data
 
+    def read_coverage(self, f, fm):
+        '''
+        Return the characters supported by the font, as returned by
+        get_coverage(), or None if the font has no usable cmap table.
+        '''
+        from ebook_converter.utils.fonts.utils import get_coverage
+        if b'cmap' not in fm.tables:
+            return None
+        toff, tlen = fm.tables[b'cmap'][:2]
+        f.seek(toff)
+        try:
+            return get_coverage(f.read(tlen), raw_is_table=True)
+        except Exception:
+            return None
+
     def dump_fonts(self):
         self.join()
         for family in self.font_families:
@@ -0,0 +1,85 @@
+"""
+Tests of subsetting fonts, using minimal generated fonts.
+"""
+import struct
+import unittest
+
+from ebook_converter.utils.fonts.sfnt.container import Sfnt
+from ebook_converter.utils.fonts.sfnt.subset import subset
+
+
+# Characters the fonts have glyphs for
+FONT_CHARS = 'abcdef'
+
+
+def make_font(chars):
+    """
+    Return a minimal TrueType font with a square glyph for every character.
+    """
+    num_glyphs = len(chars) + 1
+    glyph = struct.pack('>hhhhhH', 1, 0, 0, 500, 500, 3)
+    glyph += struct.pack('>H', 0) + bytes([0x01] * 4)
+    glyph += struct.pack('>4h', 0, 0, 500, 0) + struct.pack('>4h', 0, 500,
+                                                            0, -500)
+    glyf = glyph * num_glyphs
+    loca = b''.join(struct.pack('>H', i * len(glyph) // 2)
+                    for i in range(num_glyphs + 1))
+
+    codes = [ord(c) for c in chars] + [0xffff]
+    seg_count = len(codes)
+    deltas = [(i + 1 - code) & 0xffff for i, code in enumerate(codes[:-1])]
+    subtable = struct.pack('>HHHHHHH', 4, 16 + 8 * seg_count, 0,
+                           2 * seg_count, 0, 0, 0)
+    subtable += struct.pack('>%dH' % seg_count, *codes) + b'\0\0'
+    subtable += struct.pack('>%dH' % seg_count, *codes)
+    subtable += struct.pack('>%dH' % seg_count, *(deltas + [1]))
+    subtable += struct.pack('>%dH' % seg_count, *([0] * seg_count))
+    cmap = struct.pack('>HHHHL', 0, 1, 3, 1, 12) + subtable
+
+    tables = {
+        b'head': struct.pack('>llLLHHqqhhhhHHhhh', 0x10000, 0x10000, 0,
+                             0x5F0F3CF5, 0, 1000, 0, 0, 0, 0, 500, 500, 0,
+                             8, 2, 0, 0),
+        b'hhea': struct.pack('>lhhhHhhhhhhhhhhhH', 0x10000, 800, -200, 0,
+                             500, 0, 0, 500, 1, 0, 0, 0, 0, 0, 0, 0,
+                             num_glyphs),
+        b'maxp': struct.pack('>lH', 0x5000, num_glyphs),
+        b'hmtx': struct.pack('>Hh', 500, 0) * num_glyphs,
+        b'post': struct.pack('>llhhLLLLL', 0x30000, 0, 0, 0, 0, 0, 0, 0, 0),
+        b'cmap': cmap,
+        b'loca': loca,
+        b'glyf': glyf,
+    }
+    return Sfnt(lambda tag: tables.get(tag, b''))()[0]
+
+
+def font_chars(raw):
+    """
+    Return the characters the font raw has glyphs for.
+    """
+    sfnt = Sfnt(raw)
+    cmap = sfnt[b'cmap']
+    return {c for c, gid in
+            cmap.get_character_map({ord(c) for c in FONT_CHARS}).items()
+            if gid}
+
+
+class TestSubset(unittest.TestCase):
+
+    def test_font_is_usable(self):
+        font = make_font(FONT_CHARS)
+        self.assertEqual(font_chars(font), set(map(ord, FONT_CHARS)))
+
+    def test_subset(self):
+        font = make_font(FONT_CHARS)
+        raw, old_stats, new_stats = subset(font, 'ab')
+        self.assertEqual(font_chars(raw), {ord('a'), ord('b')})
+        self.assertLess(len(raw), len(font))
+
+
+def find_tests():
+    return unittest.defaultTestLoader.loadTestsFromTestCase(TestSubset)
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(find_tests())
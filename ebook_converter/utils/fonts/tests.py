@@ -0,0 +1,142 @@
+"""
+Tests of the coverage of fonts, comparing it with the glyph ids the fonts map
+the characters to.
+"""
+import struct
+import unittest
+
+from ebook_converter.utils.fonts.metadata import FontMetadata
+from ebook_converter.utils.fonts.scanner import (FontScanner,
+                                                 default_font_dirs,
+                                                 iter_font_files)
+from ebook_converter.utils.fonts.sfnt.tests import FONT_CHARS, make_font
+from ebook_converter.utils.fonts.utils import (coverage_supports_text,
+                                               get_coverage, get_glyph_ids,
+                                               supports_text)
+
+
+# Segments of the cmap: (start, end, delta, glyph ids or None for segments
+# mapping the codes by the delta only)
+SEGMENTS = [
+    (0x20, 0x7e, -0x1f, None),
+    # Glyph 0 in the middle of the segment
+    (0x100, 0x17f, -0x150, None),
+    # Glyph ids from the array, including zeros and an id which the delta
+    # turns into 0
+    (0xa0, 0xaf, 0, [0, 200, 201, 0, 202, 203, 204, 205, 206, 207, 0, 0,
+                     208, 209, 210, 0]),
+    (0x400, 0x40f, 5, [300 + i for i in range(12)] + [0, 0x10000 - 5, 1, 2]),
+    # Segments overlapping the previous ones, which take precedence
+    (0x3f0, 0x405, 10, None),
+    (0x28, 0x2f, 0, [400 + i for i in range(8)]),
+    (0xffff, 0xffff, 1, None),
+]
+
+
+def make_cmap(segments):
+    """
+    Return cmap table with format 4 subtable with the segments.
+    """
+    seg_count = len(segments)
+    glyph_ids = []
+    range_offsets = []
+    for i, (start, end, delta, glyphs) in enumerate(segments):
+        if glyphs is None:
+            range_offsets.append(0)
+        else:
+            range_offsets.append(2 * (seg_count - i + len(glyph_ids)))
+            glyph_ids.extend(glyphs)
+    array = '>%dH' % seg_count
+    subtable = struct.pack('>HHHHHHH', 4, 16 + 8 * seg_count +
+                           2 * len(glyph_ids), 0, 2 * seg_count, 0, 0, 0)
+    subtable += struct.pack(array, *[s[1] for s in segments]) + b'\0\0'
+    subtable += struct.pack(array, *[s[0] for s in segments])
+    subtable += struct.pack(array, *[s[2] & 0xffff for s in segments])
+    subtable += struct.pack(array, *range_offsets)
+    subtable += struct.pack('>%dH' % len(glyph_ids), *glyph_ids)
+    return struct.pack('>HHHHL', 0, 1, 3, 1, 12) + subtable
+
+
+def system_fonts(count=3):
+    """
+    Return paths of up to count fonts installed in the system.
+    """
+    ans = []
+    for path, st in iter_font_files(default_font_dirs(), {'ttf', 'otf'}):
+        ans.append(path)
+        if len(ans) == count:
+            break
+    return ans
+
+
+class TestCoverage(unittest.TestCase):
+
+    def check(self, raw, codes, raw_is_table=False):
+        coverage = get_coverage(raw, raw_is_table=raw_is_table)
+        self.assertEqual(coverage, sorted(coverage))
+        self.assertEqual(len(coverage) % 2, 0)
+        text = ''.join(map(chr, codes))
+        covered = set()
+        for code, glyph_id in zip(codes, get_glyph_ids(raw, text,
+                                                       raw_is_table)):
+            supported = coverage_supports_text(coverage, chr(code))
+            self.assertEqual(supported, glyph_id != 0, hex(code))
+            if supported:
+                covered.add(code)
+        self.assertTrue(covered)
+        self.assertLess(len(covered), len(codes))
+        # Texts with characters covered or not
+        covered_text = ''.join(map(chr, sorted(covered)[::7]))
+        self.assertTrue(coverage_supports_text(coverage, covered_text))
+        self.assertTrue(coverage_supports_text(coverage, ''))
+        for code in codes[::97]:
+            if code not in covered:
+                self.assertFalse(coverage_supports_text(
+                    coverage, covered_text + chr(code)), hex(code))
+        self.assertFalse(coverage_supports_text(coverage, '\U0001f600'))
+        return coverage, covered
+
+    def test_cmap(self):
+        coverage, covered = self.check(make_cmap(SEGMENTS), range(0x10000),
+                                       raw_is_table=True)
+        for code in (0x20, 0x7e, 0x14f, 0x151, 0xa1, 0x28, 0x2f, 0x3f0,
+                     0x3ff, 0x400, 0x40b, 0x40e):
+            self.assertIn(code, covered)
+        for code in (0x1f, 0x7f, 0x150, 0xa0, 0xa3, 0xaf, 0x40c, 0x40d,
+                     0x410, 0xffff):
+            self.assertNotIn(code, covered)
+
+    def test_font(self):
+        font = make_font(FONT_CHARS)
+        coverage, covered = self.check(font, range(0x100))
+        self.assertEqual(covered, set(map(ord, FONT_CHARS)))
+        self.assertTrue(supports_text(font, FONT_CHARS))
+        self.assertFalse(supports_text(font, 'abz'))
+
+    def test_system_fonts(self):
+        paths = system_fonts()
+        if not paths:
+            self.skipTest('No fonts installed')
+        scanner = FontScanner()
+        for path in paths:
+            with open(path, 'rb') as f:
+                raw = f.read()
+                f.seek(0)
+                coverage = scanner.read_coverage(f, FontMetadata(f))
+            self.assertEqual(coverage, get_coverage(raw))
+            # Every boundary of the covered ranges and the characters around
+            codes = set(range(0x3000))
+            for code in coverage:
+                codes.update(range(max(code - 2, 0), min(code + 2, 0x10000)))
+            self.check(raw, sorted(codes))
+            text = 'Text'
+            self.assertEqual(coverage_supports_text(coverage, text),
+                             supports_text(raw, text), path)
+
+
+def find_tests():
+    return unittest.defaultTestLoader.loadTestsFromTestCase(TestCoverage)
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(find_tests())
@@ -1,3 +1,4 @@
+import bisect
 import struct
 from io import BytesIO
 from collections import defaultdict
@@ -403,21 +404,107 @@ def get_glyph_ids(raw, text, raw_is_table=False):
         table = get_table(raw, 'cmap')[0]
         if table is None:
             raise UnsupportedFont('Not a supported font, has no cmap table')
+    bmp_table = find_bmp_table(table)
+
+    for glyph_id in get_bmp_glyph_ids(table, bmp_table, map(ord, text)):
+        yield glyph_id
+
+
+def find_bmp_table(table):
+    ''' Return offset of the format 4 (Unicode BMP) subtable of the cmap
+    table '''
     version, num_tables = struct.unpack_from(b'>HH', table)
-    bmp_table = None
     for i in range(num_tables):
         platform_id, encoding_id, offset = struct.unpack_from(b'>HHL', table,
                 4 + (i*8))
         if platform_id == 3 and encoding_id == 1:
             table_format = struct.unpack_from(b'>H', table, offset)[0]
             if table_format == 4:
-                bmp_table = offset
-                break
-    if bmp_table is None:
-        raise UnsupportedFont('Not a supported font, has no format 4 cmap table')
+                return offset
+    raise UnsupportedFont('Not a supported font, has no format 4 cmap table')
 
-    for glyph_id in get_bmp_glyph_ids(table, bmp_table, map(ord, text)):
-        yield glyph_id
+
+def get_coverage(raw, raw_is_table=False):
+    '''
+    Return the characters the font has glyphs for, as a flat list of the
+    half-open ranges of code points: [start1, stop1, start2, stop2, ...]. The
+    same characters are reported as supported by supports_text().
+    '''
+    if raw_is_table:
+        table = raw
+    else:
+        table = get_table(raw, 'cmap')[0]
+        if table is None:
+            raise UnsupportedFont('Not a supported font, has no cmap table')
+    bmp = find_bmp_table(table)
+    (start_count, end_count, range_offset, id_delta, glyph_id_len,
+     glyph_id_map, array_len) = read_bmp_prefix(table, bmp)
+
+    ans = []
+    # Codes are looked up in the first segment containing them, so the parts
+    # of segments covered by earlier ones are skipped. Segments are sorted in
+    # valid fonts, but not necessarily in the ones found in the wild.
+    seen = []
+    for i, (sc, ec) in enumerate(zip(start_count, end_count)):
+        parts = _uncovered_ranges(seen, sc, ec + 1)
+        _add_range(seen, sc, ec + 1)
+        ro = range_offset[i]
+        for start, stop in parts:
+            if ro == 0:
+                # Every code has a glyph, except the one mapped to glyph 0
+                missing = -id_delta[i] % 0x10000
+                if start <= missing < stop:
+                    _add_range(ans, start, missing)
+                    _add_range(ans, missing + 1, stop)
+                else:
+                    _add_range(ans, start, stop)
+                continue
+            for code in range(start, stop):
+                idx = ro//2 + (code - sc) + i - array_len
+                if -glyph_id_len <= idx < glyph_id_len:
+                    glyph_id = glyph_id_map[idx]
+                    if glyph_id != 0 and (glyph_id + id_delta[i]) % 0x10000:
+                        _add_range(ans, code, code + 1)
+    return ans
+
+
+def _add_range(ranges, start, stop):
+    # Add the half-open range to the flat sorted list of disjoint ranges,
+    # merging it with the ranges it overlaps or touches
+    if start >= stop:
+        return
+    lo = bisect.bisect_left(ranges, start)
+    hi = bisect.bisect_right(ranges, stop)
+    ranges[lo:hi] = ([] if lo % 2 else [start]) + ([] if hi % 2 else [stop])
+
+
+def _uncovered_ranges(ranges, start, stop):
+    # Return list of (start, stop) parts of the half-open range, which are
+    # not in the flat sorted list of disjoint ranges
+    ans = []
+    i = bisect.bisect_right(ranges, start)
+    if i % 2:
+        start = ranges[i]
+        i += 1
+    while i < len(ranges) and ranges[i] < stop:
+        if start < ranges[i]:
+            ans.append((start, ranges[i]))
+        start = ranges[i + 1]
+        i += 2
+    if start < stop:
+        ans.append((start, stop))
+    return ans
+
+
+def coverage_supports_text(coverage, text):
+    '''
+    Return True if all characters of text (which should contain printable
+    characters only) are in the coverage as returned by get_coverage().
+    '''
+    for ch in text:
+        if bisect.bisect_right(coverage, ord(ch)) % 2 == 0:
+            return False
+    return True
 
 
 def supports_text(raw, text, has_only_printable_chars=False):
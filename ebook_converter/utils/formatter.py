@@ -3,13 +3,26 @@ Created on 23 Sep 2010
 
 @author: charles
 """
-import re, string, traceback, numbers
+import functools, re, string, traceback, numbers
 
 from ebook_converter.constants_old import DEBUG
 from ebook_converter.utils.formatter_functions import formatter_functions
 
 
+# Number of compiled template programs and parsed field formats to keep
+PROGRAM_CACHE_SIZE = 512
+FORMAT_CACHE_SIZE = 1024
+
+
 class _Parser(object):
+    """
+    Compiler of the lexed template program into a tree of closures. Every
+    node of the tree is a function taking the formatter and the dictionary
+    of local variables, returning the value of the node.
+
+    Functions are looked up by name when the program is evaluated, so that
+    compiled programs can be shared by formatters with different functions.
+    """
     LEX_OP  = 1
     LEX_ID  = 2
     LEX_STR = 3
@@ -18,20 +31,15 @@ class _Parser(object):
 
     LEX_CONSTANTS = frozenset((LEX_STR, LEX_NUM))
 
-    def __init__(self, val, prog, funcs, parent):
+    def __init__(self, prog):
         self.lex_pos = 0
         self.prog = prog[0]
         self.prog_len = len(self.prog)
         if prog[1] != '':
             self.error('failed to scan program. Invalid input '
                        '{0}'.format(prog[1]))
-        self.parent = parent
-        self.parent_kwargs = parent.kwargs
-        self.parent_book = parent.book
-        self.locals = {'$':val}
-        self.funcs = funcs
 
-    def error(self, message):
+    def error_message(self, message):
         m = 'Formatter: ' + message + ' near '
         if self.lex_pos > 0:
             m = '{0} {1}'.format(m, self.prog[self.lex_pos-1][1])
@@ -39,7 +47,10 @@ class _Parser(object):
             m = '{0} {1}'.format(m, self.prog[self.lex_pos+1][1])
         else:
             m = '{0} {1}'.format(m, 'end of program')
-        raise ValueError(m)
+        return m
+
+    def error(self, message):
+        raise ValueError(self.error_message(message))
 
     def token(self):
         if self.lex_pos >= self.prog_len:
@@ -98,21 +109,30 @@ class _Parser(object):
         return token[0] == self.LEX_EOF
 
     def program(self):
-        val = self.statement()
+        node = self.statement()
         if not self.token_is_eof():
             self.error('syntax error - program ends before EOF')
-        return val
+        return node
 
     def statement(self):
+        nodes = []
         while True:
-            val = self.expr()
+            nodes.append(self.expr())
             if self.token_is_eof():
-                return val
+                break
             if not self.token_op_is_a_semicolon():
-                return val
+                break
             self.consume()
             if self.token_is_eof():
-                return val
+                break
+        if len(nodes) == 1:
+            return nodes[0]
+
+        def statement(formatter, locals):
+            for node in nodes:
+                val = node(formatter, locals)
+            return val
+        return statement
 
     def expr(self):
         if self.token_is_id():
@@ -122,19 +142,26 @@ class _Parser(object):
                 if self.token_op_is_a_equals():
                     # classic assignment statement
                     self.consume()
-                    cls = self.funcs['assign']
-                    return cls.eval_(self.parent, self.parent_kwargs,
-                                    self.parent_book, self.locals, id, self.expr())
-                val = self.locals.get(id, None)
-                if val is None:
-                    self.error('Unknown identifier ' + id)
-                return val
-            # We have a function.
-            # Check if it is a known one. We do this here so error reporting is
-            # better, as it can identify the tokens near the problem.
+                    value = self.expr()
+
+                    def assign(formatter, locals):
+                        return formatter.funcs['assign'].eval_(
+                            formatter, formatter.kwargs, formatter.book,
+                            locals, id, value(formatter, locals))
+                    return assign
+                unknown = self.error_message('Unknown identifier ' + id)
+
+                def identifier(formatter, locals):
+                    val = locals.get(id, None)
+                    if val is None:
+                        raise ValueError(unknown)
+                    return val
+                return identifier
+            # We have a function. Whether it is a known one is checked when
+            # it is called, but the error is reported near the same tokens
+            # as if it was checked here.
             id = id.strip()
-            if id not in self.funcs:
-                self.error('unknown function {0}'.format(id))
+            unknown = self.error_message('unknown function {0}'.format(id))
 
             # Eat the paren
             self.consume()
@@ -146,29 +173,120 @@ class _Parser(object):
                     # the value.
                     if not self.token_is_id():
                         self.error('assign requires the first parameter be an id')
-                    args.append(self.token())
+                    name = self.token()
+                    args.append(lambda formatter, locals, name=name: name)
                 else:
-                    # evaluate the argument (recursive call)
+                    # compile the argument (recursive call)
                     args.append(self.statement())
                 if not self.token_op_is_a_comma():
                     break
                 self.consume()
             if self.token() != ')':
                 self.error('missing closing parenthesis')
-
-            # Evaluate the function
-            cls = self.funcs[id]
-            if cls.arg_count != -1 and len(args) != cls.arg_count:
-                self.error('incorrect number of arguments for function {}'.format(id))
-            return cls.eval_(self.parent, self.parent_kwargs,
-                            self.parent_book, self.locals, *args)
+            nargs = len(args)
+            wrong_count = self.error_message(
+                'incorrect number of arguments for function {}'.format(id))
+
+            def call(formatter, locals):
+                cls = formatter.funcs.get(id)
+                if cls is None:
+                    raise ValueError(unknown)
+                vals = [arg(formatter, locals) for arg in args]
+                if cls.arg_count != -1 and nargs != cls.arg_count:
+                    raise ValueError(wrong_count)
+                return cls.eval_(formatter, formatter.kwargs, formatter.book,
+                                 locals, *vals)
+            return call
         elif self.token_is_constant():
             # String or number
-            return self.token()
+            val = self.token()
+            return lambda formatter, locals: val
         else:
             self.error('expression is not function or constant')
 
 
+@functools.lru_cache(maxsize=PROGRAM_CACHE_SIZE)
+def compile_program(prog):
+    """
+    Compile text of the template program into a function, which takes the
+    formatter and the dictionary of local variables and returns the result
+    of the program.
+    """
+    return _Parser(TemplateFormatter.lex_scanner.scan(prog)).program()
+
+
+@functools.lru_cache(maxsize=FORMAT_CACHE_SIZE)
+def _parse_field_format(fmt):
+    """
+    Parse format of the field. Return tuple of the prefix and suffix of
+    conditional text, the display format, the template program (or None) and
+    the name and text of arguments of the old-style function (or None).
+    """
+    # Handle conditional text
+    matches = TemplateFormatter.format_string_re.match(fmt)
+    if matches is None or matches.lastindex != 3:
+        prefix = suffix = ''
+    else:
+        fmt, prefix, suffix = matches.groups()
+    program = fname = args = None
+    # First see if we have a functional-style expression
+    if fmt.startswith('\''):
+        p = 0
+    else:
+        p = fmt.find(':\'')
+        if p >= 0:
+            p += 1
+    if p >= 0 and fmt[-1] == '\'':
+        program = fmt[p+1:-1]
+        colon = fmt[0:p].find(':')
+        if colon < 0:
+            dispfmt = ''
+        else:
+            dispfmt = fmt[0:colon]
+    else:
+        # check for old-style function references
+        p = fmt.find('(')
+        dispfmt = fmt
+        if p >= 0 and fmt[-1] == ')':
+            colon = fmt[0:p].find(':')
+            if colon < 0:
+                dispfmt = ''
+                colon = 0
+            else:
+                dispfmt = fmt[0:colon]
+                colon += 1
+            fname = fmt[colon:p].strip()
+            args = (fmt[0:p], fmt[p+1:])
+    return prefix, suffix, dispfmt, program, fname, args
+
+
+@functools.lru_cache(maxsize=FORMAT_CACHE_SIZE)
+def _parse_template(fmt):
+    """
+    Parse template into tuple of (literal text, field name, format spec,
+    conversion) tuples. Return None for templates, which need features
+    handled by string.Formatter only: automatic field numbering, positional
+    fields and nested fields in format specs.
+    """
+    parsed = tuple(_string_formatter.parse(fmt))
+    for literal, field_name, format_spec, conversion in parsed:
+        if field_name is not None and (field_name == '' or
+                                       field_name[0].isdigit() or
+                                       '{' in format_spec):
+            return None
+    return parsed
+
+
+_string_formatter = string.Formatter()
+
+
+@functools.lru_cache(maxsize=FORMAT_CACHE_SIZE)
+def _scan_function_args(text):
+    args = TemplateFormatter.arg_parser.scan(text)[0]
+    return tuple(TemplateFormatter.backslash_comma_to_comma.sub(',', a)
+                 for a in args)
+
+
 class TemplateFormatter(string.Formatter):
     '''
     Provides a format function that substitutes '' for any missing value
@@ -245,18 +363,17 @@ class TemplateFormatter(string.Formatter):
         ], flags=re.DOTALL)
 
     def _eval_program(self, val, prog, column_name):
-        # keep a cache of the lex'ed program under the theory that re-lexing
-        # is much more expensive than the cache lookup. This is certainly true
-        # for more than a few tokens, but it isn't clear for simple programs.
+        # Programs are compiled once and kept in the cache keyed by their
+        # text. The template cache maps names of the columns to the compiled
+        # programs, which saves even hashing of the program text.
         if column_name is not None and self.template_cache is not None:
-            lprog = self.template_cache.get(column_name, None)
-            if not lprog:
-                lprog = self.lex_scanner.scan(prog)
-                self.template_cache[column_name] = lprog
+            program = self.template_cache.get(column_name, None)
+            if program is None:
+                program = compile_program(prog)
+                self.template_cache[column_name] = program
         else:
-            lprog = self.lex_scanner.scan(prog)
-        parser = _Parser(val, lprog, self.funcs, self)
-        return parser.program()
+            program = compile_program(prog)
+        return program(self, {'$': val})
 
     # ################# Override parent classes methods #####################
 
@@ -270,66 +387,55 @@ class TemplateFormatter(string.Formatter):
                 val = str(val)
             else:
                 val = ''
-        # Handle conditional text
-        fmt, prefix, suffix = self._explode_format_string(fmt)
+        prefix, suffix, dispfmt, program, fname, args = \
+            _parse_field_format(fmt)
 
         # Handle functions
-        # First see if we have a functional-style expression
-        if fmt.startswith('\''):
-            p = 0
-        else:
-            p = fmt.find(':\'')
-            if p >= 0:
-                p += 1
-        if p >= 0 and fmt[-1] == '\'':
-            val = self._eval_program(val, fmt[p+1:-1], None)
-            colon = fmt[0:p].find(':')
-            if colon < 0:
-                dispfmt = ''
-            else:
-                dispfmt = fmt[0:colon]
-        else:
-            # check for old-style function references
-            p = fmt.find('(')
-            dispfmt = fmt
-            if p >= 0 and fmt[-1] == ')':
-                colon = fmt[0:p].find(':')
-                if colon < 0:
-                    dispfmt = ''
-                    colon = 0
+        if program is not None:
+            val = self._eval_program(val, program, None)
+        elif fname is not None:
+            if fname in self.funcs:
+                func = self.funcs[fname]
+                name, text = args
+                if func.arg_count == 2:
+                    # only one arg expected. Don't bother to scan. Avoids need
+                    # for escaping characters
+                    args = [text[:-1]]
                 else:
-                    dispfmt = fmt[0:colon]
-                    colon += 1
-
-                fname = fmt[colon:p].strip()
-                if fname in self.funcs:
-                    func = self.funcs[fname]
-                    if func.arg_count == 2:
-                        # only one arg expected. Don't bother to scan. Avoids need
-                        # for escaping characters
-                        args = [fmt[p+1:-1]]
-                    else:
-                        args = self.arg_parser.scan(fmt[p+1:])[0]
-                        args = [self.backslash_comma_to_comma.sub(',', a) for a in args]
-                    if (func.arg_count == 1 and (len(args) != 1 or args[0])) or \
-                            (func.arg_count > 1 and func.arg_count != len(args)+1):
-                        raise ValueError('Incorrect number of arguments for function '+ fmt[0:p])
-                    if func.arg_count == 1:
-                        val = func.eval_(self, self.kwargs, self.book, self.locals, val)
-                        if self.strip_results:
-                            val = val.strip()
-                    else:
-                        val = func.eval_(self, self.kwargs, self.book, self.locals, val, *args)
-                        if self.strip_results:
-                            val = val.strip()
+                    args = list(_scan_function_args(text))
+                if (func.arg_count == 1 and (len(args) != 1 or args[0])) or \
+                        (func.arg_count > 1 and func.arg_count != len(args)+1):
+                    raise ValueError('Incorrect number of arguments for function '+ name)
+                if func.arg_count == 1:
+                    val = func.eval_(self, self.kwargs, self.book, self.locals, val)
+                    if self.strip_results:
+                        val = val.strip()
                 else:
-                    return '%s: unknown function' % fname
+                    val = func.eval_(self, self.kwargs, self.book, self.locals, val, *args)
+                    if self.strip_results:
+                        val = val.strip()
+            else:
+                return '%s: unknown function' % fname
         if val:
             val = self._do_format(val, dispfmt)
         if not val:
             return ''
         return prefix + val + suffix
 
+    def vformat(self, format_string, args, kwargs):
+        parsed = _parse_template(format_string)
+        if parsed is None:
+            return string.Formatter.vformat(self, format_string, args, kwargs)
+        result = []
+        for literal, field_name, format_spec, conversion in parsed:
+            if literal:
+                result.append(literal)
+            if field_name is not None:
+                obj = self.get_field(field_name, args, kwargs)[0]
+                obj = self.convert_field(obj, conversion)
+                result.append(self.format_field(obj, format_spec))
+        return ''.join(result)
+
     def evaluate(self, fmt, args, kwargs):
         if fmt.startswith('program:'):
             ans = self._eval_program(kwargs.get('$', None), fmt[8:], self.column_name)
@@ -407,3 +513,57 @@ class EvalFormatter(TemplateFormatter):
 
 # DEPRECATED. This is not thread safe. Do not use.
 eval_formatter = EvalFormatter()
+
+
+def benchmark(count=20000, repeat=3):
+    """
+    Measure throughput of evaluating the same templates over many books.
+    """
+    import time
+    from ebook_converter.utils.formatter_functions import FormatterFunction
+
+    class Field(FormatterFunction):
+        name = 'field'
+        arg_count = 1
+
+        def evaluate(self, formatter, kwargs, mi, locals, name):
+            return formatter.get_value(name, [], kwargs)
+
+    class Strcat(FormatterFunction):
+        name = 'strcat'
+        arg_count = -1
+
+        def evaluate(self, formatter, kwargs, mi, locals, *args):
+            return ''.join(args)
+
+    class Uppercase(FormatterFunction):
+        name = 'uppercase'
+        arg_count = 1
+
+        def evaluate(self, formatter, kwargs, mi, locals, val):
+            return val.upper()
+
+    funcs = {f.name: f for f in (Field(), Strcat(), Uppercase())}
+    books = [{'title': 'Title %d' % i, 'author': 'Author %d' % (i % 100),
+              'series': 'Series %d' % (i % 10)} for i in range(count)]
+    templates = (
+        'program: strcat(uppercase(field("title")), " - ", '
+        'field("author"), " (", field("series"), ")")',
+        '{series:uppercase()|[|]} {title:\'strcat($, " by ", '
+        'field("author"))\'}')
+    formatter = EvalFormatter()
+    for template in templates:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for book in books:
+                result = formatter.safe_format(template, book, 'ERROR', None,
+                                               template_functions=funcs)
+            assert not result.startswith('ERROR'), result
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print('%-40.40s %10.0f books/s' % (template, count / best))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -201,7 +201,10 @@ primary_startswith = _make_func(_strcmp_template, 'primary_startswith', collator
 
 safe_chr = chr  # _icu.chr
 
-ord_string = str  # _icu.ord_string
+
+def ord_string(string):
+    # _icu.ord_string
+    return [ord(x) for x in string]
 
 
 def character_name(string):
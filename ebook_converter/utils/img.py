@@ -8,11 +8,8 @@ import tempfile
 from io import BytesIO
 from threading import Thread
 
-# We use explicit module imports so tracebacks when importing are more useful
-#from PyQt5.QtCore import QBuffer, QByteArray, Qt
-#from PyQt5.QtGui import QColor, QImage, QImageReader, QImageWriter, QPixmap, QTransform
+from PIL import Image, ImageChops, ImageColor, ImageFilter, ImageOps
 
-from ebook_converter.constants_old import plugins
 from ebook_converter.ptempfile import TemporaryDirectory
 from ebook_converter.utils.config_base import tweaks
 from ebook_converter.utils import directory
@@ -20,10 +17,12 @@ from ebook_converter.utils import encoding as uenc
 from ebook_converter.utils.filenames import atomic_rename
 from ebook_converter.utils.imghdr import what
 
+# Images are first reduced by an integer factor (which is fast, and done by
+# the decoder itself for JPEG images) to at most this many times the target
+# size, and only then resampled.
+REDUCING_GAP = 2.0
+
 # Utilities {{{
-# imageops, imageops_err = plugins['imageops']
-# if imageops is None:
-    # raise RuntimeError(imageops_err)
 
 
 def fit_image(width, height, pwidth, pheight):
@@ -76,20 +75,32 @@ def load_jxr_data(data):
         cmd = [get_exe_path('JxrDecApp'), '-i', 'input.jxr', '-o', 'output.tif']
         creationflags = 0
         subprocess.Popen(cmd, cwd=tdir, stdout=open(os.devnull, 'wb'), stderr=subprocess.STDOUT, creationflags=creationflags).wait()
-        i = QImage()
-        if not i.load(os.path.join(tdir, 'output.tif')):
+        try:
+            i = Image.open(os.path.join(tdir, 'output.tif'))
+            i.load()
+        except Exception:
             raise NotImage('Failed to convert JPEG-XR image')
         return i
 
+
+def has_alpha(img):
+    ' Return True iff the image has an alpha channel or a transparent color '
+    return (img.mode in ('RGBA', 'LA', 'PA', 'RGBa', 'La') or
+            'transparency' in img.info)
+
+
+def color(name):
+    ' Convert color name or hex specification to an RGB tuple '
+    if isinstance(name, bytes):
+        name = name.decode('ascii')
+    return ImageColor.getrgb(name)[:3]
+
 # }}}
 
 # png <-> gif {{{
 
 
-def png_data_to_gif_data(data):
-    from PIL import Image
-    img = Image.open(BytesIO(data))
-    buf = BytesIO()
+def _save_gif(img, buf):
     if img.mode in ('p', 'P'):
         transparency = img.info.get('transparency')
         if transparency is not None:
@@ -105,6 +116,12 @@ def png_data_to_gif_data(data):
     else:
         img = img.convert('P', palette=Image.ADAPTIVE)
         img.save(buf, 'gif')
+
+
+def png_data_to_gif_data(data):
+    img = Image.open(BytesIO(data))
+    buf = BytesIO()
+    _save_gif(img, buf)
     return buf.getvalue()
 
 
@@ -113,9 +130,8 @@ class AnimatedGIF(ValueError):
 
 
 def gif_data_to_png_data(data, discard_animation=False):
-    from PIL import Image
     img = Image.open(BytesIO(data))
-    if img.is_animated and not discard_animation:
+    if getattr(img, 'is_animated', False) and not discard_animation:
         raise AnimatedGIF()
     buf = BytesIO()
     img.save(buf, 'png')
@@ -128,20 +144,23 @@ def gif_data_to_png_data(data, discard_animation=False):
 
 def null_image():
     ' Create an invalid image. For internal use. '
-    return QImage()
+    return Image.new('RGB', (0, 0))
 
 
 def image_from_data(data):
-    ' Create an image object from data, which should be a bytestring. '
-    if isinstance(data, QImage):
+    ''' Create an image object from data, which should be a bytestring.
+    Decoding of the pixels is deferred until they are needed, so that images
+    which are going to be scaled down can be decoded at a reduced size (see
+    :func:`draft_image`). '''
+    if isinstance(data, Image.Image):
         return data
-    i = QImage()
-    if not i.loadFromData(data):
+    try:
+        return Image.open(BytesIO(data))
+    except Exception:
         q = what(None, data)
         if q == 'jxr':
             return load_jxr_data(data)
         raise NotImage('Not a valid image (detected type: {})'.format(q))
-    return i
 
 
 def image_from_path(path):
@@ -156,23 +175,30 @@ def image_from_x(x):
         return image_from_path(x)
     if hasattr(x, 'read'):
         return image_from_data(x.read())
-    if isinstance(x, (bytes, QImage)):
+    if isinstance(x, (bytes, Image.Image)):
         return image_from_data(x)
     if isinstance(x, bytearray):
         return image_from_data(bytes(x))
-    if isinstance(x, QPixmap):
-        return x.toImage()
     raise TypeError('Unknown image src type: %s' % type(x))
 
 
 def image_and_format_from_data(data):
     ' Create an image object from the specified data which should be a bytestring and also return the format of the image '
-    ba = QByteArray(data)
-    buf = QBuffer(ba)
-    buf.open(QBuffer.ReadOnly)
-    r = QImageReader(buf)
-    fmt = bytes(r.format()).decode('utf-8')
-    return r.read(), fmt
+    img = image_from_data(data)
+    return img, (img.format or '').lower()
+
+
+def draft_image(img, width, height):
+    ''' Set up the image, if it was not decoded yet, to be decoded at the
+    smallest size which is not smaller than width x height, if its decoder
+    can do that (JPEG images can be decoded at 1/2, 1/4 and 1/8 of the size).
+    Returns the image. '''
+    if getattr(img, 'tile', None) and width > 0 and height > 0:
+        try:
+            img.draft(None, (int(width), int(height)))
+        except Exception:
+            pass
+    return img
 # }}}
 
 # Saving images {{{
@@ -187,33 +213,32 @@ def image_to_data(img, compression_quality=95, fmt='JPEG', png_compression_level
     :param jpeg_optimized: Turns on the 'optimize' option for libjpeg which losslessly reduce file size
     :param jpeg_progressive: Turns on the 'progressive scan' option for libjpeg which allows JPEG images to be downloaded in streaming fashion
     '''
+    img = image_from_data(img)
     fmt = fmt.upper()
-    ba = QByteArray()
-    buf = QBuffer(ba)
-    buf.open(QBuffer.WriteOnly)
-    if fmt == 'GIF':
-        w = QImageWriter(buf, b'PNG')
-        w.setQuality(90)
-        if not w.write(img):
-            raise ValueError('Failed to export image as ' + fmt + ' with error: ' + w.errorString())
-        return png_data_to_gif_data(ba.data())
-    is_jpeg = fmt in ('JPG', 'JPEG')
-    w = QImageWriter(buf, fmt.encode('ascii'))
-    if is_jpeg:
-        if img.hasAlphaChannel():
-            img = blend_image(img)
-        # QImageWriter only gained the following options in Qt 5.5
-        if jpeg_optimized:
-            w.setOptimizedWrite(True)
-        if jpeg_progressive:
-            w.setProgressiveScanWrite(True)
-        w.setQuality(compression_quality)
-    elif fmt == 'PNG':
-        cl = min(9, max(0, png_compression_level))
-        w.setQuality(10 * (9-cl))
-    if not w.write(img):
-        raise ValueError('Failed to export image as ' + fmt + ' with error: ' + w.errorString())
-    return ba.data()
+    if fmt == 'JPG':
+        fmt = 'JPEG'
+    buf = BytesIO()
+    try:
+        if fmt == 'GIF':
+            _save_gif(img, buf)
+        elif fmt == 'JPEG':
+            if has_alpha(img):
+                img = blend_image(img)
+            elif img.mode not in ('RGB', 'L', 'CMYK'):
+                img = img.convert('RGB')
+            img.save(buf, 'JPEG', quality=compression_quality,
+                     optimize=jpeg_optimized, progressive=jpeg_progressive)
+        elif fmt == 'PNG':
+            if img.mode not in ('1', 'L', 'LA', 'I', 'I;16', 'P', 'RGB',
+                                'RGBA'):
+                img = img.convert('RGBA' if has_alpha(img) else 'RGB')
+            cl = min(9, max(0, png_compression_level))
+            img.save(buf, 'PNG', compress_level=cl)
+        else:
+            img.save(buf, fmt)
+    except Exception as err:
+        raise ValueError('Failed to export image as ' + fmt + ' with error: ' + str(err))
+    return buf.getvalue()
 
 
 def save_image(img, path, **kw):
@@ -262,16 +287,8 @@ def save_cover_data_to(
     :param letterbox: If True, in addition to fit resize_to inside minify_to,
         the image will be letterboxed (i.e., centered on a black background).
     '''
-    # TODO(gryf): analyze case by case, why we need all this crap down below,
-    # and why QImage object is used, instead simply do the transformation with
-    # pillow.
-    with open(path, 'wb') as fobj:
-        fobj.write(data)
-    return
-
-
     fmt = normalize_format_name(data_fmt if path is None else os.path.splitext(path)[1][1:])
-    if isinstance(data, QImage):
+    if isinstance(data, Image.Image):
         img = data
         changed = True
     else:
@@ -281,8 +298,8 @@ def save_cover_data_to(
 
     if resize_to is not None:
         changed = True
-        img = img.scaled(resize_to[0], resize_to[1], Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
-    owidth, oheight = img.width(), img.height()
+        img = resize_image(img, resize_to[0], resize_to[1])
+    owidth, oheight = img.size
     nwidth, nheight = tweaks['maximum_cover_size'] if minify_to is None else minify_to
     if letterbox:
         img = blend_on_canvas(img, nwidth, nheight, bgcolor='#000000')
@@ -293,12 +310,12 @@ def save_cover_data_to(
         scaled, nwidth, nheight = fit_image(owidth, oheight, nwidth, nheight)
         if scaled:
             changed = True
-            img = img.scaled(nwidth, nheight, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
-    if img.hasAlphaChannel():
+            img = resize_image(img, nwidth, nheight)
+    if has_alpha(img):
         changed = True
         img = blend_image(img, bgcolor)
     if grayscale and not eink:
-        if not img.allGray():
+        if img.mode not in ('1', 'L', 'I', 'F'):
             changed = True
             img = grayscale_image(img)
     if eink:
@@ -317,13 +334,13 @@ def save_cover_data_to(
 
 def blend_on_canvas(img, width, height, bgcolor='#ffffff'):
     ' Blend the `img` onto a canvas with the specified background color and size '
-    w, h = img.width(), img.height()
+    img = image_from_data(img)
+    w, h = img.size
     scaled, nw, nh = fit_image(w, h, width, height)
     if scaled:
-        img = img.scaled(nw, nh, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+        img = resize_image(img, nw, nh)
         w, h = nw, nh
-    canvas = QImage(width, height, QImage.Format_RGB32)
-    canvas.fill(QColor(bgcolor))
+    canvas = create_canvas(width, height, bgcolor)
     overlay_image(img, canvas, (width - w)//2, (height - h)//2)
     return canvas
 
@@ -331,8 +348,7 @@ def blend_on_canvas(img, width, height, bgcolor='#ffffff'):
 class Canvas(object):
 
     def __init__(self, width, height, bgcolor='#ffffff'):
-        self.img = QImage(width, height, QImage.Format_RGB32)
-        self.img.fill(QColor(bgcolor))
+        self.img = create_canvas(width, height, bgcolor)
 
     def __enter__(self):
         return self
@@ -350,32 +366,43 @@ class Canvas(object):
 
 def create_canvas(width, height, bgcolor='#ffffff'):
     'Create a blank canvas of the specified size and color '
-    img = QImage(width, height, QImage.Format_RGB32)
-    img.fill(QColor(bgcolor))
-    return img
+    return Image.new('RGB', (int(width), int(height)), color(bgcolor))
 
 
 def overlay_image(img, canvas=None, left=0, top=0):
     ' Overlay the `img` onto the canvas at the specified position '
+    img = image_from_data(img)
     if canvas is None:
-        canvas = QImage(img.size(), QImage.Format_RGB32)
-        canvas.fill(Qt.white)
+        canvas = create_canvas(img.width, img.height)
     left, top = int(left), int(top)
-    imageops.overlay(img, canvas, left, top)
+    if has_alpha(img):
+        img = img.convert('RGBA')
+        canvas.paste(img.convert(canvas.mode), (left, top), img)
+    else:
+        canvas.paste(img.convert(canvas.mode), (left, top))
     return canvas
 
 
 def texture_image(canvas, texture):
     ' Repeatedly tile the image `texture` across and down the image `canvas` '
-    if canvas.hasAlphaChannel():
+    if has_alpha(canvas):
         canvas = blend_image(canvas)
-    return imageops.texture_image(canvas, texture)
+    else:
+        canvas = canvas.copy()
+    texture = image_from_data(texture)
+    tw, th = texture.size
+    if tw < 1 or th < 1:
+        return canvas
+    for y in range(0, canvas.height, th):
+        for x in range(0, canvas.width, tw):
+            overlay_image(texture, canvas, x, y)
+    return canvas
 
 
 def blend_image(img, bgcolor='#ffffff'):
     ' Used to convert images that have semi-transparent pixels to opaque by blending with the specified color '
-    canvas = QImage(img.size(), QImage.Format_RGB32)
-    canvas.fill(QColor(bgcolor))
+    img = image_from_data(img)
+    canvas = create_canvas(img.width, img.height, bgcolor)
     overlay_image(img, canvas)
     return canvas
 # }}}
@@ -387,8 +414,7 @@ def add_borders_to_image(img, left=0, top=0, right=0, bottom=0, border_color='#f
     img = image_from_data(img)
     if not (left > 0 or right > 0 or top > 0 or bottom > 0):
         return img
-    canvas = QImage(img.width() + left + right, img.height() + top + bottom, QImage.Format_RGB32)
-    canvas.fill(QColor(border_color))
+    canvas = create_canvas(img.width + left + right, img.height + top + bottom, border_color)
     overlay_image(img, canvas, left, top)
     return canvas
 
@@ -400,47 +426,61 @@ def remove_borders_from_image(img, fuzz=None):
     absolute intensity units). Default is from a tweak whose default value is 10. '''
     fuzz = tweaks['cover_trim_fuzz_value'] if fuzz is None else fuzz
     img = image_from_data(img)
-    ans = imageops.remove_borders(img, max(0, fuzz))
-    return ans if ans.size() != img.size() else img
+    if img.width < 1 or img.height < 1:
+        return img
+    rgb = img.convert('RGB')
+    background = Image.new('RGB', rgb.size, rgb.getpixel((0, 0)))
+    diff = ImageChops.difference(rgb, background).convert('L')
+    fuzz = max(0, fuzz)
+    bbox = diff.point(lambda x: 255 if x > fuzz else 0).getbbox()
+    if not bbox or bbox == (0, 0) + img.size:
+        return img
+    return img.crop(bbox)
 # }}}
 
 # Cropping/scaling of images {{{
 
 
 def resize_image(img, width, height):
-    return img.scaled(int(width), int(height), Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+    ''' Resize the image to width x height. Images which were not decoded yet
+    are decoded at a reduced size, when the decoder supports that. '''
+    width, height = max(1, int(width)), max(1, int(height))
+    img = draft_image(image_from_data(img), width, height)
+    if img.size == (width, height):
+        return img
+    if img.mode in ('1', 'P'):
+        img = img.convert('RGBA' if has_alpha(img) else 'RGB')
+    return img.resize((width, height), Image.LANCZOS,
+                      reducing_gap=REDUCING_GAP)
 
 
 def resize_to_fit(img, width, height):
     img = image_from_data(img)
-    resize_needed, nw, nh = fit_image(img.width(), img.height(), width, height)
+    resize_needed, nw, nh = fit_image(img.width, img.height, width, height)
     if resize_needed:
         img = resize_image(img, nw, nh)
     return resize_needed, img
 
 
 def clone_image(img):
-    ''' Returns a shallow copy of the image. However, the underlying data buffer
-    will be automatically copied-on-write '''
-    return QImage(img)
+    ''' Returns a copy of the image '''
+    return image_from_data(img).copy()
 
 
 def scale_image(data, width=60, height=80, compression_quality=70, as_png=False, preserve_aspect_ratio=True):
     ''' Scale an image, returning it as either JPEG or PNG data (bytestring).
     Transparency is alpha blended with white when converting to JPEG. Is thread
-    safe and does not require a QApplication. '''
-    # We use Qt instead of ImageMagick here because ImageMagick seems to use
-    # some kind of memory pool, causing memory consumption to sky rocket.
+    safe. '''
     img = image_from_data(data)
     if preserve_aspect_ratio:
-        scaled, nwidth, nheight = fit_image(img.width(), img.height(), width, height)
+        scaled, nwidth, nheight = fit_image(img.width, img.height, width, height)
         if scaled:
-            img = img.scaled(nwidth, nheight, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            img = resize_image(img, nwidth, nheight)
     else:
-        if img.width() != width or img.height() != height:
-            img = img.scaled(width, height, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+        if img.width != width or img.height != height:
+            img = resize_image(img, width, height)
     fmt = 'PNG' if as_png else 'JPEG'
-    w, h = img.width(), img.height()
+    w, h = img.size
     return w, h, image_to_data(img, compression_quality=compression_quality, fmt=fmt)
 
 
@@ -454,9 +494,9 @@ def crop_image(img, x, y, width, height):
     auto-truncated.
     '''
     img = image_from_data(img)
-    width = min(width, img.width() - x)
-    height = min(height, img.height() - y)
-    return img.copy(x, y, width, height)
+    width = min(width, img.width - x)
+    height = min(height, img.height - y)
+    return img.crop((x, y, x + width, y + height))
 
 # }}}
 
@@ -464,52 +504,65 @@ def crop_image(img, x, y, width, height):
 
 
 def grayscale_image(img):
-    return imageops.grayscale(image_from_data(img))
+    img = image_from_data(img)
+    return img.convert('LA' if has_alpha(img) else 'L')
 
 
 def set_image_opacity(img, alpha=0.5):
     ''' Change the opacity of `img`. Note that the alpha value is multiplied to
     any existing alpha values, so you cannot use this function to convert a
     semi-transparent image to an opaque one. For that use `blend_image()`. '''
-    return imageops.set_opacity(image_from_data(img), alpha)
+    img = image_from_data(img).convert('RGBA')
+    alpha = max(0.0, min(1.0, alpha))
+    img.putalpha(img.getchannel('A').point(lambda a: int(a * alpha)))
+    return img
 
 
 def flip_image(img, horizontal=False, vertical=False):
-    return image_from_data(img).mirrored(horizontal, vertical)
+    img = image_from_data(img)
+    if horizontal:
+        img = ImageOps.mirror(img)
+    if vertical:
+        img = ImageOps.flip(img)
+    return img
 
 
 def image_has_transparent_pixels(img):
     ' Return True iff the image has at least one semi-transparent pixel '
     img = image_from_data(img)
-    if img.isNull():
+    if img.width < 1 or img.height < 1 or not has_alpha(img):
         return False
-    return imageops.has_transparent_pixels(img)
+    return img.convert('RGBA').getchannel('A').getextrema()[0] < 255
 
 
 def rotate_image(img, degrees):
-    t = QTransform()
-    t.rotate(degrees)
-    return image_from_data(img).transformed(t)
+    # Positive angles are clockwise, like in the screen coordinates
+    return image_from_data(img).rotate(-degrees, expand=True)
 
 
 def gaussian_sharpen_image(img, radius=0, sigma=3, high_quality=True):
-    return imageops.gaussian_sharpen(image_from_data(img), max(0, radius), sigma, high_quality)
+    radius = max(0, radius) or sigma
+    return image_from_data(img).filter(ImageFilter.UnsharpMask(radius=radius))
 
 
 def gaussian_blur_image(img, radius=-1, sigma=3):
-    return imageops.gaussian_blur(image_from_data(img), max(0, radius), sigma)
+    return image_from_data(img).filter(ImageFilter.GaussianBlur(sigma))
 
 
 def despeckle_image(img):
-    return imageops.despeckle(image_from_data(img))
+    return image_from_data(img).filter(ImageFilter.MedianFilter(3))
 
 
 def oil_paint_image(img, radius=-1, high_quality=True):
-    return imageops.oil_paint(image_from_data(img), radius, high_quality)
+    size = 2 * int(radius) + 1 if radius > 0 else 5
+    return image_from_data(img).filter(ImageFilter.ModeFilter(size))
 
 
 def normalize_image(img):
-    return imageops.normalize(image_from_data(img))
+    img = image_from_data(img)
+    if img.mode not in ('L', 'RGB'):
+        img = img.convert('RGB')
+    return ImageOps.autocontrast(img)
 
 
 def quantize_image(img, max_colors=256, dither=True, palette=''):
@@ -524,25 +577,56 @@ def quantize_image(img, max_colors=256, dither=True, palette=''):
     :param palette: Use a manually specified palette instead. For example: palette='red green blue #eee'
     '''
     img = image_from_data(img)
-    if img.hasAlphaChannel():
+    if has_alpha(img):
         img = blend_image(img)
+    elif img.mode != 'RGB':
+        img = img.convert('RGB')
+    dither = Image.FLOYDSTEINBERG if dither else Image.NONE
     if palette and isinstance(palette, (str, bytes)):
         palette = palette.split()
-    return imageops.quantize(img, max_colors, dither, [QColor(x).rgb() for x in palette])
+    if palette:
+        colors = [color(x) for x in palette][:256]
+        pal = Image.new('P', (1, 1))
+        pal.putpalette([c for rgb in colors for c in rgb] +
+                       list(colors[0]) * (256 - len(colors)))
+        return img.quantize(palette=pal, dither=dither)
+    max_colors = max(2, min(256, max_colors))
+    return img.quantize(colors=max_colors, dither=dither)
+
+
+# 8x8 Bayer matrix for ordered dithering
+BAYER_MATRIX = (
+    0, 32, 8, 40, 2, 34, 10, 42,
+    48, 16, 56, 24, 50, 18, 58, 26,
+    12, 44, 4, 36, 14, 46, 6, 38,
+    60, 28, 52, 20, 62, 30, 54, 22,
+    3, 35, 11, 43, 1, 33, 9, 41,
+    51, 19, 59, 27, 49, 17, 57, 25,
+    15, 47, 7, 39, 13, 45, 5, 37,
+    63, 31, 55, 23, 61, 29, 53, 21)
 
 
 def eink_dither_image(img):
     ''' Dither the source image down to the eInk palette of 16 shades of grey,
-    using ImageMagick's OrderedDither algorithm.
+    using ordered dithering with a 8x8 Bayer matrix.
 
     NOTE: No need to call grayscale_image first, as this will inline a grayscaling pass if need be.
 
-    Returns a QImage in Grayscale8 pixel format.
+    Returns an image in L (8 bit grayscale) mode.
     '''
     img = image_from_data(img)
-    if img.hasAlphaChannel():
+    if has_alpha(img):
         img = blend_image(img)
-    return imageops.ordered_dither(img)
+    img = img.convert('L')
+    # The shades are 17 apart, so the thresholds go from 0 to 16
+    tile = Image.new('L', (8, 8))
+    tile.putdata([t * 17 // 64 for t in BAYER_MATRIX])
+    thresholds = Image.new('L', img.size)
+    for y in range(0, img.height, 8):
+        for x in range(0, img.width, 8):
+            thresholds.paste(tile, (x, y))
+    return ImageChops.add(img, thresholds).point(
+        lambda v: min(15, v // 17) * 17)
 
 # }}}
 
@@ -632,15 +716,19 @@ def encode_jpeg(file_path, quality=80):
     quality = max(0, min(100, int(quality)))
     exe = get_exe_path('cjpeg')
     cmd = [exe] + '-optimize -progressive -maxmemory 100M -quality'.split() + [str(quality)]
-    img = QImage()
-    if not img.load(file_path):
+    try:
+        img = Image.open(file_path)
+        img.load()
+    except Exception:
         raise ValueError('%s is not a valid image file' % file_path)
-    ba = QByteArray()
-    buf = QBuffer(ba)
-    buf.open(QBuffer.WriteOnly)
-    if not img.save(buf, 'PPM'):
+    buf = BytesIO()
+    try:
+        if has_alpha(img):
+            img = blend_image(img)
+        img.convert('RGB').save(buf, 'PPM')
+    except Exception:
         raise ValueError('Failed to export image to PPM')
-    return run_optimizer(file_path, cmd, as_filter=True, input_data=ReadOnlyFileBuffer(ba.data()))
+    return run_optimizer(file_path, cmd, as_filter=True, input_data=ReadOnlyFileBuffer(buf.getvalue()))
 # }}}
 
 
@@ -648,8 +736,7 @@ def test():  # {{{
     # TODO(gryf): move this test to separate file.
     from ebook_converter.ptempfile import TemporaryDirectory
     from glob import glob
-    # TODO(gryf): make the sample image out of pillow or smth
-    # img = image_from_data(I('lt.png', data=True, allow_user_override=False))
+    img = Image.linear_gradient('L').convert('RGBA')
     with TemporaryDirectory() as tdir, directory.CurrentDir(tdir):
         save_image(img, 'test.jpg')
         ret = optimize_jpeg('test.jpg')
@@ -658,9 +745,7 @@ def test():  # {{{
         ret = encode_jpeg('test.jpg')
         if ret is not None:
             raise SystemExit('encode_jpeg failed: %s' % ret)
-        # TODO(gryf): make the sample image out of pillow or smth. for sure
-        # tempfile would be better idea.
-        #shutil.copyfile(I('lt.png'), 'test.png')
+        save_image(img, 'test.png')
         ret = optimize_png('test.png')
         if ret is not None:
             raise SystemExit('optimize_png failed: %s' % ret)